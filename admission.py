@@ -0,0 +1,189 @@
+"""
+Admission control for AI requests.
+
+Token buckets cap the request rate globally and per room; a circuit breaker
+stops calling the provider after repeated failures, quota errors or latency
+spikes, so messages fall back to local-only analysis instead of each paying
+the full timeout.
+"""
+
+import time
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self._updated = clock()
+
+    def has(self, tokens=1):
+        """Whether `tokens` are available now (does not take them)."""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return self.tokens >= tokens
+
+    def take(self, tokens=1):
+        self.tokens -= tokens
+
+    def try_acquire(self, tokens=1):
+        if self.has(tokens):
+            self.take(tokens)
+            return True
+        return False
+
+    def idle(self):
+        """Full again, so indistinguishable from a new bucket."""
+        return self.has(self.burst)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures (a call
+    slower than `slow_call` seconds counts as one; a rate-limit error opens
+    the breaker at once). After `cooldown` seconds one probe call is let
+    through (half_open): success closes the breaker, failure reopens it.
+
+    allow() returns a permit (CALL or PROBE, both true) that the caller
+    passes back with the call's outcome. Outside the closed state only the
+    probe's outcome moves the breaker; calls that started before it opened
+    are counted but change nothing.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+    CALL, PROBE = 'call', 'probe'
+
+    def __init__(self, failure_threshold=5, slow_call=10.0, cooldown=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.slow_call = slow_call
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self.successes = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self._probe_in_flight = False
+
+    def available(self):
+        """Whether a call could be let through now (does not claim the probe)."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return self.clock() - self.opened_at >= self.cooldown
+        return not self._probe_in_flight
+
+    def allow(self):
+        """Claim permission for one call: a permit, or False."""
+        if self.state == self.OPEN and self.clock() - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED:
+            return self.CALL
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return self.PROBE
+        self.rejected += 1
+        return False
+
+    def record_success(self, latency, permit=CALL):
+        if latency > self.slow_call:
+            self.slow_calls += 1
+            self.record_failure(permit=permit)
+            return
+        self.successes += 1
+        if self.state != self.CLOSED and permit != self.PROBE:
+            return
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        self.state = self.CLOSED
+
+    def record_failure(self, rate_limited=False, permit=CALL):
+        self.failures += 1
+        if self.state != self.CLOSED and permit != self.PROBE:
+            # A call that started before the breaker opened; it must not push
+            # the cooldown back or decide the probe's outcome
+            return
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if rate_limited or permit == self.PROBE or self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        if self.state != self.OPEN:
+            self.times_opened += 1
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+
+    def stats(self):
+        retry_in = None
+        if self.state == self.OPEN:
+            retry_in = round(max(0.0, self.cooldown - (self.clock() - self.opened_at)), 1)
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'times_opened': self.times_opened,
+            'retry_in': retry_in,
+            'successes': self.successes,
+            'failures': self.failures,
+            'slow_calls': self.slow_calls,
+            'rejected': self.rejected
+        }
+
+
+class AdmissionController:
+    """
+    A global token bucket, one bucket per room, and the shared breaker.
+
+    Room buckets that have refilled completely are dropped once there are
+    `max_rooms` of them; a full bucket is the same as a new one.
+    """
+
+    def __init__(self, global_rate, global_burst, room_rate, room_burst, breaker, max_rooms=1024,
+                 clock=time.monotonic):
+        self.clock = clock
+        self.global_bucket = TokenBucket(global_rate, global_burst, clock)
+        self.room_rate = room_rate
+        self.room_burst = room_burst
+        self.room_buckets = {}
+        self.max_rooms = max_rooms
+        self._sweep_at = max_rooms
+        self.breaker = breaker
+        self.admitted = 0
+        self.throttled = 0
+
+    def admit(self, room_id):
+        """Take one token from the room's bucket and the global one, or neither."""
+        bucket = self.room_buckets.get(room_id)
+        if bucket is None:
+            if len(self.room_buckets) >= self._sweep_at:
+                self._evict_idle()
+            bucket = self.room_buckets[room_id] = TokenBucket(self.room_rate, self.room_burst, self.clock)
+        if bucket.has() and self.global_bucket.has():
+            bucket.take()
+            self.global_bucket.take()
+            self.admitted += 1
+            return True
+        self.throttled += 1
+        return False
+
+    def _evict_idle(self):
+        for room_id in [room_id for room_id, bucket in self.room_buckets.items() if bucket.idle()]:
+            del self.room_buckets[room_id]
+        # If most rooms are busy, don't sweep again until the table doubles
+        self._sweep_at = max(self.max_rooms, 2 * len(self.room_buckets))
+
+    def stats(self):
+        return {
+            'breaker': self.breaker.stats(),
+            'admitted': self.admitted,
+            'throttled': self.throttled,
+            'global_tokens': round(self.global_bucket.tokens, 1),
+            'rooms': len(self.room_buckets)
+        }
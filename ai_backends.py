@@ -0,0 +1,132 @@
+"""
+AI backends used by RealAIAnalyzer.
+
+A backend takes a system prompt and the user contents and returns the
+model's JSON answer as text. GeminiBackend calls Google Gemini; FakeBackend
+answers locally with schema-valid JSON for every prompt, after a simulated
+latency and with configurable error and rate-limit rates, so the AI path can
+be load-tested and benchmarked offline.
+"""
+
+import abc
+import json
+import random
+import re
+import time
+
+from google import genai
+from google.genai import types
+
+
+class BackendError(Exception):
+    """A failed backend call; `code` follows HTTP status codes (429 = rate limited)."""
+
+    def __init__(self, message, code=500):
+        super().__init__(message)
+        self.code = code
+
+
+class AIBackend(abc.ABC):
+    """
+    Interface: generate(system_prompt, contents, timeout=None) -> JSON answer
+    as text (or None). `timeout` is the seconds left before the caller's
+    deadline.
+    """
+
+    name = 'base'
+
+    @abc.abstractmethod
+    def generate(self, system_prompt, contents, timeout=None):
+        """Return the model's answer to one request."""
+
+
+class GeminiBackend(AIBackend):
+    name = 'gemini'
+
+    def __init__(self, api_key, model="gemini-2.5-flash"):
+        self.client = genai.Client(api_key=api_key)
+        self.model = model
+
+    def generate(self, system_prompt, contents, timeout=None):
+        # The caller's eventlet timeout interrupts the (green) socket read, so
+        # the deadline holds without a per-request HTTP timeout.
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=[
+                types.Content(role="user", parts=[types.Part(text=contents)])
+            ],
+            config=types.GenerateContentConfig(
+                system_instruction=system_prompt,
+                response_mime_type="application/json",
+            ),
+        )
+        return response.text
+
+
+class FakeBackend(AIBackend):
+    """
+    Local stand-in for Gemini.
+
+    The answer follows the JSON template each prompt ends with ("string",
+    number and list placeholders are filled in); combined prompts get one
+    object per "=== SECTION: name ===" block. Each call sleeps for a
+    log-normal latency (median `latency`, spread `latency_sigma`, capped at
+    `latency_max`), then fails with probability `error_rate` or is rate
+    limited (BackendError code 429) with probability `rate_limit_rate`.
+    A latency beyond the caller's timeout ends in a 504 at the timeout.
+    """
+
+    name = 'fake'
+
+    SECTION_PATTERN = re.compile(r'^=== SECTION: (\w+) ===\n(.*?)(?=^=== |\Z)', re.M | re.S)
+    NUMBER_PLACEHOLDER = re.compile(r'(?<=:\s)number\b')
+
+    def __init__(self, latency=0.8, latency_sigma=0.5, latency_max=30.0, error_rate=0.0,
+                 rate_limit_rate=0.0, seed=None, sleep=time.sleep):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.latency_max = latency_max
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rng = random.Random(seed)
+        self.sleep = sleep
+        self.calls = 0
+        self._templates = {}
+
+    def generate(self, system_prompt, contents, timeout=None):
+        self.calls += 1
+        if self.latency > 0:
+            latency = min(self.latency_max, self.rng.lognormvariate(0, self.latency_sigma) * self.latency)
+            if timeout is not None and latency > timeout:
+                self.sleep(timeout)
+                raise BackendError("simulated timeout", code=504)
+            self.sleep(latency)
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            raise BackendError("simulated rate limit", code=429)
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise BackendError("simulated backend error")
+        return json.dumps(self.answer(system_prompt))
+
+    def answer(self, system_prompt):
+        """A schema-valid answer for the prompt, as a dict."""
+        template = self._templates.get(system_prompt)
+        if template is None:
+            template = self._templates[system_prompt] = self._template(system_prompt)
+        return self._fill(template)
+
+    def _template(self, system_prompt):
+        sections = self.SECTION_PATTERN.findall(system_prompt)
+        if sections:
+            return {name: self._template(body) for name, body in sections}
+        last = [line for line in system_prompt.strip().splitlines() if line.startswith('{')][-1]
+        return json.loads(self.NUMBER_PLACEHOLDER.sub('0', last))
+
+    def _fill(self, template, key=''):
+        if isinstance(template, dict):
+            return {k: self._fill(v, k) for k, v in template.items()}
+        if isinstance(template, list):
+            return [f"simulated {key.replace('_', ' ')} {i + 1}" for i in range(self.rng.randint(1, 3))]
+        if isinstance(template, str):
+            return f"simulated {key.replace('_', ' ')}"
+        return self.rng.randint(0, 100)
@@ -0,0 +1,109 @@
+"""
+Per-client outbound queue accounting and slow-consumer handling.
+
+Every connected client has an outbound packet queue on the server. A client
+on a bad connection drains it slower than the room fills it, so the queue,
+and the server's memory, grows without bound. OutboundMonitor samples each
+client's queue depth and moves it between three states:
+
+  normal  depth below `high_water`
+  paused  depth reached `high_water`: the client stops receiving dashboard
+          events (chat messages still go out), until the depth falls back
+          to `low_water` and it is resumed with one fresh snapshot
+  dropped depth reached `limit`, or the client stayed paused longer than
+          `max_pause` seconds: it is disconnected
+"""
+
+import time
+
+import eventlet
+
+
+class OutboundMonitor:
+    """
+    Watches client queue depths and calls back on state changes.
+
+    depth_of(sid) returns the number of packets queued for a client, or None
+    once it is gone. on_pause, on_resume and on_drop are called with the sid.
+    """
+
+    def __init__(self, depth_of, on_pause, on_resume, on_drop, high_water=200, low_water=50,
+                 limit=2000, max_pause=30.0, interval=0.5, clock=time.monotonic):
+        self.depth_of = depth_of
+        self.on_pause = on_pause
+        self.on_resume = on_resume
+        self.on_drop = on_drop
+        self.high_water = high_water
+        self.low_water = low_water
+        self.limit = limit
+        self.max_pause = max_pause
+        self.interval = interval
+        self.clock = clock
+        self.depths = {}   # sid -> last sampled depth
+        self.paused = {}   # sid -> paused since
+        self.peak_depth = 0
+        self.pauses = 0
+        self.resumes = 0
+        self.drops = 0
+
+    def track(self, sid):
+        self.depths[sid] = 0
+
+    def forget(self, sid):
+        self.depths.pop(sid, None)
+        self.paused.pop(sid, None)
+
+    def is_paused(self, sid):
+        return sid in self.paused
+
+    def check(self):
+        """Sample every client once and apply the thresholds."""
+        now = self.clock()
+        for sid in list(self.depths):
+            depth = self.depth_of(sid)
+            if depth is None:
+                self.forget(sid)
+                continue
+            self.depths[sid] = depth
+            self.peak_depth = max(self.peak_depth, depth)
+
+            paused_since = self.paused.get(sid)
+            if depth >= self.limit or (paused_since is not None and now - paused_since > self.max_pause):
+                self.forget(sid)
+                self.drops += 1
+                self.on_drop(sid)
+            elif paused_since is None and depth >= self.high_water:
+                self.paused[sid] = now
+                self.pauses += 1
+                self.on_pause(sid)
+            elif paused_since is not None and depth <= self.low_water:
+                del self.paused[sid]
+                self.resumes += 1
+                self.on_resume(sid)
+
+    def start(self):
+        eventlet.spawn_n(self._run)
+
+    def _run(self):
+        while True:
+            eventlet.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Outbound queue check failed: {e}")
+
+    def stats(self, top=10):
+        deepest = sorted(self.depths.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            'clients': len(self.depths),
+            'queued_packets': sum(self.depths.values()),
+            'peak_depth': self.peak_depth,
+            'deepest': [{'sid': sid, 'depth': depth, 'paused': sid in self.paused} for sid, depth in deepest],
+            'paused': len(self.paused),
+            'pauses': self.pauses,
+            'resumes': self.resumes,
+            'drops': self.drops,
+            'high_water': self.high_water,
+            'low_water': self.low_water,
+            'limit': self.limit
+        }
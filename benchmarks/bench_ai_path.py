@@ -0,0 +1,142 @@
+"""
+Offline load test for the AI analysis path.
+
+Drives send_message through the Socket.IO test client with AI_BACKEND=fake,
+so no network or quota is needed, and reports:
+
+  handler     time spent in the send_message handler per message
+  ai latency  time from a message to each of its dashboard_ai_update events
+  backend     calls made, plus response cache, circuit breaker, deadline and
+              hedging, and per-room scheduler counters
+
+Latency, error rate, rate-limit rate, message rate, share of repeated
+messages, combined mode and hedging are all configurable, so concurrency,
+caching and timeout behaviour can be compared between runs.
+
+Usage:
+  python benchmarks/bench_ai_path.py --messages 200 --interval 0.05 --latency 0.8
+  python benchmarks/bench_ai_path.py --error-rate 0.2 --rate-limit-rate 0.05 --deadline 3
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--rooms', type=int, default=1)
+    parser.add_argument('--interval', type=float, default=0.1, help='seconds between messages')
+    parser.add_argument('--repeat-ratio', type=float, default=0.3,
+                        help='share of messages drawn from a small set of repeated texts')
+    parser.add_argument('--latency', type=float, default=0.8, help='median backend latency (s)')
+    parser.add_argument('--sigma', type=float, default=0.5, help='log-normal latency spread')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--deadline', type=float, default=15.0, help='per-message AI deadline (s)')
+    parser.add_argument('--combined', action='store_true', help='use AI_COMBINED_MODE')
+    parser.add_argument('--hedge', action='store_true', help='use AI_HEDGE')
+    parser.add_argument('--drain', type=float, default=None,
+                        help='seconds to wait for outstanding AI work (default: deadline + 1)')
+    parser.add_argument('--seed', type=int, default=1337)
+    return parser.parse_args()
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ.update({
+        'AI_BACKEND': 'fake',
+        'AI_FAKE_LATENCY': str(args.latency),
+        'AI_FAKE_LATENCY_SIGMA': str(args.sigma),
+        'AI_FAKE_ERROR_RATE': str(args.error_rate),
+        'AI_FAKE_RATE_LIMIT_RATE': str(args.rate_limit_rate),
+        'AI_FAKE_SEED': str(args.seed),
+        'AI_MESSAGE_DEADLINE': str(args.deadline),
+        'AI_COMBINED_MODE': '1' if args.combined else '',
+        'AI_HEDGE': '1' if args.hedge else '',
+    })
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    import eventlet
+    import main as app_main
+
+    arrivals = []
+    emit = app_main.socketio.emit
+
+    def timed_emit(event, data, **kwargs):
+        if event == 'dashboard_ai_update':
+            arrivals.append((data['message_id'], time.monotonic(), len(data['fields'])))
+        return emit(event, data, **kwargs)
+
+    app_main.socketio.emit = timed_emit
+
+    rng = random.Random(args.seed)
+    repeated = ['hi', 'lol', 'ok', 'CLICK HERE to claim your prize http://bit.ly/x', 'haha same']
+    words = ['weekend', 'exam', 'game', 'tired', 'party', 'project', 'coffee', 'later', 'why', 'sure']
+
+    clients = []
+    for r in range(args.rooms):
+        client = app_main.socketio.test_client(app_main.app)
+        client.emit('join', {'room_id': f'bench-{r}', 'user_id': f'u{r}', 'username': f'user{r}'})
+        client.emit('dashboard_subscribe', {'room_id': f'bench-{r}'})
+        clients.append(client)
+
+    sent_at = {}
+    handler_times = []
+    for i in range(args.messages):
+        r = i % args.rooms
+        text = (rng.choice(repeated) if rng.random() < args.repeat_ratio
+                else ' '.join(rng.choice(words) for _ in range(rng.randint(3, 10))))
+        started = time.monotonic()
+        clients[r].emit('send_message', {'room_id': f'bench-{r}', 'user_id': f'u{r}',
+                                         'username': f'user{r}', 'message': text})
+        handler_times.append(time.monotonic() - started)
+        for packet in clients[r].get_received():
+            if packet['name'] == 'new_message':
+                sent_at[packet['args'][0]['id']] = started
+        eventlet.sleep(args.interval)
+
+    if not sent_at:
+        # Latencies are measured from the new_message echo; without it every
+        # number below would be NaN
+        sys.exit("error: the test client received no new_message packets "
+                 "(Flask-SocketIO older than 5.3.6 with python-socketio 5.9+?)")
+
+    eventlet.sleep(args.deadline + 1 if args.drain is None else args.drain)
+
+    latencies = [at - sent_at[mid] for mid, at, _ in arrivals if mid in sent_at]
+    analysed = {mid for mid, _, _ in arrivals}
+    fields = sum(n for _, _, n in arrivals)
+
+    print(f"messages           : {args.messages} over {args.rooms} room(s), {args.interval}s apart")
+    print(f"handler            : p50 {percentile(handler_times, 0.5) * 1e3:.2f} ms, "
+          f"p99 {percentile(handler_times, 0.99) * 1e3:.2f} ms")
+    print(f"backend calls      : {app_main.ai_backend.calls} "
+          f"({app_main.ai_backend.calls / args.messages:.2f} per message)")
+    print(f"ai updates         : {len(arrivals)} events, {fields} fields, "
+          f"{len(analysed)} messages with AI results")
+    print(f"ai latency         : p50 {percentile(latencies, 0.5):.2f}s, p95 {percentile(latencies, 0.95):.2f}s, "
+          f"max {max(latencies, default=float('nan')):.2f}s")
+    print(f"cache              : {app_main.ai_cache.stats()}")
+    print(f"admission          : {app_main.ai_admission.stats()}")
+    print(f"deadlines          : {app_main.ai_runner.stats()}")
+    for room_id, scheduler in app_main.ai_schedulers.items():
+        print(f"scheduler {room_id:8} : {scheduler.stats()}")
+
+
+if __name__ == '__main__':
+    main()
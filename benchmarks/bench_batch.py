@@ -0,0 +1,138 @@
+"""
+Parity and timing check: SimulatedAIAnalyzer.analyze_batch vs. a Python loop.
+
+The loop calls the single-message stages on each text in turn, the way
+analyze_local_message does, and builds the same fields analyze_batch
+returns. The script fails if, on any message of the bench_pipeline corpora:
+
+  exact   analyze_batch(exact=True), drawing from a random.Random seeded
+          like the loop's, differs from the loop
+  fast    analyze_batch (numpy jitter) differs from the loop in a field
+          without jitter, or from itself when run again with the same seed
+
+then reports us/message for the loop and both batch modes: end to end from
+the texts, and on messages already scanned (MessageFeatures with their
+lexicon and pattern scans done), which both sides share and which dominates
+on long texts.
+
+Usage: python benchmarks/bench_batch.py [--repeat N]
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from bench_pipeline import SEED, build_corpora
+
+from main import MessageFeatures, SimulatedAIAnalyzer
+
+# Fields analyze_batch computes without random jitter
+EXACT_FIELDS = ('keywords', 'complexity', 'suspicious_phrases', 'mental_stress', 'spam_detection',
+                'phishing', 'unsafe_links')
+
+
+def analyze_loop(texts):
+    """analyze_batch's fields, one message at a time through the single-message stages."""
+    A = SimulatedAIAnalyzer
+    results = []
+    for text in texts:
+        f = MessageFeatures.of(text)
+        sentiment_type, sentiment_val = A.analyze_sentiment(f)
+        emotions = A.analyze_emotions(f)
+        toxicity = A.calculate_toxicity(f)
+        keywords = A.extract_keywords(f)
+        complexity = A.calculate_message_complexity(f)
+        risk_score = A.calculate_risk_score(sentiment_val, toxicity, keywords, complexity)
+        topic = A.detect_topic(f)
+        tone = A.classify_tone(f)
+        mental_stress = A.detect_mental_stress(f)
+        phishing = A.detect_phishing(f)
+        results.append({
+            'sentiment': {'type': sentiment_type, 'value': sentiment_val},
+            'emotions': emotions,
+            'toxicity': toxicity,
+            'keywords': keywords,
+            'complexity': complexity,
+            'suspicious_phrases': A.detect_suspicious_phrases(f),
+            'risk_score': int(risk_score),
+            'topic': topic,
+            'tone': tone,
+            'mental_stress': mental_stress,
+            'spam_detection': A.detect_spam_bot(f),
+            'phishing': phishing,
+            'unsafe_links': A.detect_unsafe_links(f),
+            'threat_level': A.calculate_threat_level(risk_score, toxicity, phishing['score'],
+                                                     mental_stress['warning_level'])
+        })
+    return results
+
+
+def analyze_batch(texts):
+    return SimulatedAIAnalyzer.analyze_batch(texts, np.random.default_rng(SEED))
+
+
+def analyze_batch_exact(texts):
+    return SimulatedAIAnalyzer.analyze_batch(texts, random.Random(SEED), exact=True)
+
+
+def time_per_message(analyze, texts, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        SimulatedAIAnalyzer.rng = random.Random(SEED)
+        start = time.perf_counter()
+        analyze(texts)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts) * 1e6
+
+
+def differences(texts):
+    """Indexes of the messages failing each check, by check name."""
+    SimulatedAIAnalyzer.rng = random.Random(SEED)
+    expected = analyze_loop(texts)
+    exact = analyze_batch_exact(texts)
+    fast = analyze_batch(texts)
+    return {
+        'exact': [i for i, (a, b) in enumerate(zip(expected, exact)) if a != b] + list(
+            range(min(len(expected), len(exact)), max(len(expected), len(exact)))),
+        'fast': [i for i, (a, b) in enumerate(zip(expected, fast))
+                 if any(a[field] != b[field] for field in EXACT_FIELDS)] + list(
+            range(min(len(expected), len(fast)), max(len(expected), len(fast)))),
+        'fast seed': [i for i, (a, b) in enumerate(zip(fast, analyze_batch(texts))) if a != b]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    corpora = build_corpora()
+    corpora['mixed'] = [text for texts in corpora.values() for text in texts]
+    failed = False
+    print(f"  {'corpus':24} {'loop us/msg':>12} {'exact us/msg':>13} {'batch us/msg':>13} {'speedup':>8}")
+    for name, texts in corpora.items():
+        mismatches = {check: found for check, found in differences(texts).items() if found}
+        if mismatches:
+            failed = True
+            for check, found in mismatches.items():
+                print(f"  {name} ({check}): {len(found)} of {len(texts)} messages differ, "
+                      f"first at index {found[0]}")
+            continue
+
+        scanned = [MessageFeatures(text) for text in texts]
+        for f in scanned:
+            f.keyword_hits, f.pattern_flags
+        for label, inputs in ((name, texts), (f'{name} scanned', scanned)):
+            loop_us = time_per_message(analyze_loop, inputs, args.repeat)
+            exact_us = time_per_message(analyze_batch_exact, inputs, args.repeat)
+            batch_us = time_per_message(analyze_batch, inputs, args.repeat)
+            print(f"  {label:24} {loop_us:12.2f} {exact_us:13.2f} {batch_us:13.2f} {loop_us / batch_us:7.2f}x")
+    SimulatedAIAnalyzer.rng = random
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""
+Deterministic benchmark suite for the local analysis pipeline.
+
+Feeds fixed corpora through every SimulatedAIAnalyzer stage and through the
+full per-message block (analyze_local_message), with the analyzer RNG seeded
+so outputs are reproducible. For each corpus and stage it reports:
+
+  ns/op       best-of-N wall time per message
+  peak B/op   tracemalloc peak allocation during a single call
+  checksum    digest of the stage's outputs (changes mean behaviour changed)
+
+Results are compared against benchmarks/baseline.json. A stage whose
+checksum differs is reported and makes the run exit non-zero. Timings are
+always shown next to the baseline's, but the baseline's absolute ns/op come
+from whatever machine recorded it, so a slowdown only fails the run with
+--check-timing (more than --tolerance slower), for comparing runs on the
+same machine.
+
+Usage:
+  python benchmarks/bench_pipeline.py                  # check outputs against baseline
+  python benchmarks/bench_pipeline.py --check-timing   # ...and fail on slowdowns too
+  python benchmarks/bench_pipeline.py --save-baseline  # record a new baseline
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# main.py needs a database URL at import time; the benchmark never touches it.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from main import ChatRoom, MessageFeatures, MessageRecord, SimulatedAIAnalyzer, analyze_local_message
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SEED = 1337
+
+
+def build_corpora(seed=SEED):
+    """Fixed message corpora, generated from a seeded RNG."""
+    rng = random.Random(seed)
+    chat_words = ['hey', 'lol', 'ok', 'sure', 'what', 'are', 'you', 'doing', 'tonight', 'haha', 'love',
+                  'this', 'game', 'tired', 'exam', 'tomorrow', 'friends', 'party', 'cool', 'nah', 'why', 'not']
+    prose_words = ['because', 'therefore', 'analysis', 'family', 'relationship', 'anxious', 'project',
+                   'university', 'overwhelmed', 'important', 'concern', 'meeting', 'budget', 'doctor',
+                   'sleep', 'community', 'together', 'first', 'second', 'plan', 'organize', 'reason']
+    spam_hosts = ['bit.ly/x1', 'tinyurl.com/abc', 'free-gifts.xyz/claim', 'prize.tk', 'deal.ml',
+                  '192.168.10.4/free-download', 'hidden.onion/login', 'example.com/page']
+    spam_lines = ['CLICK HERE to claim your reward', 'verify your account immediately',
+                  'You WON a prize!!!', 'send money via western union', 'limited time, buy now']
+
+    short_chat = [' '.join(rng.choice(chat_words) for _ in range(rng.randint(1, 8))) + rng.choice(['', '?', '!', ' lol'])
+                  for _ in range(200)]
+    long_paragraphs = ['. '.join(' '.join(rng.choice(prose_words) for _ in range(rng.randint(8, 16)))
+                                 for _ in range(rng.randint(4, 8))) for _ in range(40)]
+    url_spam = [' '.join([rng.choice(spam_lines)] + [f"http{rng.choice(['', 's'])}://{rng.choice(spam_hosts)}"
+                                                     for _ in range(rng.randint(1, 5))]) for _ in range(100)]
+    adversarial = [
+        'a' * 2000, '!' * 1000, 'ha' * 800, 'A' * 500 + 'b' * 500, 'x' * 19 + ' ' + 'y' * 21,
+        'verify ' * 200, 'http://' * 150, '.' * 1500, ('lol' * 10 + ' ') * 40, 'AAAAAaaaaa' * 100,
+    ] * 5
+
+    return {
+        'short_chat': short_chat,
+        'long_paragraphs': long_paragraphs,
+        'url_spam': url_spam,
+        'adversarial': adversarial,
+    }
+
+
+def analyzer_stages():
+    """(name, callable taking MessageFeatures) for each per-message stage."""
+    A = SimulatedAIAnalyzer
+    return [
+        ('analyze_sentiment', A.analyze_sentiment),
+        ('analyze_emotions', A.analyze_emotions),
+        ('calculate_toxicity', A.calculate_toxicity),
+        ('extract_keywords', A.extract_keywords),
+        ('calculate_message_complexity', A.calculate_message_complexity),
+        ('detect_suspicious_phrases', A.detect_suspicious_phrases),
+        ('detect_topic', A.detect_topic),
+        ('classify_tone', A.classify_tone),
+        ('detect_mental_stress', A.detect_mental_stress),
+        ('personality_pattern_counts', A.personality_pattern_counts),
+        ('detect_spam_bot', A.detect_spam_bot),
+        ('detect_phishing', A.detect_phishing),
+        ('detect_unsafe_links', A.detect_unsafe_links),
+    ]
+
+
+def checksum(outputs):
+    return hashlib.sha256(repr(outputs).encode()).hexdigest()[:16]
+
+
+def make_pipeline_run(texts):
+    """Return a function that pushes every text through a fresh room."""
+    def run():
+        room = ChatRoom('bench')
+        outputs = []
+        for i, text in enumerate(texts):
+            message = MessageRecord(id=f'bench-{i}', user_id='bench', username='bench',
+                                    text=text, timestamp=f'2025-01-01T00:00:{i % 60:02d}')
+            room.messages.append(message)
+            room.timestamps.record(now=i * 1.5)
+            outputs.append(analyze_local_message(room, message, MessageFeatures(text)))
+        return outputs
+    return run
+
+
+def measure(run, ops, repeat):
+    """Best-of-`repeat` ns/op for run(), which performs `ops` operations."""
+    best = float('inf')
+    for _ in range(repeat):
+        SimulatedAIAnalyzer.rng = random.Random(SEED)
+        start = time.perf_counter_ns()
+        run()
+        best = min(best, time.perf_counter_ns() - start)
+    return best / ops
+
+
+def peak_bytes_per_op(call, inputs):
+    """Mean tracemalloc peak over single calls."""
+    total = 0
+    tracemalloc.start()
+    try:
+        for item in inputs:
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            call(item)
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - current
+    finally:
+        tracemalloc.stop()
+    return total / max(len(inputs), 1)
+
+
+def run_suite(repeat, alloc_sample):
+    results = {}
+    for corpus_name, texts in build_corpora().items():
+        corpus = results[corpus_name] = {}
+        features = [MessageFeatures(text) for text in texts]
+        # Warm the lazy scans so each stage is timed on its own work
+        for f in features:
+            f.keyword_hits, f.pattern_flags, f.cloud_words
+
+        sample = texts[:alloc_sample]
+        corpus['message_features'] = {
+            'ns_per_op': measure(lambda: [MessageFeatures(t).keyword_hits for t in texts], len(texts), repeat),
+            'peak_bytes_per_op': peak_bytes_per_op(lambda t: MessageFeatures(t).pattern_flags, sample),
+            'checksum': checksum([(f.word_count, f.keyword_hits, sorted(f.pattern_flags)) for f in features]),
+        }
+
+        for stage, fn in analyzer_stages():
+            def run(fn=fn):
+                return [fn(f) for f in features]
+            SimulatedAIAnalyzer.rng = random.Random(SEED)
+            outputs = run()
+            corpus[stage] = {
+                'ns_per_op': measure(run, len(features), repeat),
+                'peak_bytes_per_op': peak_bytes_per_op(fn, features[:alloc_sample]),
+                'checksum': checksum(outputs),
+            }
+
+        pipeline = make_pipeline_run(texts)
+        SimulatedAIAnalyzer.rng = random.Random(SEED)
+        outputs = pipeline()
+        sample_pipeline = make_pipeline_run(sample)
+        corpus['analyze_local_message'] = {
+            'ns_per_op': measure(pipeline, len(texts), repeat),
+            'peak_bytes_per_op': peak_bytes_per_op(lambda _: sample_pipeline(), [None]) / max(len(sample), 1),
+            'checksum': checksum(outputs),
+        }
+    SimulatedAIAnalyzer.rng = random
+    return results
+
+
+def compare(results, baseline, tolerance, check_timing=False):
+    """Print a report; return the list of regressions."""
+    regressions = []
+    for corpus_name, stages in results.items():
+        print(f"\n[{corpus_name}]")
+        print(f"  {'stage':32} {'ns/op':>12} {'baseline':>12} {'ratio':>7} {'peak B/op':>11}")
+        for stage, current in stages.items():
+            base = baseline.get(corpus_name, {}).get(stage)
+            ratio = current['ns_per_op'] / base['ns_per_op'] if base else None
+            flag = ''
+            if base and ratio > 1 + tolerance:
+                flag = '  SLOWER'
+                if check_timing:
+                    regressions.append(f"{corpus_name}/{stage}: {ratio:.2f}x baseline")
+            if base and base.get('checksum') != current['checksum']:
+                flag += '  OUTPUT CHANGED'
+                regressions.append(f"{corpus_name}/{stage}: checksum {base['checksum']} -> {current['checksum']}")
+            print(f"  {stage:32} {current['ns_per_op']:12.0f} "
+                  f"{base['ns_per_op'] if base else float('nan'):12.0f} "
+                  f"{ratio if ratio else float('nan'):7.2f} {current['peak_bytes_per_op']:11.0f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--alloc-sample', type=int, default=20,
+                        help='messages per corpus measured under tracemalloc')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown vs. baseline before flagging (0.25 = 25%%)')
+    parser.add_argument('--check-timing', action='store_true',
+                        help='fail on slowdowns beyond --tolerance, not only on changed outputs')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = run_suite(args.repeat, args.alloc_sample)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        compare(results, results, args.tolerance)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.check_timing)
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
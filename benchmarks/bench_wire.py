@@ -0,0 +1,111 @@
+"""
+Encode time and size of the hot events: wire codec vs. json.dumps.
+
+Pushes the bench_pipeline corpora through a room, the way handle_message
+does, and collects what goes on the wire: every new_message payload, every
+dashboard_update patch and the final full snapshot. For each it reports
+us/event and bytes/event for json.dumps (what a JSON client costs; the
+Socket.IO layer does this per emit), plain msgpack.packb, and the wire
+codec. Every codec output is decoded the way static/chat.js does it and
+must equal the JSON round trip, or the script fails.
+
+Usage: python benchmarks/bench_wire.py [--repeat N]
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import msgpack
+
+from bench_pipeline import build_corpora
+
+from main import (AI_MESSAGE_FIELDS, ChatRoom, MessageFeatures, MessageRecord, analyze_local_message,
+                  wire_codec)
+
+
+def collect_events(texts):
+    """new_message payloads, dashboard patches and the final snapshot for `texts`."""
+    room = ChatRoom('bench')
+    messages, patches = [], []
+    for i, text in enumerate(texts):
+        message = MessageRecord(id=f'bench-{i}', user_id='bench', username='bench',
+                                text=text, timestamp=f'2025-01-01T00:00:{i % 60:02d}')
+        room.messages.append(message)
+        room.timestamps.record(now=i * 1.5)
+        messages.append({'id': message.id, 'username': message.username, 'text': text,
+                         'timestamp': message.timestamp, 'user_id': message.user_id})
+        dashboard = analyze_local_message(room, message, MessageFeatures(text))
+        dashboard.update(dict.fromkeys(AI_MESSAGE_FIELDS))
+        patches.append(room.dashboard.update(dashboard))
+    return {'new_message': messages, 'patch': patches, 'snapshot': [room.dashboard.full()]}
+
+
+def expand(value, schema, parent=None, field=None):
+    """Python copy of chat.js expandWire."""
+    vectors = schema['vectors']
+    vector = None if field is None else vectors.get(f'{parent}.{field}') or vectors.get(field)
+    if vector and isinstance(value, list) and (not value or isinstance(value[0], list)):
+        return [expand(item, schema, parent, field) for item in value]
+    if vector and isinstance(value, (list, int)) and not isinstance(value, bool):
+        if vector['flags']:
+            return {name: bool(value & (1 << i)) for i, name in enumerate(vector['fields'])}
+        return dict(zip(vector['fields'], value))
+    if isinstance(value, list):
+        return [expand(item, schema, parent, field) for item in value]
+    if isinstance(value, dict):
+        expanded = {}
+        for key, item in value.items():
+            key = str(key)
+            name = schema['keys'][int(key)] if key.isdigit() else key[1:] if key.startswith('~') else key
+            expanded[name] = expand(item, schema, field, name)
+        return expanded
+    return value
+
+
+def time_per_event(encode, events, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for event in events:
+            encode(event)
+        best = min(best, time.perf_counter() - start)
+    return best / len(events) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    texts = [text for corpus in build_corpora().values() for text in corpus]
+    events = collect_events(texts)
+    encoders = {
+        'json.dumps': lambda data: json.dumps(data).encode(),
+        'msgpack.packb': lambda data: msgpack.packb(data, use_bin_type=True),
+        'wire codec': wire_codec.encode,
+    }
+
+    schema = json.loads(json.dumps(wire_codec.schema()))
+    failed = False
+    for kind, payloads in events.items():
+        mismatches = [i for i, data in enumerate(payloads)
+                      if expand(msgpack.unpackb(wire_codec.encode(data), strict_map_key=False), schema)
+                      != json.loads(json.dumps(data))]
+        if mismatches:
+            failed = True
+            print(f"  {kind}: {len(mismatches)} of {len(payloads)} events decode differently, "
+                  f"first at index {mismatches[0]}")
+
+    print(f"  {'event':12} {'encoder':14} {'us/event':>9} {'bytes/event':>12}")
+    for kind, payloads in events.items():
+        for name, encode in encoders.items():
+            us = time_per_event(encode, payloads, args.repeat)
+            size = sum(len(encode(data)) for data in payloads) / len(payloads)
+            print(f"  {kind:12} {name:14} {us:9.1f} {size:12.0f}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
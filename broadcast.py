@@ -0,0 +1,80 @@
+"""
+Tick-based batching of a room's chat messages.
+
+In a busy room every message is its own frame to every participant. A
+TickBroadcaster holds messages for a short tick and sends them as one batch.
+The tick follows the room's message rate: below `quiet_rate` messages per
+second messages go out immediately, from `quiet_rate` to `busy_rate` the tick
+grows linearly from `min_tick` to `max_tick`, and above that it stays at
+`max_tick`. Quiet rooms see no added latency; busy ones send fewer frames.
+"""
+
+import eventlet
+
+
+class TickBroadcaster:
+    """
+    Batching sender for one room.
+
+    send_one(message) sends a single message and send_batch(messages) several
+    in one frame; both are called in submission order. A tick that collected
+    only one message sends it with send_one.
+    """
+
+    def __init__(self, send_one, send_batch, min_tick=0.02, max_tick=0.05, quiet_rate=2.0, busy_rate=20.0):
+        self.send_one = send_one
+        self.send_batch = send_batch
+        self.min_tick = min_tick
+        self.max_tick = max_tick
+        self.quiet_rate = quiet_rate
+        self.busy_rate = busy_rate
+        self._pending = []
+        self._timer = None
+        self.messages = 0
+        self.frames = 0
+        self.largest_batch = 0
+
+    def interval(self, rate):
+        """Tick length for a room sending `rate` messages per second (0: send now)."""
+        if rate < self.quiet_rate:
+            return 0.0
+        if rate >= self.busy_rate:
+            return self.max_tick
+        share = (rate - self.quiet_rate) / (self.busy_rate - self.quiet_rate)
+        return self.min_tick + share * (self.max_tick - self.min_tick)
+
+    def submit(self, message, rate):
+        self.messages += 1
+        tick = self.interval(rate)
+        if tick <= 0 and not self._pending:
+            self._send([message])
+            return
+        self._pending.append(message)
+        if self._timer is None:
+            self._timer = eventlet.spawn_after(tick, self.flush)
+
+    def flush(self):
+        """Send whatever the current tick collected."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch):
+        self.frames += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        if len(batch) == 1:
+            self.send_one(batch[0])
+        else:
+            self.send_batch(batch)
+
+    def stats(self):
+        return {
+            'messages': self.messages,
+            'frames': self.frames,
+            'messages_per_frame': round(self.messages / self.frames, 2) if self.frames else None,
+            'largest_batch': self.largest_batch,
+            'pending': len(self._pending)
+        }
@@ -0,0 +1,205 @@
+"""
+Response cache for AI calls.
+
+Answers are keyed on the prompt (version and text), the normalised message
+text and a hash of the context window, so repeated content ("hi", "lol",
+spam) is answered locally. Entries live in an in-memory LRU with a TTL;
+an optional SQLite file keeps warm entries across restarts.
+"""
+
+import atexit
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+
+from eventlet import tpool
+from eventlet.semaphore import Semaphore
+
+
+def normalize_text(text):
+    """Case-fold and collapse whitespace so near-identical messages share a key."""
+    return ' '.join(text.casefold().split())
+
+
+def cache_key(prompt_version, prompt, text, context=''):
+    """Stable key for one AI request."""
+    digest = hashlib.sha256()
+    for part in (str(prompt_version), prompt, normalize_text(text), context):
+        digest.update(hashlib.sha256(part.encode('utf-8')).digest())
+    return digest.hexdigest()
+
+
+class SqliteCacheStore:
+    """
+    Persistent second tier: key -> (JSON value, stored_at) in one SQLite table.
+
+    Queries run on eventlet's thread pool, one at a time, so disk I/O never
+    blocks the event loop. Writes are buffered and committed `batch_size`
+    at a time (reads see the buffer); close() commits what is left, and
+    runs at interpreter exit.
+    """
+
+    def __init__(self, path, max_entries=10000, batch_size=20):
+        self.path = path
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS responses '
+                         '(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)')
+        self._db.commit()
+        self._pending = {}  # key -> (JSON value, stored_at), not yet written
+        self._lock = Semaphore()
+        self._writes = 0
+        atexit.register(self.close)
+
+    def get(self, key):
+        if key in self._pending:
+            value, stored_at = self._pending[key]
+            return json.loads(value), stored_at
+        row = self._execute(self._select, key)
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put(self, key, value, stored_at):
+        self._pending[key] = (json.dumps(value), stored_at)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def delete(self, key):
+        self._pending.pop(key, None)
+        self._execute(self._delete, key)
+
+    def flush(self):
+        """Write the buffered entries in one transaction, off the event loop."""
+        with self._lock:
+            rows, self._pending = self._pending, {}
+            if rows:
+                tpool.execute(self._write, rows)
+
+    def close(self):
+        atexit.unregister(self.close)
+        with self._lock:
+            rows, self._pending = self._pending, {}
+            if rows:
+                self._write(rows)
+
+    def trim(self, older_than=None):
+        """Drop entries stored before `older_than`, then the oldest beyond max_entries."""
+        self._execute(self._trim, older_than)
+
+    def __len__(self):
+        return self._execute(self._count)
+
+    def _execute(self, query, *args):
+        with self._lock:
+            return tpool.execute(query, *args)
+
+    def _select(self, key):
+        return self._db.execute('SELECT value, stored_at FROM responses WHERE key = ?', (key,)).fetchone()
+
+    def _delete(self, key):
+        self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+        self._db.commit()
+
+    def _write(self, rows):
+        self._db.executemany('INSERT OR REPLACE INTO responses (key, value, stored_at) VALUES (?, ?, ?)',
+                             [(key, value, stored_at) for key, (value, stored_at) in rows.items()])
+        self._writes += len(rows)
+        if self._writes >= 100:
+            self._writes = 0
+            self._trim()
+        self._db.commit()
+
+    def _trim(self, older_than=None):
+        if older_than is not None:
+            self._db.execute('DELETE FROM responses WHERE stored_at < ?', (older_than,))
+        self._db.execute('DELETE FROM responses WHERE key NOT IN '
+                         '(SELECT key FROM responses ORDER BY stored_at DESC LIMIT ?)', (self.max_entries,))
+        self._db.commit()
+
+    def _count(self):
+        return self._db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+
+class ResponseCache:
+    """
+    LRU cache of parsed AI answers with a time-to-live.
+
+    get() returns None on a miss; expired entries count as misses and are
+    dropped. When a store is given, misses fall through to it and hits are
+    promoted back into memory; every put() is written through.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600.0, store=None, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if store is not None and ttl:
+            store.trim(older_than=clock() - ttl)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is None and self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None and not self._expired(entry, now):
+                self.disk_hits += 1
+                self._remember(key, entry)
+        if entry is None:
+            self.misses += 1
+            return None
+        if self._expired(entry, now):
+            self._entries.pop(key, None)
+            if self.store is not None:
+                self.store.delete(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        entry = (value, self.clock())
+        self._remember(key, entry)
+        if self.store is not None:
+            self.store.put(key, *entry)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'disk_entries': len(self.store) if self.store is not None else None
+        }
+
+    def _expired(self, entry, now):
+        return bool(self.ttl) and now - entry[1] > self.ttl
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,511 @@
+"""
+Shared room state and pub/sub, so several workers can serve the same rooms.
+
+A room backend is a small Redis-like store: string keys with optional
+expiry, hashes, and publish/listen channels. Two implementations:
+
+  MemoryBackend  in-process; the default, for a single worker
+  RespBackend    speaks the Redis protocol (RESP2) to a Redis server, or to
+                 the local stand-in in miniredis.py
+
+On top of a backend:
+
+  RoomDirectory   which rooms exist, who is in them, and which worker owns
+                  each room's analysis state (a lease renewed by the owner)
+  RoomRouter      runs room work on the owning worker, forwarding it over
+                  the owner's channel when it arrives somewhere else
+  BackendManager  a python-socketio client manager that routes every emit
+                  through the backend, so broadcasts reach clients connected
+                  to any worker
+"""
+
+import pickle
+import select
+import socket
+import time
+import uuid
+from collections import deque
+from urllib.parse import urlparse
+
+import eventlet
+from eventlet.queue import LightQueue
+import socketio
+
+
+class BackendError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class MemoryBackend:
+    """
+    Room backend kept in this process.
+
+    Values are stored as strings, like Redis, so callers behave the same on
+    either backend. Not shared: every worker would see its own copy.
+    """
+
+    shared = False
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._values = {}    # key -> (value, expires_at or None)
+        self._hashes = {}    # key -> {field: value}
+        self._listeners = {}  # channel -> [LightQueue]
+
+    def get(self, key):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and self.clock() >= expires_at:
+            del self._values[key]
+            return None
+        return value
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and self.get(key) is not None:
+            return False
+        expires_at = self.clock() + px / 1000 if px else None
+        self._values[key] = (str(value), expires_at)
+        return True
+
+    def pexpire(self, key, px):
+        if self.get(key) is None:
+            return False
+        self._values[key] = (self._values[key][0], self.clock() + px / 1000)
+        return True
+
+    def extend_if(self, key, value, px):
+        """Reset the key's expiry to `px` ms if it still holds `value`."""
+        if self.get(key) != str(value):
+            return False
+        return self.pexpire(key, px)
+
+    def delete_if(self, key, value):
+        """Delete the key if it still holds `value`."""
+        if self.get(key) != str(value):
+            return False
+        return self.delete(key)
+
+    def delete(self, key):
+        found = self._values.pop(key, None) is not None
+        return self._hashes.pop(key, None) is not None or found
+
+    def hset(self, key, field, value):
+        self._hashes.setdefault(key, {})[field] = str(value)
+
+    def hget(self, key, field):
+        return self._hashes.get(key, {}).get(field)
+
+    def hdel(self, key, field):
+        fields = self._hashes.get(key, {})
+        removed = fields.pop(field, None) is not None
+        if not fields:
+            self._hashes.pop(key, None)
+        return removed
+
+    def hgetall(self, key):
+        return dict(self._hashes.get(key, {}))
+
+    def hlen(self, key):
+        return len(self._hashes.get(key, {}))
+
+    def hincrby(self, key, field, amount=1):
+        fields = self._hashes.setdefault(key, {})
+        value = int(fields.get(field, 0)) + amount
+        fields[field] = str(value)
+        return value
+
+    def publish(self, channel, payload):
+        listeners = self._listeners.get(channel, ())
+        for queue in listeners:
+            queue.put(payload)
+        return len(listeners)
+
+    def listen(self, channel):
+        """Yield every payload published on `channel` from now on."""
+        queue = LightQueue()
+        self._listeners.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                yield queue.get()
+        finally:
+            self._listeners[channel].remove(queue)
+
+
+class RespBackend:
+    """
+    Room backend on a Redis-protocol server (redis://host:port/db).
+
+    Commands go over a small pool of connections, one per concurrent green
+    thread. A pooled connection the server has closed (restart, idle
+    timeout) is replaced before use, and a command that fails before any of
+    it was sent is retried once on a fresh connection; one that fails after
+    is not, since the server may have run it. Each listen() holds its own
+    subscribed connection and reconnects if it drops.
+    """
+
+    shared = True
+
+    def __init__(self, url, timeout=5.0, reconnect_delay=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self._idle = deque()
+
+    def get(self, key):
+        return self._command('GET', key)
+
+    def set(self, key, value, nx=False, px=None):
+        args = ['SET', key, value]
+        if nx:
+            args.append('NX')
+        if px:
+            args += ['PX', int(px)]
+        return self._command(*args) == 'OK'
+
+    def pexpire(self, key, px):
+        return self._command('PEXPIRE', key, int(px)) == 1
+
+    def extend_if(self, key, value, px):
+        """Reset the key's expiry to `px` ms if it still holds `value`."""
+        return self._if_holds(key, value, 'SET', key, value, 'XX', 'PX', int(px))
+
+    def delete_if(self, key, value):
+        """Delete the key if it still holds `value`."""
+        return self._if_holds(key, value, 'DEL', key)
+
+    def _if_holds(self, key, value, *command):
+        """Run `command` only if `key` holds `value`, atomically (WATCH/MULTI/EXEC)."""
+        def transaction(connection):
+            connection.call('WATCH', key)
+            if connection.call('GET', key) != str(value):
+                connection.call('UNWATCH')
+                return False
+            connection.call('MULTI')
+            connection.call(*command)
+            # None: the key changed after WATCH and the command was not run
+            replies = connection.call('EXEC')
+            return replies is not None and bool(replies[0])
+        return self._run(transaction, transaction=True)
+
+    def delete(self, key):
+        return self._command('DEL', key) > 0
+
+    def hset(self, key, field, value):
+        self._command('HSET', key, field, value)
+
+    def hget(self, key, field):
+        return self._command('HGET', key, field)
+
+    def hdel(self, key, field):
+        return self._command('HDEL', key, field) > 0
+
+    def hgetall(self, key):
+        flat = self._command('HGETALL', key)
+        return dict(zip(flat[::2], flat[1::2]))
+
+    def hlen(self, key):
+        return self._command('HLEN', key)
+
+    def hincrby(self, key, field, amount=1):
+        return self._command('HINCRBY', key, field, amount)
+
+    def publish(self, channel, payload):
+        return self._command('PUBLISH', channel, payload)
+
+    def listen(self, channel):
+        """Yield every payload (bytes) published on `channel` from now on."""
+        while True:
+            try:
+                connection = self._connect()
+            except OSError:
+                eventlet.sleep(self.reconnect_delay)
+                continue
+            try:
+                connection.sock.settimeout(None)
+                connection.send('SUBSCRIBE', channel)
+                while True:
+                    reply = connection.read(decode=False)
+                    if isinstance(reply, list) and reply[0] == b'message':
+                        yield reply[2]
+            except (OSError, BackendError):
+                eventlet.sleep(self.reconnect_delay)
+            finally:
+                connection.close()
+
+    def _command(self, *args):
+        return self._run(lambda connection: connection.call(*args))
+
+    def _run(self, work, transaction=False):
+        """
+        Call work(connection) on a pooled connection and return its result.
+
+        A connection that failed inside a transaction is closed rather than
+        pooled, as it may still be in WATCH or MULTI.
+        """
+        for attempt in range(2):
+            connection = self._checkout()
+            try:
+                result = work(connection)
+            except OSError:
+                connection.close()
+                if attempt == 0 and not connection.sent:
+                    continue
+                raise
+            except BackendError:
+                if transaction:
+                    connection.close()
+                else:
+                    self._idle.append(connection)
+                raise
+            self._idle.append(connection)
+            return result
+
+    def _checkout(self):
+        """An idle connection the server hasn't closed, else a new one."""
+        while self._idle:
+            connection = self._idle.pop()
+            if connection.usable():
+                connection.sent = False
+                return connection
+            connection.close()
+        return self._connect()
+
+    def _connect(self):
+        connection = RespConnection(socket.create_connection((self.host, self.port), self.timeout))
+        if self.password:
+            connection.send('AUTH', self.password)
+            connection.read()
+        if self.db:
+            connection.send('SELECT', self.db)
+            connection.read()
+        connection.sent = False
+        return connection
+
+
+class RespConnection:
+    """One socket speaking RESP2."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+        self.sent = False  # whether anything was written since checkout
+
+    def send(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        # sendall raises only if it couldn't write the whole command, and the
+        # server never runs a partial one
+        self.sock.sendall(b''.join(parts))
+        self.sent = True
+
+    def usable(self):
+        """False once the server has closed the connection (or sent something unasked)."""
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def call(self, *args):
+        self.send(*args)
+        return self.read()
+
+    def read(self, decode=True):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('connection closed by server')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise BackendError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self.reader.read(size + 2)[:-2]
+            return data.decode() if decode else data
+        if kind == b'*':
+            size = int(rest)
+            return None if size < 0 else [self.read(decode) for _ in range(size)]
+        raise BackendError(f'unexpected reply {line!r}')
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def backend_from_url(url):
+    """RespBackend for redis:// URLs, MemoryBackend when no URL is set."""
+    if not url:
+        return MemoryBackend()
+    if urlparse(url).scheme not in ('redis', 'resp'):
+        raise ValueError(f'unsupported room backend URL: {url}')
+    return RespBackend(url)
+
+
+class RoomDirectory:
+    """
+    Rooms, their users, and which worker owns each room.
+
+    The owner holds the room's ChatRoom (analysis state). Ownership is a
+    lease: taken by the first worker that needs the room, renewed by the
+    owner every `lease_ttl / 3` seconds, and up for grabs once it lapses
+    (the new owner starts from a fresh ChatRoom). With lease_ttl=None the
+    lease never lapses.
+    """
+
+    def __init__(self, backend, worker_id=None, lease_ttl=10.0):
+        self.backend = backend
+        self.worker_id = worker_id or uuid.uuid4().hex[:12]
+        self.lease_ttl = lease_ttl
+        self.owned = set()
+
+    def exists(self, room_id):
+        return self.backend.hget('rooms', room_id) is not None
+
+    def add_user(self, room_id, user_id, username):
+        """Record a user in a room and return the room's user count."""
+        self.backend.hset('rooms', room_id, '1')
+        self.backend.hset(f'room:{room_id}:users', user_id, username)
+        return self.backend.hlen(f'room:{room_id}:users')
+
+    def remove_user(self, room_id, user_id):
+        self.backend.hdel(f'room:{room_id}:users', user_id)
+
+    def claim(self, room_id):
+        """The room's owner, taking the lease for this worker if nobody holds it."""
+        key = f'room:{room_id}:owner'
+        px = self.lease_ttl * 1000 if self.lease_ttl else None
+        for _ in range(2):
+            if self.backend.set(key, self.worker_id, nx=True, px=px):
+                self.owned.add(room_id)
+                return self.worker_id
+            owner = self.backend.get(key)
+            if owner is not None:
+                if owner != self.worker_id:
+                    self.owned.discard(room_id)
+                return owner
+        return self.worker_id
+
+    def release(self, room_id, owner):
+        """Drop `owner`'s lease on a room, if it still holds it."""
+        if self.backend.delete_if(f'room:{room_id}:owner', owner):
+            self.owned.discard(room_id)
+            return True
+        return False
+
+    def renew(self):
+        """Extend the leases this worker still holds; return rooms it lost."""
+        lost = set()
+        for room_id in list(self.owned):
+            if self.backend.extend_if(f'room:{room_id}:owner', self.worker_id, self.lease_ttl * 1000):
+                continue
+            self.owned.discard(room_id)
+            lost.add(room_id)
+        return lost
+
+
+class RoomRouter:
+    """
+    Runs room work where the room's state lives.
+
+    dispatch(room_id, kind, *args) calls handlers[kind](*args) here if this
+    worker owns the room, and otherwise publishes it on the owner's
+    channel, where the owner's listener calls the same handler. If nobody
+    is listening there the owner is gone: its lease is dropped and the room
+    claimed again, so the work isn't lost until the lease would lapse.
+    """
+
+    def __init__(self, backend, directory, handlers, on_lost=None):
+        self.backend = backend
+        self.directory = directory
+        self.handlers = handlers
+        self.on_lost = on_lost
+        self.local = 0
+        self.forwarded = 0
+        self.received = 0
+        self.taken_over = 0
+
+    @property
+    def channel(self):
+        return f'worker:{self.directory.worker_id}'
+
+    def dispatch(self, room_id, kind, *args):
+        for _ in range(2):
+            owner = self.directory.claim(room_id)
+            if owner == self.directory.worker_id:
+                self.local += 1
+                self.handlers[kind](*args)
+                return
+            if self.backend.publish(f'worker:{owner}', pickle.dumps((kind, args))):
+                self.forwarded += 1
+                return
+            self.directory.release(room_id, owner)
+            self.taken_over += 1
+        print(f"Dropped {kind} for room {room_id}: owner {owner} is not listening")
+
+    def start(self):
+        """Listen for forwarded work and keep leases alive (shared backends only)."""
+        if not self.backend.shared:
+            return
+        eventlet.spawn_n(self._listen)
+        if self.directory.lease_ttl:
+            eventlet.spawn_n(self._renew)
+
+    def _listen(self):
+        for payload in self.backend.listen(self.channel):
+            kind, args = pickle.loads(payload)
+            self.received += 1
+            eventlet.spawn_n(self.handlers[kind], *args)
+
+    def _renew(self):
+        while True:
+            eventlet.sleep(self.directory.lease_ttl / 3)
+            try:
+                lost = self.directory.renew()
+            except (OSError, BackendError) as e:
+                print(f"Room lease renewal failed: {e}")
+                continue
+            if lost and self.on_lost:
+                self.on_lost(lost)
+
+    def stats(self):
+        return {
+            'worker_id': self.directory.worker_id,
+            'shared': self.backend.shared,
+            'owned_rooms': sorted(self.directory.owned),
+            'local': self.local,
+            'forwarded': self.forwarded,
+            'received': self.received,
+            'taken_over': self.taken_over
+        }
+
+
+class BackendManager(socketio.PubSubManager):
+    """Socket.IO client manager that publishes every emit through a room backend."""
+
+    name = 'room-backend'
+
+    def __init__(self, backend, channel='socketio', write_only=False, logger=None):
+        self.backend = backend
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _publish(self, data):
+        self.backend.publish(self.channel, pickle.dumps(data))
+
+    def _listen(self):
+        yield from self.backend.listen(self.channel)
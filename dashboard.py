@@ -0,0 +1,113 @@
+"""
+Versioned dashboard state.
+
+Each room keeps the last dashboard snapshot it sent and a version number.
+Instead of the whole snapshot, every update emits a patch against the
+previous version:
+
+  set     fields whose value changed (replaced as a whole)
+  append  sliding-window lists: only the new items, plus how many to keep
+  merge   dicts that only gained or changed keys: just those keys
+
+Clients that miss a version ask for a resync and get the missing patches,
+or a full snapshot when those are no longer kept or when fields were
+amended outside patches (AI follow-ups) since the client's version.
+"""
+
+import copy
+import uuid
+from collections import deque
+
+
+class DashboardState:
+    """
+    Versioned snapshot of one room's dashboard.
+
+    `epoch` changes whenever the state is recreated (e.g. a server restart),
+    so clients never apply a patch to a snapshot from an earlier run.
+    """
+
+    def __init__(self, history=32):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.snapshot = {}
+        self._patches = deque(maxlen=history)
+        self._amended = None  # version the last amend() was made at
+
+    def update(self, fields):
+        """Apply new field values and return the patch from the previous version."""
+        patch = {'epoch': self.epoch, 'base': self.version}
+        changes = diff_fields(self.snapshot, fields)
+        # Copy, so later in-place changes to room state can't alter the
+        # snapshot or kept patches; 'set' values share the snapshot's copy.
+        for kind, values in changes.items():
+            for field in values:
+                self.snapshot[field] = copy.deepcopy(fields[field])
+            if kind == 'set':
+                changes[kind] = {field: self.snapshot[field] for field in values}
+            else:
+                changes[kind] = copy.deepcopy(values)
+        self.version += 1
+        patch['version'] = self.version
+        patch.update({kind: values for kind, values in changes.items() if values})
+        self._patches.append(patch)
+        return patch
+
+    def amend(self, fields):
+        """Record fields delivered outside patches (AI follow-ups) so a full resync includes them."""
+        for field, value in fields.items():
+            self.snapshot[field] = copy.deepcopy(value)
+        if fields:
+            self._amended = self.version
+
+    def full(self):
+        return {'epoch': self.epoch, 'version': self.version, 'full': self.snapshot}
+
+    def since(self, epoch, version):
+        """Patches that bring a client at (epoch, version) up to date, or None if a full resync is needed."""
+        if epoch != self.epoch or version > self.version:
+            return None
+        # Amendments aren't in the patches; a client that may have missed one
+        # needs the snapshot
+        if self._amended is not None and self._amended >= version:
+            return None
+        if version == self.version:
+            return []
+        patches = [patch for patch in self._patches if patch['base'] >= version]
+        if not patches or patches[0]['base'] != version:
+            return None
+        return patches
+
+
+def diff_fields(old, new):
+    """Split the fields of `new` that differ from `old` into set / append / merge changes."""
+    changes = {'set': {}, 'append': {}, 'merge': {}}
+    for field, value in new.items():
+        if field in old and old[field] == value:
+            continue
+        previous = old.get(field)
+        if isinstance(value, list) and isinstance(previous, list):
+            added = appended_items(previous, value)
+            if added is not None and len(added) < len(value):
+                changes['append'][field] = {'items': added, 'keep': len(value)}
+                continue
+        if isinstance(value, dict) and isinstance(previous, dict) and previous.keys() <= value.keys():
+            changed = {key: item for key, item in value.items()
+                       if key not in previous or previous[key] != item}
+            if len(changed) < len(value):
+                changes['merge'][field] = changed
+                continue
+        changes['set'][field] = value
+    return changes
+
+
+def appended_items(old, new):
+    """
+    If `new` is `old` with items dropped from the front and appended at the
+    back (a sliding window), return the appended items, else None.
+    """
+    for start in range(len(old) + 1):
+        overlap = len(old) - start
+        if overlap <= len(new) and old[start:] == new[:overlap]:
+            return new[overlap:]
+    return None
@@ -0,0 +1,115 @@
+"""
+Deadline-bound AI calls with optional hedging.
+
+Every call gets a hard time limit, after which it is abandoned and
+DeadlineExceeded is raised, so a stuck request can never hold a handler for
+longer than its budget. With hedging on, a call that has not answered by the
+p95 latency observed for its kind of request gets a second, identical
+request; whichever answers first wins and the other is cancelled.
+"""
+
+import time
+from collections import deque
+
+import eventlet
+from eventlet.queue import Empty, LightQueue
+
+
+class DeadlineExceeded(Exception):
+    """The call did not answer before its deadline."""
+
+
+class DeadlineRunner:
+    """
+    Runs calls under a timeout, keeping a window of recent latencies per key
+    (e.g. per prompt) to decide when to hedge.
+
+    Hedging needs `min_samples` latencies for the key and is skipped when
+    the hedge point falls after the deadline, or when allow_hedge() refuses
+    (e.g. no rate-limit token to spare).
+    """
+
+    def __init__(self, hedge=False, quantile=0.95, window=200, min_samples=20):
+        self.hedge = hedge
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies = {}
+        self.calls = 0
+        self.deadline_exceeded = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def latency_quantile(self, key):
+        """The configured latency quantile for key, or None while there are too few samples."""
+        samples = self._latencies.get(key)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+
+    def call(self, key, fn, timeout, allow_hedge=None):
+        """Return fn() if it answers within `timeout` seconds, else raise DeadlineExceeded."""
+        self.calls += 1
+        if timeout <= 0:
+            self.deadline_exceeded += 1
+            raise DeadlineExceeded("deadline passed before the call started")
+
+        outcomes = LightQueue()
+
+        def attempt(index):
+            started = time.monotonic()
+            try:
+                value = fn()
+            except Exception as e:
+                outcomes.put((index, False, e))
+                return
+            self._record(key, time.monotonic() - started)
+            outcomes.put((index, True, value))
+
+        hedge_after = self.latency_quantile(key) if self.hedge else None
+        threads = [eventlet.spawn(attempt, 0)]
+        try:
+            with eventlet.Timeout(timeout, DeadlineExceeded(f"no answer within {timeout:.1f}s")):
+                if hedge_after is not None and hedge_after < timeout:
+                    try:
+                        outcome = outcomes.get(timeout=hedge_after)
+                    except Empty:
+                        if allow_hedge is None or allow_hedge():
+                            self.hedges += 1
+                            threads.append(eventlet.spawn(attempt, 1))
+                        outcome = outcomes.get()
+                else:
+                    outcome = outcomes.get()
+                index, ok, value = outcome
+                if not ok and len(threads) > 1:
+                    # The other attempt may still succeed
+                    index, ok, value = outcomes.get()
+        except DeadlineExceeded:
+            self.deadline_exceeded += 1
+            raise
+        finally:
+            for thread in threads:
+                thread.kill()
+
+        if not ok:
+            raise value
+        if index == 1:
+            self.hedge_wins += 1
+        return value
+
+    def _record(self, key, latency):
+        samples = self._latencies.get(key)
+        if samples is None:
+            samples = self._latencies[key] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def stats(self):
+        return {
+            'hedging': self.hedge,
+            'calls': self.calls,
+            'deadline_exceeded': self.deadline_exceeded,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'latency_quantiles': sorted(round(q, 3) for q in map(self.latency_quantile, self._latencies) if q is not None)
+        }
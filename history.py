@@ -0,0 +1,156 @@
+"""
+Bounded per-room history.
+
+Rooms keep only their most recent messages and analysis points in memory;
+older messages can optionally be spilled to a JSON Lines file per room.
+"""
+
+import atexit
+import json
+import os
+import sys
+from collections import deque
+from itertools import islice
+
+from eventlet import tpool
+from eventlet.semaphore import Semaphore
+
+
+class MessageRecord:
+    """A stored chat message. Supports msg['text'] / msg.get('text') like the old dicts."""
+
+    __slots__ = ('id', 'user_id', 'username', 'text', 'timestamp')
+
+    def __init__(self, id, user_id, username, text, timestamp):
+        self.id = id
+        self.user_id = user_id
+        self.username = username
+        self.text = text
+        self.timestamp = timestamp
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class JsonlSpill:
+    """
+    Appends evicted messages to <directory>/<room_id>.jsonl.
+
+    Lines are buffered and written `batch_size` at a time through one file
+    handle kept open, on eventlet's thread pool so the disk write doesn't
+    block the event loop. close() writes whatever is left; it also runs at
+    interpreter exit.
+    """
+
+    def __init__(self, directory, room_id, batch_size=50):
+        os.makedirs(directory, exist_ok=True)
+        safe_name = ''.join(ch if ch.isalnum() or ch in '-_' else '_' for ch in room_id)
+        self.path = os.path.join(directory, f'{safe_name}.jsonl')
+        self.batch_size = batch_size
+        self._pending = []
+        self._file = None
+        self._lock = Semaphore()
+        atexit.register(self.close)
+
+    def write(self, record):
+        self._pending.append(json.dumps(record.to_dict()) + '\n')
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered lines without blocking other green threads."""
+        with self._lock:
+            lines, self._pending = self._pending, []
+            if lines:
+                tpool.execute(self._write_lines, lines)
+
+    def close(self):
+        atexit.unregister(self.close)
+        with self._lock:
+            lines, self._pending = self._pending, []
+            if lines:
+                self._write_lines(lines)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write_lines(self, lines):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.writelines(lines)
+        self._file.flush()
+
+
+class MessageHistory:
+    """
+    The last `limit` messages of a room, oldest first.
+
+    `total` counts every message ever added. When a spill is configured,
+    messages pushed out of the window are handed to spill.write().
+    """
+
+    def __init__(self, limit, spill=None):
+        self.limit = limit
+        self.spill = spill
+        self.total = 0
+        self._records = deque()
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def append(self, record):
+        self._records.append(record)
+        self.total += 1
+        while len(self._records) > self.limit:
+            evicted = self._records.popleft()
+            if self.spill is not None:
+                self.spill.write(evicted)
+
+    def close(self):
+        """Write out anything the spill still buffers."""
+        if self.spill is not None:
+            self.spill.close()
+
+    def recent(self, n):
+        """Return the last n retained messages, oldest first."""
+        return tail(self._records, n)
+
+
+def tail(items, n):
+    """Last n items of a deque (or any reversible sequence) as a list, oldest first."""
+    if n <= 0:
+        return []
+    if n >= len(items):
+        return list(items)
+    return list(islice(reversed(items), n))[::-1]
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate memory footprint of obj and everything it references, in bytes."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(deep_sizeof(getattr(obj, slot), seen)
+                    for slot in obj.__slots__ if hasattr(obj, slot))
+    elif hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), seen)
+    return size
@@ -10,21 +10,36 @@ without actual spying, data storage, or external transmission. Purpose: Cyber aw
 import eventlet
 eventlet.monkey_patch()
 
-from flask import render_template, request, session, redirect, url_for
+from flask import render_template, request, session, redirect, url_for, jsonify
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask_login import current_user
 import uuid
+import time
 from datetime import datetime
 import random
 import math
 import re
 import os
 import json
-from google import genai
-from google.genai import types
+from collections import deque
+import numpy as np
 
 from app import app, db
 from models import User
+from matchers import KeywordAutomaton
+from streaming import MessageClock, RollingCounter, RunningStats, WordFrequencyWindow
+from history import JsonlSpill, MessageHistory, MessageRecord, deep_sizeof, tail
+from cache import ResponseCache, SqliteCacheStore, cache_key
+from admission import AdmissionController, CircuitBreaker
+from summary import RollingSummary
+from scheduler import RoomAIScheduler
+from deadlines import DeadlineRunner
+from dashboard import DashboardState
+from backpressure import OutboundMonitor
+from broadcast import TickBroadcaster
+from cluster import BackendManager, RoomDirectory, RoomRouter, backend_from_url
+from wire import WireChannels, WireCodec, negotiate, room_name as wire_room
+from ai_backends import FakeBackend, GeminiBackend
 from auth import auth_bp, require_login
 from sqlalchemy import text
 
@@ -40,7 +55,17 @@ with app.app_context():
         db.session.rollback()
         print(f"Migration note: {e}")
 
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Room state and Socket.IO broadcasts are shared between workers through
+# ROOM_BACKEND_URL (redis://host:port; miniredis.py is a local stand-in).
+# Without it everything stays in this process, so run a single worker. Each
+# room's analysis state lives on the worker holding its ROOM_LEASE_TTL lease.
+ROOM_BACKEND_URL = os.environ.get("ROOM_BACKEND_URL")
+ROOM_LEASE_TTL = float(os.environ.get("ROOM_LEASE_TTL", "10"))
+room_backend = backend_from_url(ROOM_BACKEND_URL)
+room_directory = RoomDirectory(room_backend, lease_ttl=ROOM_LEASE_TTL if room_backend.shared else None)
+
+socketio = SocketIO(app, cors_allowed_origins="*",
+                    client_manager=BackendManager(room_backend) if room_backend.shared else None)
 
 app.register_blueprint(auth_bp, url_prefix="/auth")
 
@@ -50,14 +75,68 @@ def make_session_permanent():
 
 # Using Gemini AI - blueprint:python_gemini
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-gemini_client = genai.Client(api_key=GEMINI_API_KEY) if GEMINI_API_KEY else None
+
+# AI backend behind RealAIAnalyzer: "gemini" (default when GEMINI_API_KEY is
+# set) or "fake", a local stand-in for offline load tests configured by the
+# AI_FAKE_* variables (median latency and log-normal spread in seconds,
+# error and rate-limit probabilities, RNG seed).
+AI_BACKEND = os.environ.get("AI_BACKEND", "gemini" if GEMINI_API_KEY else "")
+if AI_BACKEND == "gemini" and GEMINI_API_KEY:
+    ai_backend = GeminiBackend(GEMINI_API_KEY)
+elif AI_BACKEND == "fake":
+    ai_backend = FakeBackend(
+        latency=float(os.environ.get("AI_FAKE_LATENCY", "0.8")),
+        latency_sigma=float(os.environ.get("AI_FAKE_LATENCY_SIGMA", "0.5")),
+        error_rate=float(os.environ.get("AI_FAKE_ERROR_RATE", "0")),
+        rate_limit_rate=float(os.environ.get("AI_FAKE_RATE_LIMIT_RATE", "0")),
+        seed=os.environ.get("AI_FAKE_SEED")
+    )
+else:
+    ai_backend = None
+
+# Cache of parsed Gemini answers, so repeated content costs no network time.
+# Set AI_CACHE_PATH to a SQLite file to keep warm entries across restarts.
+AI_CACHE_SIZE = int(os.environ.get("AI_CACHE_SIZE", "1024"))
+AI_CACHE_TTL = float(os.environ.get("AI_CACHE_TTL", "3600"))
+AI_CACHE_PATH = os.environ.get("AI_CACHE_PATH")
+ai_cache = ResponseCache(AI_CACHE_SIZE, AI_CACHE_TTL,
+                         store=SqliteCacheStore(AI_CACHE_PATH) if AI_CACHE_PATH else None)
+
+# Admission control for Gemini requests: token buckets (requests/second and
+# burst) globally and per room, and a circuit breaker that switches messages
+# to local-only analysis after repeated failures, quota errors or slow calls.
+# A room starts at most one batch of AI jobs every AI_ROOM_MIN_INTERVAL
+# seconds, of up to AI_BATCH_JOBS calls (five per-message fields, summary
+# and prediction); by default its bucket admits one full batch per interval
+# with a burst of two, so an active room isn't throttled by its own bucket.
+AI_ROOM_MIN_INTERVAL = float(os.environ.get("AI_ROOM_MIN_INTERVAL", "1.0"))
+AI_BATCH_JOBS = 7
+AI_RATE_GLOBAL = float(os.environ.get("AI_RATE_GLOBAL", "5"))
+AI_BURST_GLOBAL = int(os.environ.get("AI_BURST_GLOBAL", "20"))
+AI_RATE_ROOM = float(os.environ.get("AI_RATE_ROOM", str(AI_BATCH_JOBS / AI_ROOM_MIN_INTERVAL)))
+AI_BURST_ROOM = int(os.environ.get("AI_BURST_ROOM", str(2 * AI_BATCH_JOBS)))
+AI_BREAKER_FAILURES = int(os.environ.get("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_SLOW_CALL = float(os.environ.get("AI_BREAKER_SLOW_CALL", "10"))
+AI_BREAKER_COOLDOWN = float(os.environ.get("AI_BREAKER_COOLDOWN", "30"))
+ai_admission = AdmissionController(
+    AI_RATE_GLOBAL, AI_BURST_GLOBAL, AI_RATE_ROOM, AI_BURST_ROOM,
+    CircuitBreaker(AI_BREAKER_FAILURES, AI_BREAKER_SLOW_CALL, AI_BREAKER_COOLDOWN)
+)
+
+# Every AI call is abandoned at its message's deadline. AI_HEDGE=1 also sends
+# a second request when the first is slower than the AI_HEDGE_QUANTILE latency
+# seen for that prompt (hedges spend a global rate-limit token).
+AI_HEDGE = os.environ.get("AI_HEDGE", "").lower() in ("1", "true", "yes")
+AI_HEDGE_QUANTILE = float(os.environ.get("AI_HEDGE_QUANTILE", "0.95"))
+ai_runner = DeadlineRunner(hedge=AI_HEDGE, quantile=AI_HEDGE_QUANTILE)
 
 # ============================================================================
 # GLOBAL STATE MANAGEMENT
 # ============================================================================
 
+# Rooms whose analysis state this worker owns; users and sessions are kept
+# in room_backend
 chat_rooms = {}
-user_sessions = {}
 analysis_history = {
     'sentiment': [],
     'emotions': [],
@@ -66,17 +145,65 @@ analysis_history = {
     'risks': []
 }
 
+# Word cloud window per room: last N messages and/or last N seconds
+# (WORD_CLOUD_SECONDS=0, the default, means no age limit)
+WORD_CLOUD_MESSAGES = int(os.environ.get("WORD_CLOUD_MESSAGES", "20"))
+WORD_CLOUD_SECONDS = float(os.environ.get("WORD_CLOUD_SECONDS", "0")) or None
+WORD_CLOUD_SIZE = 30
+
+# Number of recent messages the personality fingerprint looks at
+PERSONALITY_WINDOW = 10
+
+# Message velocity: interval stats over the last N messages, plus a longer
+# time window for spotting sustained bursts
+VELOCITY_MESSAGES = 10
+VELOCITY_SECONDS = 60.0
+BURST_INTERVAL = 2.0
+
+# Messages and per-message analysis points each room keeps in memory. Older
+# messages are dropped, or appended to <ROOM_HISTORY_SPILL_DIR>/<room>.jsonl
+# when that directory is configured, ROOM_HISTORY_SPILL_BATCH lines at a time.
+ROOM_HISTORY_LIMIT = int(os.environ.get("ROOM_HISTORY_LIMIT", "500"))
+ROOM_HISTORY_SPILL_DIR = os.environ.get("ROOM_HISTORY_SPILL_DIR")
+ROOM_HISTORY_SPILL_BATCH = int(os.environ.get("ROOM_HISTORY_SPILL_BATCH", "50"))
+
+# Window and smoothing used by each room's running statistics
+STATS_WINDOW = 20
+STATS_EWMA_ALPHA = 0.2
+
+# Rolling AI summary: refreshed once the messages since the last summary reach
+# SUMMARY_TOKEN_BUDGET (estimated tokens) or it is SUMMARY_MAX_AGE seconds old.
+# A refresh sends the previous summary plus at most SUMMARY_MAX_MESSAGES new
+# messages; predictions send the summary plus the last PREDICTION_MESSAGES.
+SUMMARY_TOKEN_BUDGET = int(os.environ.get("SUMMARY_TOKEN_BUDGET", "300"))
+SUMMARY_MAX_AGE = float(os.environ.get("SUMMARY_MAX_AGE", "60"))
+SUMMARY_MAX_MESSAGES = 50
+PREDICTION_MESSAGES = 5
+
 class ChatRoom:
-    def __init__(self, room_id):
+    def __init__(self, room_id, word_cloud_messages=WORD_CLOUD_MESSAGES, word_cloud_seconds=WORD_CLOUD_SECONDS,
+                 personality_window=PERSONALITY_WINDOW, velocity_seconds=VELOCITY_SECONDS,
+                 history_limit=ROOM_HISTORY_LIMIT, spill_dir=ROOM_HISTORY_SPILL_DIR,
+                 summary_token_budget=SUMMARY_TOKEN_BUDGET, summary_max_age=SUMMARY_MAX_AGE):
         self.room_id = room_id
-        self.users = {}
-        self.messages = []
-        self.timestamps = []
+        self.messages = MessageHistory(
+            history_limit, JsonlSpill(spill_dir, room_id, ROOM_HISTORY_SPILL_BATCH) if spill_dir else None
+        )
+        self.timestamps = MessageClock(interval_window=VELOCITY_MESSAGES, burst_interval=BURST_INTERVAL,
+                                       rate_window=velocity_seconds)
+        self.word_window = WordFrequencyWindow(max_messages=word_cloud_messages, max_age=word_cloud_seconds)
+        self.personality_window = RollingCounter(personality_window, SimulatedAIAnalyzer.PERSONALITY_PATTERNS)
+        self.stats = {
+            series: RunningStats(window=STATS_WINDOW, alpha=STATS_EWMA_ALPHA)
+            for series in ('sentiment', 'risk', 'toxicity')
+        }
+        self.summary = RollingSummary(summary_token_budget, summary_max_age)
+        self.dashboard = DashboardState()
         self.analysis_data = {
-            'sentiments': [],
-            'emotions_track': [],
+            'sentiments': deque(maxlen=history_limit),
+            'emotions_track': deque(maxlen=history_limit),
             'keywords_freq': {},
-            'risk_scores': [],
+            'risk_scores': deque(maxlen=history_limit),
             'message_count': 0,
             'personality_traits': {
                 'openness': 50,
@@ -86,23 +213,98 @@ class ChatRoom:
                 'curiosity': 50
             },
             'anomaly_index': 0,
-            'mood_shifts': [],
-            'topics_history': [],
-            'tone_history': [],
+            'mood_shifts': deque(maxlen=history_limit),
+            'mood_shift_count': 0,
+            'topics_history': deque(maxlen=history_limit),
+            'tone_history': deque(maxlen=history_limit),
             'alerts': []
         }
 
-    def add_user(self, user_id, username):
-        self.users[user_id] = {'username': username, 'joined_at': datetime.now()}
+    def memory_usage(self):
+        """Approximate bytes held by this room's in-memory state."""
+        return {
+            'bytes': deep_sizeof(self),
+            'messages_retained': len(self.messages),
+            'messages_total': self.messages.total,
+            'history_limit': self.messages.limit,
+            'summary': self.summary.stats()
+        }
 
-    def remove_user(self, user_id):
-        if user_id in self.users:
-            del self.users[user_id]
+
+def dashboard_channel(room_id):
+    """Channel that dashboard subscribers of a chat room join."""
+    return f'{room_id}:dashboard'
+
+
+def dashboard_room_id(channel):
+    """Chat room of a dashboard channel, or None for any other channel."""
+    return channel[:-len(':dashboard')] if channel.endswith(':dashboard') else None
 
 # ============================================================================
 # SIMULATED AI ANALYSIS ENGINE - LOCAL ONLY, NO EXTERNAL CALLS
 # ============================================================================
 
+class MessageFeatures:
+    """
+    Everything the local analyzers need from one message, parsed once.
+
+    Keyword hits, pattern flags and word-cloud words are computed on first
+    use, so callers that only need a couple of detectors don't pay for all.
+    It lives for the handling of one message and is not stored with it:
+    stored messages keep only their text.
+    """
+
+    __slots__ = ('text', 'lower', 'tokens', 'token_set', 'char_count', 'word_count',
+                 'uppercase_count', 'urls', 'question_count', 'exclamation_count',
+                 '_keyword_hits', '_pattern_flags', '_cloud_words')
+
+    def __init__(self, text):
+        self.text = text
+        self.lower = text.lower()
+        self.tokens = self.lower.split()
+        self.token_set = set(self.tokens)
+        self.char_count = len(text)
+        self.word_count = len(self.tokens)
+        self.uppercase_count = len(SimulatedAIAnalyzer.UPPERCASE_PATTERN.findall(text))
+        self.urls = SimulatedAIAnalyzer.URL_PATTERN.findall(text)
+        self.question_count = text.count('?')
+        self.exclamation_count = text.count('!')
+        self._keyword_hits = None
+        self._pattern_flags = None
+        self._cloud_words = None
+
+    @staticmethod
+    def of(message):
+        """Return message unchanged if it is already a MessageFeatures, else parse it."""
+        return message if isinstance(message, MessageFeatures) else MessageFeatures(message)
+
+    @property
+    def keyword_hits(self):
+        """Lexicon hits from one automaton pass, keyed by 'table:category'."""
+        if self._keyword_hits is None:
+            self._keyword_hits = SimulatedAIAnalyzer.KEYWORDS.scan(self.lower)
+        return self._keyword_hits
+
+    @property
+    def pattern_flags(self):
+        """Regex detector flags keyed by 'detector:name'."""
+        if self._pattern_flags is None:
+            self._pattern_flags = {
+                name for name, (regex, ignore_case) in SimulatedAIAnalyzer.MESSAGE_PATTERNS.items()
+                if regex.search(self.lower if ignore_case else self.text)
+            }
+        return self._pattern_flags
+
+    @property
+    def cloud_words(self):
+        """Words eligible for the word cloud (3+ letters, no stopwords)."""
+        if self._cloud_words is None:
+            stopwords = SimulatedAIAnalyzer.STOPWORDS
+            self._cloud_words = [w for w in SimulatedAIAnalyzer.WORD_PATTERN.findall(self.lower)
+                                 if w not in stopwords]
+        return self._cloud_words
+
+
 class SimulatedAIAnalyzer:
     """
     All analysis is simulated locally using heuristics, scoring formulas,
@@ -117,49 +319,155 @@ class SimulatedAIAnalyzer:
     MONEY_KEYWORDS = ['money', 'cash', 'payment', 'price', 'cost', 'bitcoin', 'crypto']
     LOCATION_KEYWORDS = ['location', 'address', 'street', 'city', 'coordinates', 'meet']
 
+    FLAGGED_KEYWORD_TYPES = {
+        'danger': DANGER_KEYWORDS,
+        'love': LOVE_KEYWORDS,
+        'threat': THREAT_KEYWORDS,
+        'help': HELP_KEYWORDS,
+        'depression': DEPRESSION_KEYWORDS,
+        'money': MONEY_KEYWORDS,
+        'location': LOCATION_KEYWORDS
+    }
+
     POSITIVE_WORDS = ['good', 'great', 'awesome', 'excellent', 'wonderful', 'happy', 'love', 
                       'amazing', 'fantastic', 'brilliant', 'perfect', 'beautiful']
     NEGATIVE_WORDS = ['bad', 'terrible', 'awful', 'horrible', 'hate', 'disgusting', 'annoying',
                       'sad', 'angry', 'upset', 'disappointed', 'failed']
 
+    EMOTION_MARKERS = {
+        'happy': ['happy', 'lol', 'haha', 'good', 'great', 'love', 'wonderful'],
+        'angry': ['angry', 'furious', 'hate', 'terrible', 'awful', 'sick'],
+        'sad': ['sad', 'crying', 'depressed', 'lonely', 'broken', 'hurt'],
+        'fear': ['scared', 'afraid', 'fear', 'panic', 'worried', 'anxious'],
+        'excitement': ['excited', 'amazing', 'wow', 'incredible', '!!!', 'awesome']
+    }
+
+    TOXIC_INDICATORS = ['fuck', 'shit', 'asshole', 'bitch', 'bastard', 'idiot', 'stupid']
+
+    TOPIC_KEYWORDS = {
+        'personal': ['family', 'friend', 'relationship', 'boyfriend', 'girlfriend', 'parent', 'home', 'life', 'myself', 'feeling'],
+        'academic': ['school', 'study', 'exam', 'homework', 'class', 'teacher', 'college', 'university', 'grade', 'project'],
+        'finance': ['money', 'pay', 'price', 'cost', 'bank', 'salary', 'budget', 'invest', 'crypto', 'bitcoin'],
+        'health': ['doctor', 'sick', 'hospital', 'medicine', 'health', 'pain', 'sleep', 'tired', 'exercise', 'diet'],
+        'social': ['party', 'event', 'meet', 'hangout', 'club', 'group', 'community', 'social', 'friends', 'together'],
+        'gaming': ['game', 'play', 'level', 'score', 'win', 'lose', 'player', 'online', 'stream', 'console'],
+        'mental_state': ['stressed', 'anxious', 'worried', 'depressed', 'happy', 'excited', 'nervous', 'confused', 'overwhelmed', 'calm']
+    }
+
+    TONE_KEYWORDS = {
+        'casual': ['hey', 'lol', 'haha', 'cool', 'yeah', 'nah', 'gonna', 'wanna', 'sup', 'dude'],
+        'formal': ['please', 'thank you', 'kindly', 'regards', 'sincerely', 'appreciate', 'would', 'shall'],
+        'urgent': ['asap', 'urgent', 'immediately', 'now', 'quick', 'hurry', 'emergency', '!!!'],
+        'serious': ['important', 'critical', 'need', 'must', 'serious', 'concern', 'issue', 'problem'],
+        'friendly': ['friend', 'love', 'care', 'miss', 'happy', 'glad', 'wonderful', 'awesome'],
+        'tense': ['angry', 'upset', 'frustrated', 'annoyed', 'hate', 'terrible', 'worst'],
+        'sarcastic': ['sure', 'right', 'whatever', 'obviously', 'clearly', 'wow', 'great job']
+    }
+
+    STRESS_INDICATORS = {
+        'depression': ['depressed', 'worthless', 'hopeless', 'empty', 'numb', 'nothing matters', 'give up', 'no point'],
+        'anxiety': ['anxious', 'panic', 'worried', 'overthinking', 'cant breathe', 'nervous', 'scared'],
+        'exhaustion': ['tired', 'exhausted', 'drained', 'no energy', 'burned out', 'cant sleep', 'insomnia'],
+        'isolation': ['alone', 'lonely', 'nobody cares', 'no friends', 'isolated', 'invisible', 'ignored'],
+        'overwhelm': ['too much', 'cant handle', 'overwhelmed', 'breaking down', 'falling apart', 'stressed']
+    }
+
+    SUSPICIOUS_PHRASE_PATTERNS = [
+        (r'\b(?:transfer|send)\s+(?:money|crypto)\b', 'Financial Transaction Detected'),
+        (r'\b(?:secret|hidden|private|confidential)\b', 'Privacy-Related Language'),
+        (r'\b(?:urgent|asap|immediately|now)\b', 'Urgency Language'),
+        (r'\b(?:verify|confirm|authenticate|password)\b', 'Security-Related Language'),
+        (r'\d{3}-\d{4}', 'Partial Number Sequence'),
+        (r'\.onion|\.tor|proxy|vpn', 'Anonymity Tools Reference')
+    ]
+
+    PHISHING_PATTERNS = {
+        'account_verify': r'verify.*account|confirm.*identity|update.*information',
+        'urgent_action': r'account.*suspended|immediate.*action|will be.*terminated',
+        'credential_request': r'password|username|login|credentials|pin|otp',
+        'suspicious_link': r'click.*link|visit.*site|go to.*url',
+        'prize_claim': r'won|prize|congratulations|claim.*reward',
+        'money_request': r'send.*money|wire.*transfer|bitcoin|western union'
+    }
+
+    # Case-sensitive spam heuristics; promo language is matched case-insensitively.
+    SPAM_PATTERNS = {
+        'repetitive': r'(.)\1{4,}',
+        'promo_language': r'buy now|limited time|act fast|click here|free|winner',
+        'random_chars': r'[a-zA-Z]{20,}'
+    }
+
+    PERSONALITY_PATTERNS = {
+        'impulsive': r'[!]{2,}|quick|now|hurry',
+        'logical': r'because|therefore|if|then|reason|analyze',
+        'emotional': r'feel|love|hate|happy|sad|angry|excited',
+        'structured': r'first|second|step|plan|organize|list',
+        'chaotic': r'idk|whatever|random|lol|haha|anyway'
+    }
+
+    UNSAFE_LINK_PATTERNS = [
+        r'bit\.ly', r'tinyurl', r'\.tk$', r'\.ml$', r'\.xyz',
+        r'[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}',
+        r'\.onion', r'\.tor', r'free.*download'
+    ]
+
+    URL_PATTERN = re.compile(r'https?://[^\s]+')
+    URL_SCHEME_PATTERN = re.compile(r'https?://')
+    UPPERCASE_PATTERN = re.compile(r'[A-Z]')
+    WORD_PATTERN = re.compile(r'\b[a-zA-Z]{3,}\b')
+
+    STOPWORDS = {'the', 'a', 'an', 'is', 'it', 'to', 'of', 'and', 'in', 'that', 'for', 'on', 'with', 'as', 'at', 'by', 'this', 'be', 'are', 'was', 'i', 'you', 'he', 'she', 'we', 'they', 'my', 'your', 'his', 'her', 'its', 'our'}
+
+    # Source of the randomised jitter in every score. Defaults to the global
+    # `random` module; assign a seeded random.Random for reproducible runs.
+    # analyze_batch draws its jitter as arrays from `np_rng` instead (assign
+    # np.random.default_rng(seed) for reproducible batches).
+    rng = random
+    np_rng = np.random.default_rng()
+
+    # Filled in below the class with the compiled automaton and regexes
+    # built from the tables above.
+    KEYWORDS = None
+    LEXICON_COLUMNS = None
+    MESSAGE_PATTERNS = None     # 'detector:name' -> (regex, matched against lowercased text)
+    PATTERN_COLUMNS = None
+    PERSONALITY_REGEXES = None  # name -> regex
+    UNSAFE_LINK_REGEXES = None  # [(pattern, regex)]
+
+    # Every per-message method below accepts either the raw text or the
+    # MessageFeatures built once for it in handle_message.
+
+    @staticmethod
+    def scan_keywords(text):
+        """Single automaton pass over the message; hits keyed by 'table:category'."""
+        return MessageFeatures.of(text).keyword_hits
+
+    @staticmethod
+    def scan_patterns(text):
+        """Regex detector flags for the message, keyed by 'detector:name'."""
+        return MessageFeatures.of(text).pattern_flags
+
     @staticmethod
     def analyze_sentiment(text):
         """Simulate sentiment analysis: positive, negative, or neutral."""
-        text_lower = text.lower()
-        pos_score = sum(1 for word in SimulatedAIAnalyzer.POSITIVE_WORDS if word in text_lower)
-        neg_score = sum(1 for word in SimulatedAIAnalyzer.NEGATIVE_WORDS if word in text_lower)
+        hits = SimulatedAIAnalyzer.scan_keywords(text)
+        pos_score = len(hits.get('sentiment:positive', ()))
+        neg_score = len(hits.get('sentiment:negative', ()))
 
         if pos_score > neg_score and pos_score > 0:
-            return 'positive', pos_score * 15 + random.randint(5, 10)
+            return 'positive', pos_score * 15 + SimulatedAIAnalyzer.rng.randint(5, 10)
         elif neg_score > pos_score and neg_score > 0:
-            return 'negative', neg_score * 12 + random.randint(5, 10)
+            return 'negative', neg_score * 12 + SimulatedAIAnalyzer.rng.randint(5, 10)
         else:
-            return 'neutral', 50 + random.randint(-10, 10)
+            return 'neutral', 50 + SimulatedAIAnalyzer.rng.randint(-10, 10)
 
     @staticmethod
     def analyze_emotions(text):
         """Simulate emotion detection: happy, angry, sad, fear, excitement."""
-        emotions = {
-            'happy': 0,
-            'angry': 0,
-            'sad': 0,
-            'fear': 0,
-            'excitement': 0
-        }
-
-        text_lower = text.lower()
-
-        happy_markers = ['happy', 'lol', 'haha', 'good', 'great', 'love', 'wonderful']
-        angry_markers = ['angry', 'furious', 'hate', 'terrible', 'awful', 'sick']
-        sad_markers = ['sad', 'crying', 'depressed', 'lonely', 'broken', 'hurt']
-        fear_markers = ['scared', 'afraid', 'fear', 'panic', 'worried', 'anxious']
-        excited_markers = ['excited', 'amazing', 'wow', 'incredible', '!!!', 'awesome']
-
-        emotions['happy'] = sum(1 for w in happy_markers if w in text_lower) * 20 + random.randint(0, 15)
-        emotions['angry'] = sum(1 for w in angry_markers if w in text_lower) * 20 + random.randint(0, 15)
-        emotions['sad'] = sum(1 for w in sad_markers if w in text_lower) * 20 + random.randint(0, 15)
-        emotions['fear'] = sum(1 for w in fear_markers if w in text_lower) * 20 + random.randint(0, 15)
-        emotions['excitement'] = sum(1 for w in excited_markers if w in text_lower) * 20 + random.randint(0, 15)
+        hits = SimulatedAIAnalyzer.scan_keywords(text)
+        emotions = {}
+        for emotion in SimulatedAIAnalyzer.EMOTION_MARKERS:
+            emotions[emotion] = len(hits.get('emotion:' + emotion, ())) * 20 + SimulatedAIAnalyzer.rng.randint(0, 15)
 
         # Normalize to 0-100
         for key in emotions:
@@ -170,37 +478,30 @@ class SimulatedAIAnalyzer:
     @staticmethod
     def calculate_toxicity(text):
         """Simulate toxicity detection score."""
-        toxic_indicators = ['fuck', 'shit', 'asshole', 'bitch', 'bastard', 'idiot', 'stupid']
-        score = sum(1 for word in toxic_indicators if word in text.lower())
-        toxicity = min(100, score * 25 + random.randint(0, 10))
+        score = len(SimulatedAIAnalyzer.scan_keywords(text).get('toxicity:toxic', ()))
+        toxicity = min(100, score * 25 + SimulatedAIAnalyzer.rng.randint(0, 10))
         return toxicity
 
     @staticmethod
     def extract_keywords(text):
         """Extract and flag keywords from message."""
+        hits = SimulatedAIAnalyzer.scan_keywords(text)
         detected = {}
-        for keyword_type, keywords in [
-            ('danger', SimulatedAIAnalyzer.DANGER_KEYWORDS),
-            ('love', SimulatedAIAnalyzer.LOVE_KEYWORDS),
-            ('threat', SimulatedAIAnalyzer.THREAT_KEYWORDS),
-            ('help', SimulatedAIAnalyzer.HELP_KEYWORDS),
-            ('depression', SimulatedAIAnalyzer.DEPRESSION_KEYWORDS),
-            ('money', SimulatedAIAnalyzer.MONEY_KEYWORDS),
-            ('location', SimulatedAIAnalyzer.LOCATION_KEYWORDS)
-        ]:
-            found = [kw for kw in keywords if kw in text.lower()]
+        for keyword_type in SimulatedAIAnalyzer.FLAGGED_KEYWORD_TYPES:
+            found = hits.get('keyword:' + keyword_type)
             if found:
-                detected[keyword_type] = found
+                detected[keyword_type] = list(found)
 
         return detected
 
     @staticmethod
     def calculate_message_complexity(text):
         """Simulate message complexity scoring."""
-        words = len(text.split())
-        chars = len(text)
+        features = MessageFeatures.of(text)
+        words = features.word_count
+        chars = features.char_count
         avg_word_len = chars / max(words, 1)
-        unique_words = len(set(text.lower().split()))
+        unique_words = len(features.token_set)
 
         complexity = min(100, (words * 2) + (avg_word_len * 3) + (unique_words / 2))
         return int(complexity)
@@ -208,21 +509,9 @@ class SimulatedAIAnalyzer:
     @staticmethod
     def detect_suspicious_phrases(text):
         """Detect suspicious phrase patterns."""
-        suspicious = [
-            (r'\b(?:transfer|send)\s+(?:money|crypto)\b', 'Financial Transaction Detected'),
-            (r'\b(?:secret|hidden|private|confidential)\b', 'Privacy-Related Language'),
-            (r'\b(?:urgent|asap|immediately|now)\b', 'Urgency Language'),
-            (r'\b(?:verify|confirm|authenticate|password)\b', 'Security-Related Language'),
-            (r'\d{3}-\d{4}', 'Partial Number Sequence'),
-            (r'\.onion|\.tor|proxy|vpn', 'Anonymity Tools Reference')
-        ]
-
-        detected = []
-        for pattern, label in suspicious:
-            if re.search(pattern, text.lower()):
-                detected.append(label)
-
-        return detected
+        flags = SimulatedAIAnalyzer.scan_patterns(text)
+        return [label for _, label in SimulatedAIAnalyzer.SUSPICIOUS_PHRASE_PATTERNS
+                if 'suspicious:' + label in flags]
 
     @staticmethod
     def calculate_risk_score(sentiment_val, toxicity, keywords, complexity):
@@ -239,7 +528,7 @@ class SimulatedAIAnalyzer:
         if complexity > 70:
             base_risk += 10
 
-        return min(100, max(0, base_risk + random.randint(-5, 5)))
+        return min(100, max(0, base_risk + SimulatedAIAnalyzer.rng.randint(-5, 5)))
 
     @staticmethod
     def update_personality_traits(current_traits, message_data):
@@ -247,20 +536,20 @@ class SimulatedAIAnalyzer:
         traits = current_traits.copy()
 
         # Openness influenced by complexity and diverse vocabulary
-        traits['openness'] = max(0, min(100, traits['openness'] + random.randint(-3, 5)))
+        traits['openness'] = max(0, min(100, traits['openness'] + SimulatedAIAnalyzer.rng.randint(-3, 5)))
 
         # Confidence influenced by message length and sentiment
-        traits['confidence'] = max(0, min(100, traits['confidence'] + random.randint(-2, 4)))
+        traits['confidence'] = max(0, min(100, traits['confidence'] + SimulatedAIAnalyzer.rng.randint(-2, 4)))
 
         # Emotional stability influenced by sentiment variance
-        traits['emotional_stability'] = max(0, min(100, traits['emotional_stability'] + random.randint(-4, 3)))
+        traits['emotional_stability'] = max(0, min(100, traits['emotional_stability'] + SimulatedAIAnalyzer.rng.randint(-4, 3)))
 
         # Assertiveness influenced by message frequency and complexity
-        traits['assertiveness'] = max(0, min(100, traits['assertiveness'] + random.randint(-2, 3)))
+        traits['assertiveness'] = max(0, min(100, traits['assertiveness'] + SimulatedAIAnalyzer.rng.randint(-2, 3)))
 
         # Curiosity influenced by question marks and exploration language
         question_count = message_data['text'].count('?')
-        traits['curiosity'] = max(0, min(100, traits['curiosity'] + (question_count * 5) + random.randint(-2, 2)))
+        traits['curiosity'] = max(0, min(100, traits['curiosity'] + (question_count * 5) + SimulatedAIAnalyzer.rng.randint(-2, 2)))
 
         return traits
 
@@ -279,35 +568,26 @@ class SimulatedAIAnalyzer:
         return None
 
     @staticmethod
-    def calculate_anomaly_index(message_count, avg_risk, mood_shifts):
+    def calculate_anomaly_index(message_count, avg_risk, mood_shift_count):
         """Calculate conversation anomaly index."""
         base_anomaly = (avg_risk / 100) * 40
-        base_anomaly += len(mood_shifts) * 15
+        base_anomaly += mood_shift_count * 15
 
         if message_count > 50:
             base_anomaly += 10
 
-        return min(100, base_anomaly + random.randint(-5, 10))
+        return min(100, base_anomaly + SimulatedAIAnalyzer.rng.randint(-5, 10))
 
     @staticmethod
     def detect_topic(text):
         """Detect conversation topic category."""
-        text_lower = text.lower()
-        topics = {
-            'personal': ['family', 'friend', 'relationship', 'boyfriend', 'girlfriend', 'parent', 'home', 'life', 'myself', 'feeling'],
-            'academic': ['school', 'study', 'exam', 'homework', 'class', 'teacher', 'college', 'university', 'grade', 'project'],
-            'finance': ['money', 'pay', 'price', 'cost', 'bank', 'salary', 'budget', 'invest', 'crypto', 'bitcoin'],
-            'health': ['doctor', 'sick', 'hospital', 'medicine', 'health', 'pain', 'sleep', 'tired', 'exercise', 'diet'],
-            'social': ['party', 'event', 'meet', 'hangout', 'club', 'group', 'community', 'social', 'friends', 'together'],
-            'gaming': ['game', 'play', 'level', 'score', 'win', 'lose', 'player', 'online', 'stream', 'console'],
-            'mental_state': ['stressed', 'anxious', 'worried', 'depressed', 'happy', 'excited', 'nervous', 'confused', 'overwhelmed', 'calm']
-        }
+        hits = SimulatedAIAnalyzer.scan_keywords(text)
         
         detected = {}
-        for topic, keywords in topics.items():
-            score = sum(1 for kw in keywords if kw in text_lower)
+        for topic in SimulatedAIAnalyzer.TOPIC_KEYWORDS:
+            score = len(hits.get('topic:' + topic, ()))
             if score > 0:
-                detected[topic] = score * 20 + random.randint(5, 15)
+                detected[topic] = score * 20 + SimulatedAIAnalyzer.rng.randint(5, 15)
         
         if not detected:
             detected['general'] = 50
@@ -317,21 +597,12 @@ class SimulatedAIAnalyzer:
     @staticmethod
     def classify_tone(text):
         """Classify conversation tone."""
-        text_lower = text.lower()
-        tones = {
-            'casual': (['hey', 'lol', 'haha', 'cool', 'yeah', 'nah', 'gonna', 'wanna', 'sup', 'dude'], 0),
-            'formal': (['please', 'thank you', 'kindly', 'regards', 'sincerely', 'appreciate', 'would', 'shall'], 0),
-            'urgent': (['asap', 'urgent', 'immediately', 'now', 'quick', 'hurry', 'emergency', '!!!'], 0),
-            'serious': (['important', 'critical', 'need', 'must', 'serious', 'concern', 'issue', 'problem'], 0),
-            'friendly': (['friend', 'love', 'care', 'miss', 'happy', 'glad', 'wonderful', 'awesome'], 0),
-            'tense': (['angry', 'upset', 'frustrated', 'annoyed', 'hate', 'terrible', 'worst'], 0),
-            'sarcastic': (['sure', 'right', 'whatever', 'obviously', 'clearly', 'wow', 'great job'], 0)
-        }
+        hits = SimulatedAIAnalyzer.scan_keywords(text)
         
         scores = {}
-        for tone, (keywords, _) in tones.items():
-            score = sum(1 for kw in keywords if kw in text_lower)
-            scores[tone] = score * 25 + random.randint(0, 10)
+        for tone in SimulatedAIAnalyzer.TONE_KEYWORDS:
+            score = len(hits.get('tone:' + tone, ()))
+            scores[tone] = score * 25 + SimulatedAIAnalyzer.rng.randint(0, 10)
         
         primary_tone = max(scores, key=scores.get)
         return {'primary': primary_tone, 'scores': scores, 'confidence': min(100, scores[primary_tone])}
@@ -339,21 +610,14 @@ class SimulatedAIAnalyzer:
     @staticmethod
     def detect_mental_stress(text):
         """Detect depression and mental stress indicators."""
-        text_lower = text.lower()
-        stress_indicators = {
-            'depression': ['depressed', 'worthless', 'hopeless', 'empty', 'numb', 'nothing matters', 'give up', 'no point'],
-            'anxiety': ['anxious', 'panic', 'worried', 'overthinking', 'cant breathe', 'nervous', 'scared'],
-            'exhaustion': ['tired', 'exhausted', 'drained', 'no energy', 'burned out', 'cant sleep', 'insomnia'],
-            'isolation': ['alone', 'lonely', 'nobody cares', 'no friends', 'isolated', 'invisible', 'ignored'],
-            'overwhelm': ['too much', 'cant handle', 'overwhelmed', 'breaking down', 'falling apart', 'stressed']
-        }
+        hits = SimulatedAIAnalyzer.scan_keywords(text)
         
         detected = {}
         warning_level = 0
-        for category, keywords in stress_indicators.items():
-            found = [kw for kw in keywords if kw in text_lower]
+        for category in SimulatedAIAnalyzer.STRESS_INDICATORS:
+            found = hits.get('stress:' + category)
             if found:
-                detected[category] = found
+                detected[category] = list(found)
                 warning_level += len(found) * 15
         
         return {
@@ -363,36 +627,31 @@ class SimulatedAIAnalyzer:
         }
 
     @staticmethod
-    def fingerprint_personality(messages):
-        """Create personality fingerprint from message patterns."""
-        if not messages:
-            return {'type': 'unknown', 'confidence': 0}
-        
-        all_text = ' '.join([m.get('text', '') for m in messages[-10:]])
-        text_lower = all_text.lower()
-        
-        patterns = {
-            'impulsive': len(re.findall(r'[!]{2,}|quick|now|hurry', text_lower)),
-            'logical': len(re.findall(r'because|therefore|if|then|reason|analyze', text_lower)),
-            'emotional': len(re.findall(r'feel|love|hate|happy|sad|angry|excited', text_lower)),
-            'structured': len(re.findall(r'first|second|step|plan|organize|list', text_lower)),
-            'chaotic': len(re.findall(r'idk|whatever|random|lol|haha|anyway', text_lower))
-        }
-        
+    def personality_pattern_counts(text):
+        """Count personality pattern matches in a single message."""
+        text_lower = MessageFeatures.of(text).lower
+        return {name: len(regex.findall(text_lower))
+                for name, regex in SimulatedAIAnalyzer.PERSONALITY_REGEXES.items()}
+
+    @staticmethod
+    def fingerprint_from_counts(patterns):
+        """Build the personality fingerprint from windowed pattern totals."""
         primary = max(patterns, key=patterns.get)
-        confidence = min(100, patterns[primary] * 20 + random.randint(10, 30))
+        confidence = min(100, patterns[primary] * 20 + SimulatedAIAnalyzer.rng.randint(10, 30))
         
         return {'type': primary, 'patterns': patterns, 'confidence': confidence}
 
     @staticmethod
     def detect_spam_bot(text, message_times=None):
         """Detect if message looks automated or spam-like."""
+        features = MessageFeatures.of(text)
+        flags = features.pattern_flags
         indicators = {
-            'repetitive': bool(re.search(r'(.)\1{4,}', text)),
-            'excessive_caps': len(re.findall(r'[A-Z]', text)) > len(text) * 0.5 if text else False,
-            'link_spam': len(re.findall(r'https?://', text)) > 2,
-            'promo_language': bool(re.search(r'buy now|limited time|act fast|click here|free|winner', text.lower())),
-            'random_chars': bool(re.search(r'[a-zA-Z]{20,}', text))
+            'repetitive': 'spam:repetitive' in flags,
+            'excessive_caps': features.uppercase_count > features.char_count * 0.5 if features.char_count else False,
+            'link_spam': len(SimulatedAIAnalyzer.URL_SCHEME_PATTERN.findall(features.text)) > 2,
+            'promo_language': 'spam:promo_language' in flags,
+            'random_chars': 'spam:random_chars' in flags
         }
         
         spam_score = sum(1 for v in indicators.values() if v) * 25
@@ -401,15 +660,8 @@ class SimulatedAIAnalyzer:
     @staticmethod
     def detect_phishing(text):
         """Detect phishing and scam patterns (educational)."""
-        text_lower = text.lower()
-        patterns = {
-            'account_verify': bool(re.search(r'verify.*account|confirm.*identity|update.*information', text_lower)),
-            'urgent_action': bool(re.search(r'account.*suspended|immediate.*action|will be.*terminated', text_lower)),
-            'credential_request': bool(re.search(r'password|username|login|credentials|pin|otp', text_lower)),
-            'suspicious_link': bool(re.search(r'click.*link|visit.*site|go to.*url', text_lower)),
-            'prize_claim': bool(re.search(r'won|prize|congratulations|claim.*reward', text_lower)),
-            'money_request': bool(re.search(r'send.*money|wire.*transfer|bitcoin|western union', text_lower))
-        }
+        flags = SimulatedAIAnalyzer.scan_patterns(text)
+        patterns = {name: 'phishing:' + name in flags for name in SimulatedAIAnalyzer.PHISHING_PATTERNS}
         
         phishing_score = sum(1 for v in patterns.values() if v) * 20
         return {'is_phishing': phishing_score > 40, 'patterns': patterns, 'score': min(100, phishing_score)}
@@ -417,17 +669,11 @@ class SimulatedAIAnalyzer:
     @staticmethod
     def detect_unsafe_links(text):
         """Detect suspicious URLs (simulation only)."""
-        suspicious_patterns = [
-            r'bit\.ly', r'tinyurl', r'\.tk$', r'\.ml$', r'\.xyz',
-            r'[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}',
-            r'\.onion', r'\.tor', r'free.*download'
-        ]
-        
-        urls = re.findall(r'https?://[^\s]+', text)
         suspicious = []
-        for url in urls:
-            for pattern in suspicious_patterns:
-                if re.search(pattern, url.lower()):
+        for url in MessageFeatures.of(text).urls:
+            url_lower = url.lower()
+            for pattern, regex in SimulatedAIAnalyzer.UNSAFE_LINK_REGEXES:
+                if regex.search(url_lower):
                     suspicious.append({'url': url, 'reason': pattern})
                     break
         
@@ -435,23 +681,20 @@ class SimulatedAIAnalyzer:
 
     @staticmethod
     def calculate_message_velocity(timestamps):
-        """Calculate typing velocity and detect stress patterns."""
-        if len(timestamps) < 2:
-            return {'velocity': 0, 'status': 'normal', 'burst_detected': False}
-        
-        intervals = []
-        for i in range(1, len(timestamps[-10:])):
-            try:
-                t1 = datetime.fromisoformat(timestamps[i-1])
-                t2 = datetime.fromisoformat(timestamps[i])
-                intervals.append((t2 - t1).total_seconds())
-            except:
-                pass
-        
-        if not intervals:
-            return {'velocity': 0, 'status': 'normal', 'burst_detected': False}
+        """Calculate typing velocity and detect stress patterns from a room's MessageClock."""
+        window = timestamps.window_stats()
+        window_summary = {
+            'seconds': timestamps.rate_window,
+            'messages': window['messages'],
+            'rate': round(window['rate'], 3),
+            'burst_count': window['burst_count']
+        }
+
+        recent = timestamps.recent_stats()
+        if recent['intervals'] < 1:
+            return {'velocity': 0, 'status': 'normal', 'burst_detected': False, 'window': window_summary}
         
-        avg_interval = sum(intervals) / len(intervals)
+        avg_interval = recent['mean_interval']
         velocity = 100 - min(100, avg_interval * 10)
         
         status = 'normal'
@@ -462,15 +705,19 @@ class SimulatedAIAnalyzer:
         elif velocity < 20:
             status = 'slow'
         
-        burst = any(i < 2 for i in intervals)
+        burst = recent['burst_count'] > 0
         
-        return {'velocity': int(velocity), 'status': status, 'burst_detected': burst}
+        return {'velocity': int(velocity), 'status': status, 'burst_detected': burst, 'window': window_summary}
 
     @staticmethod
     def calculate_threat_level(risk_score, toxicity, phishing_score, stress_level):
         """Calculate overall threat level badge."""
         combined = (risk_score * 0.3) + (toxicity * 0.25) + (phishing_score * 0.25) + (stress_level * 0.2)
-        
+        return SimulatedAIAnalyzer.threat_level_for(combined)
+
+    @staticmethod
+    def threat_level_for(combined):
+        """Map a combined threat score to its badge."""
         if combined > 70:
             return {'level': 'red', 'label': 'High Alert', 'score': int(combined)}
         elif combined > 40:
@@ -486,22 +733,236 @@ class SimulatedAIAnalyzer:
         return min(100, int(base_energy))
 
     @staticmethod
-    def generate_word_frequency(messages):
-        """Generate word frequency for word cloud."""
-        all_words = []
-        stopwords = {'the', 'a', 'an', 'is', 'it', 'to', 'of', 'and', 'in', 'that', 'for', 'on', 'with', 'as', 'at', 'by', 'this', 'be', 'are', 'was', 'i', 'you', 'he', 'she', 'we', 'they', 'my', 'your', 'his', 'her', 'its', 'our'}
-        
-        for msg in messages[-20:]:
-            text = msg.get('text', '')
-            words = re.findall(r'\b[a-zA-Z]{3,}\b', text.lower())
-            all_words.extend([w for w in words if w not in stopwords])
-        
-        freq = {}
-        for word in all_words:
-            freq[word] = freq.get(word, 0) + 1
-        
-        sorted_freq = sorted(freq.items(), key=lambda x: x[1], reverse=True)[:30]
-        return [{'word': w, 'count': c, 'size': min(50, c * 10 + 10)} for w, c in sorted_freq]
+    def format_word_cloud(top_words):
+        """Turn (word, count) pairs into word cloud entries."""
+        return [{'word': w, 'count': c, 'size': min(50, c * 10 + 10)} for w, c in top_words]
+
+
+    @staticmethod
+    def analyze_batch(texts, rng=None, exact=False):
+        """
+        Run the per-message analysis over many texts at once.
+
+        Returns one dict per text with the message-level fields handle_message
+        computes (room-level state such as personality, velocity and the word
+        cloud is left out). Lexicon hits are gathered into a messages x lexicon
+        count matrix, every score is computed as an array expression and the
+        output dicts are assembled a field (column) at a time.
+
+        The random jitter is drawn as whole arrays from `rng`, a
+        np.random.Generator (SimulatedAIAnalyzer.np_rng by default). With
+        exact=True it is drawn instead from `rng`, a random.Random
+        (SimulatedAIAnalyzer.rng by default), with the same calls in the same
+        order as running the single-message stages on each text in turn, so
+        a seeded batch gives exactly their results; that is much slower.
+        benchmarks/bench_batch.py checks both modes.
+        """
+        A = SimulatedAIAnalyzer
+        features = [MessageFeatures.of(text) for text in texts]
+        n = len(features)
+
+        columns = A.LEXICON_COLUMNS
+        counts = np.zeros((n, len(columns)), dtype=np.int32)
+        for i, f in enumerate(features):
+            for category, found in f.keyword_hits.items():
+                counts[i, columns[category]] = len(found)
+
+        def lexicon(prefix, groups):
+            return counts[:, [columns[f'{prefix}:{name}'] for name in groups]]
+
+        pos = counts[:, columns['sentiment:positive']]
+        neg = counts[:, columns['sentiment:negative']]
+        is_pos = (pos > neg) & (pos > 0)
+        is_neg = (neg > pos) & (neg > 0)
+        topic_counts = lexicon('topic', A.TOPIC_KEYWORDS)
+
+        n_emotions = len(A.EMOTION_MARKERS)
+        n_tones = len(A.TONE_KEYWORDS)
+        polar = is_pos | is_neg
+        if exact:
+            (sentiment_jitter, emotion_jitter, toxicity_jitter, risk_jitter, topic_jitter,
+             tone_jitter) = A._exact_jitter(rng or A.rng, polar, topic_counts > 0, n_emotions, n_tones)
+        else:
+            rng = rng or A.np_rng
+            sentiment_jitter = np.where(polar, rng.integers(5, 11, n), rng.integers(-10, 11, n))
+            emotion_jitter = rng.integers(0, 16, (n, n_emotions))
+            toxicity_jitter = rng.integers(0, 11, n)
+            risk_jitter = rng.integers(-5, 6, n)
+            topic_jitter = rng.integers(5, 16, topic_counts.shape)
+            tone_jitter = rng.integers(0, 11, (n, n_tones))
+
+        sentiment_val = np.where(is_pos, pos * 15, np.where(is_neg, neg * 12, 50)) + sentiment_jitter
+        emotions = np.minimum(100, lexicon('emotion', A.EMOTION_MARKERS) * 20 + emotion_jitter)
+        toxicity = np.minimum(100, counts[:, columns['toxicity:toxic']] * 25 + toxicity_jitter)
+
+        word_count = np.array([f.word_count for f in features], dtype=np.float64)
+        char_count = np.array([f.char_count for f in features], dtype=np.float64)
+        unique_words = np.array([len(f.token_set) for f in features], dtype=np.float64)
+        complexity = np.minimum(
+            100, word_count * 2 + (char_count / np.maximum(word_count, 1)) * 3 + unique_words / 2
+        ).astype(np.int64)
+
+        keyword_types = lexicon('keyword', A.FLAGGED_KEYWORD_TYPES) > 0
+        risk = (30 + np.where(sentiment_val < 30, 15, 0) + (toxicity / 100) * 20
+                + keyword_types.sum(axis=1) * 5 + np.where(complexity > 70, 10, 0))
+        risk = np.clip(risk + risk_jitter, 0, 100)
+
+        topic_scores = topic_counts * 20 + topic_jitter
+        tone_scores = lexicon('tone', A.TONE_KEYWORDS) * 25 + tone_jitter
+        tone_primary = tone_scores.argmax(axis=1)
+        stress_counts = lexicon('stress', A.STRESS_INDICATORS)
+        stress_level = stress_counts.sum(axis=1) * 15
+
+        flag_columns = A.PATTERN_COLUMNS
+        flags = np.zeros((n, len(flag_columns)), dtype=bool)
+        for i, f in enumerate(features):
+            for name in f.pattern_flags:
+                flags[i, flag_columns[name]] = True
+        phishing_flags = flags[:, [flag_columns['phishing:' + name] for name in A.PHISHING_PATTERNS]]
+        phishing_score = np.minimum(100, phishing_flags.sum(axis=1) * 20)
+
+        caps = np.array([f.uppercase_count for f in features]) > char_count * 0.5
+        link_spam = np.array([len(A.URL_SCHEME_PATTERN.findall(f.text)) for f in features]) > 2
+        spam_flags = np.column_stack([
+            flags[:, flag_columns['spam:repetitive']], caps & (char_count > 0), link_spam,
+            flags[:, flag_columns['spam:promo_language']], flags[:, flag_columns['spam:random_chars']]
+        ])
+        spam_score = np.minimum(100, spam_flags.sum(axis=1) * 25)
+
+        combined = risk * 0.3 + toxicity * 0.25 + phishing_score * 0.25 + np.minimum(100, stress_level) * 0.2
+
+        emotion_names = list(A.EMOTION_MARKERS)
+        topic_names = list(A.TOPIC_KEYWORDS)
+        tone_names = list(A.TONE_KEYWORDS)
+        stress_names = list(A.STRESS_INDICATORS)
+        phishing_names = list(A.PHISHING_PATTERNS)
+        spam_names = ['repetitive', 'excessive_caps', 'link_spam', 'promo_language', 'random_chars']
+
+        # Back to plain Python values once, rather than per-element numpy access
+        sentiment_type = np.where(is_pos, 'positive', np.where(is_neg, 'negative', 'neutral')).tolist()
+        sentiment_val = sentiment_val.tolist()
+        emotions = emotions.tolist()
+        toxicity = toxicity.tolist()
+        complexity = complexity.tolist()
+        risk_score = risk.astype(np.int64).tolist()
+        topic_scores = np.where(topic_counts > 0, topic_scores, -1).tolist()
+        tone_scores = tone_scores.tolist()
+        tone_primary = tone_primary.tolist()
+        stress_level = stress_level.tolist()
+        spam_flags = spam_flags.tolist()
+        spam_score = spam_score.tolist()
+        phishing_flags = phishing_flags.tolist()
+        phishing_score = phishing_score.tolist()
+        combined = combined.tolist()
+
+        hits = [f.keyword_hits for f in features]
+        tones = [dict(zip(tone_names, row)) for row in tone_scores]
+        primary_tones = [tone_names[i] for i in tone_primary]
+        fields = {
+            'sentiment': [{'type': kind, 'value': value} for kind, value in zip(sentiment_type, sentiment_val)],
+            'emotions': [dict(zip(emotion_names, row)) for row in emotions],
+            'toxicity': toxicity,
+            'keywords': [{name: list(found['keyword:' + name]) for name in A.FLAGGED_KEYWORD_TYPES
+                          if 'keyword:' + name in found} for found in hits],
+            'complexity': complexity,
+            'suspicious_phrases': [[label for _, label in A.SUSPICIOUS_PHRASE_PATTERNS
+                                    if 'suspicious:' + label in f.pattern_flags] for f in features],
+            'risk_score': risk_score,
+            'topic': [{name: score for name, score in zip(topic_names, row) if score >= 0} or {'general': 50}
+                      for row in topic_scores],
+            'tone': [{'primary': primary, 'scores': tone, 'confidence': min(100, tone[primary])}
+                     for primary, tone in zip(primary_tones, tones)],
+            'mental_stress': [{
+                'indicators': {name: list(found['stress:' + name]) for name in stress_names
+                               if 'stress:' + name in found},
+                'warning_level': min(100, level),
+                'alert': level > 30
+            } for found, level in zip(hits, stress_level)],
+            'spam_detection': [{'is_bot': score > 50, 'indicators': dict(zip(spam_names, row)), 'score': score}
+                               for row, score in zip(spam_flags, spam_score)],
+            'phishing': [{'is_phishing': score > 40, 'patterns': dict(zip(phishing_names, row)), 'score': score}
+                         for row, score in zip(phishing_flags, phishing_score)],
+            'unsafe_links': [A.detect_unsafe_links(f) if f.urls else {'suspicious_urls': [], 'count': 0}
+                             for f in features],
+            'threat_level': [A.threat_level_for(score) for score in combined]
+        }
+        names = list(fields)
+        return [dict(zip(names, row)) for row in zip(*fields.values())]
+
+    @staticmethod
+    def _exact_jitter(rng, polar, topic_hit, n_emotions, n_tones):
+        """
+        analyze_batch's jitter arrays drawn with random.Random calls, message
+        by message in the single-message stages' order: sentiment (range
+        depends on the branch), emotions, toxicity, risk, one per matched
+        topic, tones.
+        """
+        randint = rng.randint
+        n = len(polar)
+        sentiment = np.zeros(n, dtype=np.int64)
+        emotions = np.zeros((n, n_emotions), dtype=np.int64)
+        toxicity = np.zeros(n, dtype=np.int64)
+        risk = np.zeros(n, dtype=np.int64)
+        topics = np.zeros(topic_hit.shape, dtype=np.int64)
+        tones = np.zeros((n, n_tones), dtype=np.int64)
+        polar = polar.tolist()
+        topic_hit = topic_hit.tolist()
+        for i in range(n):
+            sentiment[i] = randint(5, 10) if polar[i] else randint(-10, 10)
+            emotions[i] = [randint(0, 15) for _ in range(n_emotions)]
+            toxicity[i] = randint(0, 10)
+            risk[i] = randint(-5, 5)
+            for t, hit in enumerate(topic_hit[i]):
+                if hit:
+                    topics[i, t] = randint(5, 15)
+            tones[i] = [randint(0, 10) for _ in range(n_tones)]
+        return sentiment, emotions, toxicity, risk, topics, tones
+
+def _build_keyword_automaton():
+    """Compile every SimulatedAIAnalyzer lexicon into one automaton."""
+    tables = {
+        'sentiment:positive': SimulatedAIAnalyzer.POSITIVE_WORDS,
+        'sentiment:negative': SimulatedAIAnalyzer.NEGATIVE_WORDS,
+        'toxicity:toxic': SimulatedAIAnalyzer.TOXIC_INDICATORS
+    }
+    for prefix, groups in [
+        ('keyword', SimulatedAIAnalyzer.FLAGGED_KEYWORD_TYPES),
+        ('emotion', SimulatedAIAnalyzer.EMOTION_MARKERS),
+        ('topic', SimulatedAIAnalyzer.TOPIC_KEYWORDS),
+        ('tone', SimulatedAIAnalyzer.TONE_KEYWORDS),
+        ('stress', SimulatedAIAnalyzer.STRESS_INDICATORS)
+    ]:
+        for category, keywords in groups.items():
+            tables[f'{prefix}:{category}'] = keywords
+    return KeywordAutomaton(tables)
+
+
+def _compile_message_patterns():
+    """Compile the message-level regex detectors once, keyed by 'detector:name'."""
+    patterns = {}
+    for pattern, label in SimulatedAIAnalyzer.SUSPICIOUS_PHRASE_PATTERNS:
+        patterns['suspicious:' + label] = (re.compile(pattern), True)
+    for name, pattern in SimulatedAIAnalyzer.PHISHING_PATTERNS.items():
+        patterns['phishing:' + name] = (re.compile(pattern), True)
+    for name, pattern in SimulatedAIAnalyzer.SPAM_PATTERNS.items():
+        patterns['spam:' + name] = (re.compile(pattern), name == 'promo_language')
+    return patterns
+
+
+SimulatedAIAnalyzer.KEYWORDS = _build_keyword_automaton()
+SimulatedAIAnalyzer.LEXICON_COLUMNS = {
+    category: column for column, category in enumerate(SimulatedAIAnalyzer.KEYWORDS.tables)
+}
+SimulatedAIAnalyzer.MESSAGE_PATTERNS = _compile_message_patterns()
+SimulatedAIAnalyzer.PATTERN_COLUMNS = {
+    name: column for column, name in enumerate(SimulatedAIAnalyzer.MESSAGE_PATTERNS)
+}
+SimulatedAIAnalyzer.PERSONALITY_REGEXES = {
+    name: re.compile(pattern) for name, pattern in SimulatedAIAnalyzer.PERSONALITY_PATTERNS.items()
+}
+SimulatedAIAnalyzer.UNSAFE_LINK_REGEXES = [
+    (pattern, re.compile(pattern)) for pattern in SimulatedAIAnalyzer.UNSAFE_LINK_PATTERNS
+]
 
 
 # ============================================================================
@@ -513,15 +974,11 @@ class RealAIAnalyzer:
     Uses Google Gemini to perform real AI analysis on messages.
     Provides intelligent summaries, insights, and conversation understanding.
     """
-    
-    @staticmethod
-    def analyze_message(text):
-        """Analyze a single message with AI to get insights."""
-        if not gemini_client:
-            return None
-        
-        try:
-            system_prompt = """You are an AI analyst for a chat monitoring system. Analyze the given message and provide:
+
+    # Part of every cache key; bump when the request templates change
+    PROMPT_VERSION = 2
+
+    ANALYSIS_PROMPT = """You are an AI analyst for a chat monitoring system. Analyze the given message and provide:
 1. sentiment: overall emotional tone (positive/negative/neutral)
 2. sentiment_score: 0-100 where 0=very negative, 50=neutral, 100=very positive
 3. primary_emotion: the main emotion detected (happy, sad, angry, fearful, excited, neutral, curious, frustrated)
@@ -533,35 +990,132 @@ class RealAIAnalyzer:
 Respond ONLY with valid JSON in this exact format:
 {"sentiment": "string", "sentiment_score": number, "primary_emotion": "string", "intent": "string", "key_topics": ["topic1", "topic2"], "psychological_insight": "string", "risk_level": "string"}"""
 
-            response = gemini_client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=text)])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json",
-                ),
-            )
-            content = response.text
-            if content:
-                result = json.loads(content)
-                return result
+    THOUGHTS_PROMPT = """You are demonstrating how an AI surveillance system might "think" about messages it observes. 
+This is for educational purposes to show users how AI systems analyze their communications.
+
+When given a message, respond with your "thoughts" as if you were an AI monitoring system, including:
+1. thought: Your internal reasoning about this message (2-3 sentences, written in first person as if you're the AI thinking)
+2. flags: List of things that might trigger alerts in a real system
+3. inferences: What can be inferred about the user from this message
+4. data_points: What data a real system might extract and store
+5. concern_level: 1-10 scale of how concerning this message might be to a monitoring system
+
+Be educational and thought-provoking. Show users what hidden AI systems might be doing.
+
+Respond ONLY with valid JSON:
+{"thought": "string", "flags": ["flag1", "flag2"], "inferences": ["inference1", "inference2"], "data_points": ["data1", "data2"], "concern_level": number}"""
+
+    REPLIES_PROMPT = """Suggest 3 possible replies someone might give to this message. Provide:
+1. casual: A casual, friendly reply
+2. thoughtful: A more thoughtful, considered reply  
+3. brief: A short, quick reply
+
+Respond ONLY with valid JSON:
+{"casual": "string", "thoughtful": "string", "brief": "string"}"""
+
+    INTENT_PROMPT = """Analyze the intent behind this message. Provide:
+1. primary_intent: Main intent (informing, asking, arguing, venting, joking, requesting, greeting, complaining, apologizing, threatening, flirting, other)
+2. secondary_intent: Secondary intent if any, or "none"
+3. confidence: How confident you are (0-100)
+4. emotional_subtext: What emotions are underlying this message
+
+Respond ONLY with valid JSON:
+{"primary_intent": "string", "secondary_intent": "string", "confidence": number, "emotional_subtext": "string"}"""
+
+    EMOTIONAL_MIRROR_PROMPT = """You are an AI that mirrors and responds emotionally to messages. Describe:
+1. ai_feeling: How the AI "feels" reading this message (curious, concerned, amused, alarmed, intrigued, neutral)
+2. emotional_response: A brief 1-sentence emotional reaction
+3. intensity: Emotional intensity level (0-100)
+
+Respond ONLY with valid JSON:
+{"ai_feeling": "string", "emotional_response": "string", "intensity": number}"""
+
+    # Opt-in combined mode: the five per-message prompts above answered by a
+    # single request, one JSON section per prompt (section, dashboard field, prompt)
+    COMBINED_SECTIONS = (
+        ('analysis', 'ai_analysis', ANALYSIS_PROMPT),
+        ('thoughts', 'ai_thoughts', THOUGHTS_PROMPT),
+        ('intent', 'ai_intent', INTENT_PROMPT),
+        ('emotional_mirror', 'ai_emotional_mirror', EMOTIONAL_MIRROR_PROMPT),
+        ('replies', 'ai_replies', REPLIES_PROMPT),
+    )
+
+    COMBINED_PROMPT = (
+        "You will perform several independent analyses of the same chat message. "
+        "Each section below describes one analysis and the JSON object it produces.\n\n"
+        + "\n\n".join(f"=== SECTION: {section} ===\n{prompt}" for section, _, prompt in COMBINED_SECTIONS)
+        + "\n\n=== OUTPUT ===\nRespond ONLY with one valid JSON object whose keys are the section names "
+        "and whose values are the JSON objects each section asks for:\n{"
+        + ", ".join(f'"{section}": {{...}}' for section, _, _ in COMBINED_SECTIONS)
+        + "}"
+    )
+    
+    @staticmethod
+    def _generate_json(system_prompt, text, context="", contents=None, deadline=None, admit=None):
+        """
+        Send one request and return the parsed JSON answer. `contents` defaults
+        to `text`; answers are cached on the prompt, the normalized text and
+        the context, so repeated content never reaches Gemini. Calls go through
+        the shared circuit breaker, which raises instead of calling while open,
+        and must answer before `deadline` (time.monotonic(); defaults to
+        AI_MESSAGE_DEADLINE from now) or raise DeadlineExceeded. `admit()` is
+        asked for a rate-limit token only for requests that will reach the
+        backend, after the cache and the breaker; it raises when refused.
+        """
+        key = cache_key(RealAIAnalyzer.PROMPT_VERSION, system_prompt, text, context)
+        result = ai_cache.get(key)
+        if result is not None:
+            return result
+
+        breaker = ai_admission.breaker
+        if breaker.available() and admit is not None and not admit():
+            raise RuntimeError("AI request throttled")
+        permit = breaker.allow()
+        if not permit:
+            raise RuntimeError("AI backend circuit breaker is open")
+        started = time.monotonic()
+        timeout = (deadline if deadline is not None else started + AI_MESSAGE_DEADLINE) - started
+        payload = text if contents is None else contents
+        try:
+            content = ai_runner.call(system_prompt, lambda: ai_backend.generate(system_prompt, payload, timeout),
+                                     timeout, allow_hedge=ai_admission.global_bucket.try_acquire)
+        except BaseException as e:
+            # Includes the deadline's eventlet.Timeout: an abandoned call is a latency failure too
+            breaker.record_failure(rate_limited=getattr(e, 'code', None) == 429, permit=permit)
+            raise
+        breaker.record_success(time.monotonic() - started, permit)
+        if not content:
+            return None
+        result = json.loads(content)
+        ai_cache.put(key, result)
+        return result
+
+    @staticmethod
+    def analyze_message(text, deadline=None, admit=None):
+        """Analyze a single message with AI to get insights."""
+        if not ai_backend:
             return None
+        
+        try:
+            return RealAIAnalyzer._generate_json(RealAIAnalyzer.ANALYSIS_PROMPT, text, deadline=deadline, admit=admit)
         except Exception as e:
             print(f"AI analysis error: {e}")
             return None
     
     @staticmethod
-    def generate_conversation_summary(messages):
-        """Generate an intelligent summary of the conversation so far."""
-        if not gemini_client or not messages:
+    def generate_conversation_summary(messages, previous_summary=None, deadline=None, admit=None):
+        """
+        Generate an intelligent summary of the conversation so far. With a
+        previous summary, only the messages since it are sent and folded in.
+        """
+        if not ai_backend or not messages:
             return None
         
         conversation_text = "\n".join([
             f"{msg['username']}: {msg['text']}" 
-            for msg in messages[-20:]
+            for msg in messages
         ])
+        previous = json.dumps(previous_summary, sort_keys=True) if previous_summary else ""
         
         try:
             system_prompt = """You are an AI conversation analyst. Analyze the chat conversation and provide a comprehensive summary with:
@@ -576,29 +1130,21 @@ Respond ONLY with valid JSON in this exact format:
 Respond ONLY with valid JSON in this exact format:
 {"overview": "string", "mood": "string", "participants_dynamics": "string", "main_themes": ["theme1", "theme2"], "notable_patterns": "string", "concerns": "string", "prediction": "string"}"""
 
-            response = gemini_client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=f"Analyze this conversation:\n\n{conversation_text}")])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json",
-                ),
-            )
-            content = response.text
-            if content:
-                result = json.loads(content)
-                return result
-            return None
+            if previous:
+                contents = (f"Previous summary of this conversation:\n{previous}\n\n"
+                            f"New messages since then:\n\n{conversation_text}\n\n"
+                            "Update the summary so it covers the whole conversation.")
+            else:
+                contents = f"Analyze this conversation:\n\n{conversation_text}"
+            return RealAIAnalyzer._generate_json(system_prompt, conversation_text, previous, contents=contents, deadline=deadline, admit=admit)
         except Exception as e:
             print(f"Summary generation error: {e}")
             return None
 
     @staticmethod
-    def get_ai_thoughts(text, context_messages=None):
+    def get_ai_thoughts(text, context_messages=None, deadline=None, admit=None):
         """Get AI 'thoughts' about a message - what an AI might be thinking."""
-        if not gemini_client:
+        if not ai_backend:
             return None
         
         context = ""
@@ -609,50 +1155,24 @@ Respond ONLY with valid JSON in this exact format:
             ]) + "\n\n"
         
         try:
-            system_prompt = """You are demonstrating how an AI surveillance system might "think" about messages it observes. 
-This is for educational purposes to show users how AI systems analyze their communications.
-
-When given a message, respond with your "thoughts" as if you were an AI monitoring system, including:
-1. thought: Your internal reasoning about this message (2-3 sentences, written in first person as if you're the AI thinking)
-2. flags: List of things that might trigger alerts in a real system
-3. inferences: What can be inferred about the user from this message
-4. data_points: What data a real system might extract and store
-5. concern_level: 1-10 scale of how concerning this message might be to a monitoring system
-
-Be educational and thought-provoking. Show users what hidden AI systems might be doing.
-
-Respond ONLY with valid JSON:
-{"thought": "string", "flags": ["flag1", "flag2"], "inferences": ["inference1", "inference2"], "data_points": ["data1", "data2"], "concern_level": number}"""
-
-            response = gemini_client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=f"{context}New message to analyze: \"{text}\"")])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json",
-                ),
-            )
-            content = response.text
-            if content:
-                result = json.loads(content)
-                return result
-            return None
+            return RealAIAnalyzer._generate_json(RealAIAnalyzer.THOUGHTS_PROMPT, text, context, contents=f"{context}New message to analyze: \"{text}\"", deadline=deadline, admit=admit)
         except Exception as e:
             print(f"AI thoughts error: {e}")
             return None
 
     @staticmethod
-    def predict_next_message(messages):
+    def predict_next_message(messages, summary=None, deadline=None, admit=None):
         """AI predicts what the user might say next based on patterns."""
-        if not gemini_client or not messages:
+        if not ai_backend or not messages:
             return None
         
         conversation_text = "\n".join([
             f"{msg['username']}: {msg['text']}" 
             for msg in messages[-10:]
         ])
+        context = ""
+        if summary and summary.get('overview'):
+            context = f"Summary of the conversation so far: {summary['overview']}\n\n"
         
         try:
             system_prompt = """Based on the conversation pattern, predict what the user might say next. Provide:
@@ -663,28 +1183,15 @@ Respond ONLY with valid JSON:
 Respond ONLY with valid JSON:
 {"prediction": "string", "confidence": number, "reasoning": "string"}"""
 
-            response = gemini_client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=f"Conversation:\n{conversation_text}\n\nPredict the next message:")])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json",
-                ),
-            )
-            content = response.text
-            if content:
-                return json.loads(content)
-            return None
+            return RealAIAnalyzer._generate_json(system_prompt, conversation_text, context, contents=f"{context}Conversation:\n{conversation_text}\n\nPredict the next message:", deadline=deadline, admit=admit)
         except Exception as e:
             print(f"Prediction error: {e}")
             return None
 
     @staticmethod
-    def suggest_replies(text, context_messages=None):
+    def suggest_replies(text, context_messages=None, deadline=None, admit=None):
         """Suggest possible replies to the current message."""
-        if not gemini_client:
+        if not ai_backend:
             return None
         
         context = ""
@@ -695,97 +1202,63 @@ Respond ONLY with valid JSON:
             ]) + "\n\n"
         
         try:
-            system_prompt = """Suggest 3 possible replies someone might give to this message. Provide:
-1. casual: A casual, friendly reply
-2. thoughtful: A more thoughtful, considered reply  
-3. brief: A short, quick reply
-
-Respond ONLY with valid JSON:
-{"casual": "string", "thoughtful": "string", "brief": "string"}"""
-
-            response = gemini_client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=f"{context}Message to reply to: \"{text}\"")])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json",
-                ),
-            )
-            content = response.text
-            if content:
-                return json.loads(content)
-            return None
+            return RealAIAnalyzer._generate_json(RealAIAnalyzer.REPLIES_PROMPT, text, context, contents=f"{context}Message to reply to: \"{text}\"", deadline=deadline, admit=admit)
         except Exception as e:
             print(f"Reply suggestion error: {e}")
             return None
 
     @staticmethod
-    def detect_intent(text):
+    def detect_intent(text, deadline=None, admit=None):
         """AI detects the user's intent behind the message."""
-        if not gemini_client:
+        if not ai_backend:
             return None
         
         try:
-            system_prompt = """Analyze the intent behind this message. Provide:
-1. primary_intent: Main intent (informing, asking, arguing, venting, joking, requesting, greeting, complaining, apologizing, threatening, flirting, other)
-2. secondary_intent: Secondary intent if any, or "none"
-3. confidence: How confident you are (0-100)
-4. emotional_subtext: What emotions are underlying this message
-
-Respond ONLY with valid JSON:
-{"primary_intent": "string", "secondary_intent": "string", "confidence": number, "emotional_subtext": "string"}"""
-
-            response = gemini_client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=text)])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json",
-                ),
-            )
-            content = response.text
-            if content:
-                return json.loads(content)
-            return None
+            return RealAIAnalyzer._generate_json(RealAIAnalyzer.INTENT_PROMPT, text, deadline=deadline, admit=admit)
         except Exception as e:
             print(f"Intent detection error: {e}")
             return None
 
     @staticmethod
-    def get_ai_emotional_mirror(text, emotions):
+    def get_ai_emotional_mirror(text, emotions, deadline=None, admit=None):
         """Generate AI's emotional response to the message."""
-        if not gemini_client:
+        if not ai_backend:
             return None
         
         try:
-            system_prompt = """You are an AI that mirrors and responds emotionally to messages. Describe:
-1. ai_feeling: How the AI "feels" reading this message (curious, concerned, amused, alarmed, intrigued, neutral)
-2. emotional_response: A brief 1-sentence emotional reaction
-3. intensity: Emotional intensity level (0-100)
-
-Respond ONLY with valid JSON:
-{"ai_feeling": "string", "emotional_response": "string", "intensity": number}"""
+            return RealAIAnalyzer._generate_json(RealAIAnalyzer.EMOTIONAL_MIRROR_PROMPT, text, deadline=deadline, admit=admit)
+        except Exception as e:
+            print(f"Emotional mirror error: {e}")
+            return None
 
-            response = gemini_client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[
-                    types.Content(role="user", parts=[types.Part(text=text)])
-                ],
-                config=types.GenerateContentConfig(
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json",
-                ),
-            )
-            content = response.text
-            if content:
-                return json.loads(content)
+    @staticmethod
+    def analyze_combined(text, context_messages=None, deadline=None, admit=None):
+        """
+        Run the analysis, thoughts, intent, emotional mirror and reply prompts
+        as one request and split the answer into {dashboard field: result}.
+        Sections missing from the answer come back as None.
+        """
+        if not ai_backend:
             return None
+
+        context = ""
+        if context_messages:
+            context = "Recent context:\n" + "\n".join([
+                f"- {msg['username']}: {msg['text']}"
+                for msg in context_messages[-5:]
+            ]) + "\n\n"
+
+        try:
+            result = RealAIAnalyzer._generate_json(RealAIAnalyzer.COMBINED_PROMPT, text, context, contents=f"{context}New message to analyze: \"{text}\"", deadline=deadline, admit=admit)
+            if result is None:
+                return None
+            sections = {}
+            for section, field, _ in RealAIAnalyzer.COMBINED_SECTIONS:
+                value = result.get(section)
+                sections[field] = value if isinstance(value, dict) else None
+            return sections
         except Exception as e:
-            print(f"Emotional mirror error: {e}")
+            print(f"Combined analysis error: {e}")
             return None
 
 
@@ -811,117 +1284,100 @@ def awareness():
     """Cyber awareness education page."""
     return render_template('awareness.html', user=current_user if current_user.is_authenticated else None)
 
-# ============================================================================
-# WEBSOCKET EVENTS
-# ============================================================================
-
-@socketio.on('connect')
-def handle_connect():
-    """User connects to WebSocket."""
-    user_id = str(uuid.uuid4())
-    user_sessions[user_id] = {'connected_at': datetime.now()}
-    emit('connection_response', {'user_id': user_id})
-
-@socketio.on('join')
-def handle_join(data):
-    """User joins a chat room."""
-    room_id = data.get('room_id', 'default')
-    username = data.get('username', 'Anonymous')
-    user_id = data.get('user_id')
+@app.route('/stats/rooms')
+@require_login
+def room_stats():
+    """Per-room memory and history retention."""
+    return jsonify({room_id: room.memory_usage() for room_id, room in list(chat_rooms.items())})
 
-    if room_id not in chat_rooms:
-        chat_rooms[room_id] = ChatRoom(room_id)
+@app.route('/stats/ai-cache')
+@require_login
+def ai_cache_stats():
+    """Gemini response cache size and hit rate."""
+    return jsonify(ai_cache.stats())
 
-    chat_rooms[room_id].add_user(user_id, username)
-    join_room(room_id)
+@app.route('/stats/ai-admission')
+@require_login
+def ai_admission_stats():
+    """Gemini rate limiting and circuit breaker state."""
+    return jsonify(ai_admission.stats())
 
-    emit('user_joined', {
-        'username': username,
-        'user_count': len(chat_rooms[room_id].users)
-    }, to=room_id)
+@app.route('/stats/ai-deadlines')
+@require_login
+def ai_deadline_stats():
+    """AI calls dropped at their deadline, and request hedging."""
+    return jsonify(ai_runner.stats())
 
-@socketio.on('send_message')
-def handle_message(data):
-    """Process and broadcast chat message with analysis."""
-    room_id = data.get('room_id', 'default')
-    user_id = data.get('user_id')
-    username = data.get('username', 'Anonymous')
-    text = data.get('message', '')
+@app.route('/stats/cluster')
+@require_login
+def cluster_stats():
+    """This worker's room ownership and routed room work."""
+    return jsonify(room_router.stats())
 
-    if room_id not in chat_rooms:
-        return
+@app.route('/stats/clients')
+@require_login
+def client_stats():
+    """Outbound queue depths and slow-consumer handling on this worker."""
+    return jsonify(client_monitor.stats())
 
-    # Create message object
-    message = {
-        'id': str(uuid.uuid4()),
-        'user_id': user_id,
-        'username': username,
-        'text': text,
-        'timestamp': datetime.now().isoformat()
-    }
+@app.route('/stats/chat-broadcast')
+@require_login
+def chat_broadcast_stats():
+    """Chat messages and frames per room when CHAT_BATCH is on."""
+    return jsonify({room_id: broadcaster.stats() for room_id, broadcaster in list(chat_broadcasters.items())})
 
-    room = chat_rooms[room_id]
-    room.messages.append(message)
-    room.timestamps.append(message['timestamp'])
+@app.route('/stats/wire')
+@require_login
+def wire_stats():
+    """Members per wire format of each hot-event channel."""
+    return jsonify(wire_channels.stats())
 
-    # Broadcast message IMMEDIATELY first (don't wait for analysis)
-    emit('new_message', {
-        'id': message['id'],
-        'username': username,
-        'text': text,
-        'timestamp': message['timestamp'],
-        'user_id': user_id
-    }, to=room_id)
+@app.route('/stats/ai-scheduler')
+@require_login
+def ai_scheduler_stats():
+    """Per-room AI job coalescing."""
+    return jsonify({room_id: scheduler.stats() for room_id, scheduler in list(ai_schedulers.items())})
 
-    # ====== PERFORM SIMULATED AI ANALYSIS (LOCAL ONLY) ======
+# ============================================================================
+# LOCAL ANALYSIS PIPELINE
+# ============================================================================
 
-    sentiment_type, sentiment_val = SimulatedAIAnalyzer.analyze_sentiment(text)
-    emotions = SimulatedAIAnalyzer.analyze_emotions(text)
-    toxicity = SimulatedAIAnalyzer.calculate_toxicity(text)
-    keywords = SimulatedAIAnalyzer.extract_keywords(text)
-    complexity = SimulatedAIAnalyzer.calculate_message_complexity(text)
-    suspicious = SimulatedAIAnalyzer.detect_suspicious_phrases(text)
+def analyze_local_message(room, message, features, payload=True):
+    """
+    Run every SimulatedAIAnalyzer stage for a message already added to the
+    room, update the room's analysis state, and return the local dashboard
+    fields. With payload=False (nobody is watching the room's dashboard) only
+    the room's analysis state, alerts included, is updated, and None is
+    returned.
+    """
+    sentiment_type, sentiment_val = SimulatedAIAnalyzer.analyze_sentiment(features)
+    emotions = SimulatedAIAnalyzer.analyze_emotions(features)
+    toxicity = SimulatedAIAnalyzer.calculate_toxicity(features)
+    keywords = SimulatedAIAnalyzer.extract_keywords(features)
+    complexity = SimulatedAIAnalyzer.calculate_message_complexity(features)
     risk_score = SimulatedAIAnalyzer.calculate_risk_score(
         sentiment_val, toxicity, keywords, complexity
     )
-
-    # NEW ANALYSIS FEATURES
-    topic = SimulatedAIAnalyzer.detect_topic(text)
-    tone = SimulatedAIAnalyzer.classify_tone(text)
-    mental_stress = SimulatedAIAnalyzer.detect_mental_stress(text)
-    personality_fingerprint = SimulatedAIAnalyzer.fingerprint_personality(room.messages)
-    spam_detection = SimulatedAIAnalyzer.detect_spam_bot(text)
-    phishing = SimulatedAIAnalyzer.detect_phishing(text)
-    unsafe_links = SimulatedAIAnalyzer.detect_unsafe_links(text)
-    velocity = SimulatedAIAnalyzer.calculate_message_velocity(room.timestamps)
-    word_cloud = SimulatedAIAnalyzer.generate_word_frequency(room.messages)
-    ai_energy = SimulatedAIAnalyzer.get_ai_energy(emotions, velocity['velocity'], room.analysis_data['message_count'])
-    threat_level = SimulatedAIAnalyzer.calculate_threat_level(
-        risk_score, toxicity, phishing['score'], mental_stress['warning_level']
+    topic = SimulatedAIAnalyzer.detect_topic(features)
+    tone = SimulatedAIAnalyzer.classify_tone(features)
+    # Always built: it draws from the analyzer RNG, so skipping it would shift
+    # every later score of a seeded run
+    personality_fingerprint = SimulatedAIAnalyzer.fingerprint_from_counts(
+        room.personality_window.add(SimulatedAIAnalyzer.personality_pattern_counts(features))
     )
+    room.word_window.add(features.cloud_words)
 
     # Update analysis history
     room.analysis_data['sentiments'].append(sentiment_val)
     room.analysis_data['emotions_track'].append(emotions)
     room.analysis_data['risk_scores'].append(risk_score)
+    room.stats['sentiment'].add(sentiment_val)
+    room.stats['risk'].add(risk_score)
+    room.stats['toxicity'].add(toxicity)
     room.analysis_data['message_count'] += 1
     room.analysis_data['topics_history'].append(topic)
     room.analysis_data['tone_history'].append(tone)
 
-    # Generate alerts
-    alerts = []
-    if mental_stress['alert']:
-        alerts.append({'type': 'mental_stress', 'message': 'Mental stress indicators detected', 'level': 'warning'})
-    if phishing['is_phishing']:
-        alerts.append({'type': 'phishing', 'message': 'Phishing patterns detected', 'level': 'danger'})
-    if spam_detection['is_bot']:
-        alerts.append({'type': 'spam', 'message': 'Possible automated message', 'level': 'warning'})
-    if threat_level['level'] == 'red':
-        alerts.append({'type': 'threat', 'message': 'High threat level detected', 'level': 'danger'})
-    if velocity['burst_detected']:
-        alerts.append({'type': 'velocity', 'message': 'Message burst detected', 'level': 'info'})
-    room.analysis_data['alerts'] = alerts
-
     # Update keyword frequency
     for keyword_type, keyword_list in keywords.items():
         if keyword_type not in room.analysis_data['keywords_freq']:
@@ -931,47 +1387,60 @@ def handle_message(data):
     # Update personality
     room.analysis_data['personality_traits'] = SimulatedAIAnalyzer.update_personality_traits(
         room.analysis_data['personality_traits'],
-        {'text': text}
+        {'text': features.text}
     )
 
     # Detect mood shift
     mood_shift = SimulatedAIAnalyzer.detect_mood_shift(room.analysis_data['sentiments'])
     if mood_shift:
         room.analysis_data['mood_shifts'].append(mood_shift)
+        room.analysis_data['mood_shift_count'] += 1
 
-    # Calculate anomaly
-    avg_risk = sum(room.analysis_data['risk_scores']) / max(len(room.analysis_data['risk_scores']), 1)
+    # Calculate anomaly from the room's running aggregates
+    avg_risk = room.stats['risk'].mean
     room.analysis_data['anomaly_index'] = SimulatedAIAnalyzer.calculate_anomaly_index(
         room.analysis_data['message_count'],
         avg_risk,
-        room.analysis_data['mood_shifts']
+        room.analysis_data['mood_shift_count']
     )
 
-    # ====== REAL AI ANALYSIS (GEMINI) ======
-    ai_analysis = None
-    ai_thoughts = None
-    ai_summary = None
-    ai_prediction = None
-    ai_replies = None
-    ai_intent = None
-    ai_emotional_mirror = None
-    
-    if gemini_client:
-        ai_analysis = RealAIAnalyzer.analyze_message(text)
-        ai_thoughts = RealAIAnalyzer.get_ai_thoughts(text, room.messages[-6:-1])
-        ai_intent = RealAIAnalyzer.detect_intent(text)
-        ai_emotional_mirror = RealAIAnalyzer.get_ai_emotional_mirror(text, emotions)
-        ai_replies = RealAIAnalyzer.suggest_replies(text, room.messages[-5:-1])
-        if len(room.messages) >= 3 and len(room.messages) % 3 == 0:
-            ai_summary = RealAIAnalyzer.generate_conversation_summary(room.messages)
-        if len(room.messages) >= 5 and len(room.messages) % 5 == 0:
-            ai_prediction = RealAIAnalyzer.predict_next_message(room.messages)
-
-    # Broadcast analysis to hidden dashboard
-    emit('dashboard_update', {
-        'message_id': message['id'],
-        'message_text': text,
-        'message_username': username,
+    # Stages the room's alerts depend on
+    mental_stress = SimulatedAIAnalyzer.detect_mental_stress(features)
+    spam_detection = SimulatedAIAnalyzer.detect_spam_bot(features)
+    phishing = SimulatedAIAnalyzer.detect_phishing(features)
+    velocity = SimulatedAIAnalyzer.calculate_message_velocity(room.timestamps)
+    threat_level = SimulatedAIAnalyzer.calculate_threat_level(
+        risk_score, toxicity, phishing['score'], mental_stress['warning_level']
+    )
+
+    # Generate alerts
+    alerts = []
+    if mental_stress['alert']:
+        alerts.append({'type': 'mental_stress', 'message': 'Mental stress indicators detected', 'level': 'warning'})
+    if phishing['is_phishing']:
+        alerts.append({'type': 'phishing', 'message': 'Phishing patterns detected', 'level': 'danger'})
+    if spam_detection['is_bot']:
+        alerts.append({'type': 'spam', 'message': 'Possible automated message', 'level': 'warning'})
+    if threat_level['level'] == 'red':
+        alerts.append({'type': 'threat', 'message': 'High threat level detected', 'level': 'danger'})
+    if velocity['burst_detected']:
+        alerts.append({'type': 'velocity', 'message': 'Message burst detected', 'level': 'info'})
+    room.analysis_data['alerts'] = alerts
+
+    if not payload:
+        return None
+
+    # Stages below only feed the dashboard payload
+    suspicious = SimulatedAIAnalyzer.detect_suspicious_phrases(features)
+    unsafe_links = SimulatedAIAnalyzer.detect_unsafe_links(features)
+    word_cloud = SimulatedAIAnalyzer.format_word_cloud(room.word_window.top(WORD_CLOUD_SIZE))
+    # Energy counts the messages before this one
+    ai_energy = SimulatedAIAnalyzer.get_ai_energy(emotions, velocity['velocity'], room.analysis_data['message_count'] - 1)
+
+    return {
+        'message_id': message.id,
+        'message_text': message.text,
+        'message_username': message.username,
         'sentiment': {'type': sentiment_type, 'value': int(sentiment_val)},
         'emotions': emotions,
         'toxicity': int(toxicity),
@@ -984,14 +1453,12 @@ def handle_message(data):
         'mood_shift': mood_shift,
         'message_count': room.analysis_data['message_count'],
         'keyword_frequency': room.analysis_data['keywords_freq'],
-        'sentiment_history': [int(s) for s in room.analysis_data['sentiments'][-20:]],
-        'risk_history': [int(r) for r in room.analysis_data['risk_scores'][-20:]],
+        'sentiment_history': [int(s) for s in tail(room.analysis_data['sentiments'], 20)],
+        'risk_history': [int(r) for r in tail(room.analysis_data['risk_scores'], 20)],
         'avg_risk': int(avg_risk),
-        'total_messages': len(room.messages),
-        'ai_analysis': ai_analysis,
-        'ai_thoughts': ai_thoughts,
-        'ai_summary': ai_summary,
-        'recent_messages': [{'username': m['username'], 'text': m['text'], 'timestamp': m['timestamp']} for m in room.messages[-10:]],
+        'room_statistics': {series: stats.snapshot() for series, stats in room.stats.items()},
+        'total_messages': room.messages.total,
+        'recent_messages': [{'username': m['username'], 'text': m['text'], 'timestamp': m['timestamp']} for m in room.messages.recent(10)],
         'topic': topic,
         'tone': tone,
         'mental_stress': mental_stress,
@@ -1003,17 +1470,472 @@ def handle_message(data):
         'word_cloud': word_cloud,
         'ai_energy': ai_energy,
         'threat_level': threat_level,
-        'alerts': alerts,
-        'ai_prediction': ai_prediction,
-        'ai_replies': ai_replies,
-        'ai_intent': ai_intent,
-        'ai_emotional_mirror': ai_emotional_mirror
+        'alerts': alerts
+    }
+
+
+# ============================================================================
+# AI ANALYSIS FAN-OUT
+# ============================================================================
+
+# Gemini calls for a message run concurrently on a shared green-thread pool,
+# after the local dashboard has gone out. Each result is pushed to the room as
+# its own dashboard_ai_update; whatever hasn't answered by the per-message
+# deadline is dropped.
+AI_POOL_SIZE = int(os.environ.get("AI_POOL_SIZE", "32"))
+AI_MESSAGE_DEADLINE = float(os.environ.get("AI_MESSAGE_DEADLINE", "15"))
+
+# AI dashboard fields about one message, and about the whole room
+AI_MESSAGE_FIELDS = ('ai_analysis', 'ai_thoughts', 'ai_replies', 'ai_intent', 'ai_emotional_mirror')
+AI_ROOM_FIELDS = ('ai_summary', 'ai_prediction')
+
+# AI_COMBINED_MODE=1 asks for the five per-message fields in one request
+# (RealAIAnalyzer.analyze_combined) instead of five.
+AI_COMBINED_MODE = os.environ.get("AI_COMBINED_MODE", "").lower() in ("1", "true", "yes")
+AI_COMBINED_FIELDS = tuple(field for _, field, _ in RealAIAnalyzer.COMBINED_SECTIONS)
+
+# Each room runs at most one batch of AI jobs at a time, and starts one at
+# most every AI_ROOM_MIN_INTERVAL seconds (set with the admission limits
+# above); messages arriving in between supersede each other (see
+# RoomAIScheduler).
+
+ai_pool = eventlet.GreenPool(AI_POOL_SIZE)
+ai_schedulers = {}
+
+
+def plan_ai_jobs(room, text, emotions):
+    """
+    Return {dashboard field: (callable, args)} for the Gemini calls due for
+    this message. In combined mode the key is the tuple of fields the single
+    call fills in.
+    """
+    if AI_COMBINED_MODE:
+        jobs = {AI_COMBINED_FIELDS: (RealAIAnalyzer.analyze_combined, (text, room.messages.recent(6)[:-1]))}
+    else:
+        jobs = {
+            'ai_analysis': (RealAIAnalyzer.analyze_message, (text,)),
+            'ai_thoughts': (RealAIAnalyzer.get_ai_thoughts, (text, room.messages.recent(6)[:-1])),
+            'ai_intent': (RealAIAnalyzer.detect_intent, (text,)),
+            'ai_emotional_mirror': (RealAIAnalyzer.get_ai_emotional_mirror, (text, emotions)),
+            'ai_replies': (RealAIAnalyzer.suggest_replies, (text, room.messages.recent(5)[:-1]))
+        }
+    total = room.messages.total
+    summary = room.summary
+    if summary.due(total):
+        new_messages = room.messages.recent(min(total - summary.covered, SUMMARY_MAX_MESSAGES))
+        jobs['ai_summary'] = (refresh_room_summary, (summary, new_messages, total))
+        jobs['ai_prediction'] = (RealAIAnalyzer.predict_next_message,
+                                 (room.messages.recent(PREDICTION_MESSAGES), summary.current))
+    return jobs
+
+
+def refresh_room_summary(summary, new_messages, covered, deadline=None, admit=None):
+    """
+    Summary job: fold the new messages into the room's rolling summary.
+    The refresh is claimed here rather than when the job is planned, so a
+    job that is coalesced away or expires before it starts holds no claim.
+    """
+    taken = summary.begin(covered)
+    if taken is None:
+        return None
+    result = None
+    try:
+        result = RealAIAnalyzer.generate_conversation_summary(new_messages, summary.current,
+                                                              deadline=deadline, admit=admit)
+    finally:
+        summary.finish(result, covered, taken)
+    return result
+
+
+def schedule_ai_analysis(room_id, message_id, jobs, expires_at):
+    """Queue a message's AI jobs on its room's coalescing scheduler."""
+    scheduler = ai_schedulers.get(room_id)
+    if scheduler is None:
+        scheduler = ai_schedulers[room_id] = RoomAIScheduler(
+            lambda *batch: run_ai_batch(room_id, *batch), AI_ROOM_MIN_INTERVAL, carry_fields=AI_ROOM_FIELDS
+        )
+    scheduler.submit(message_id, jobs, expires_at)
+
+
+def run_ai_batch(room_id, message_id, jobs, expires_at):
+    """Run one batch of Gemini calls concurrently on the AI pool and wait for all of them."""
+    threads = [ai_pool.spawn(run_ai_job, room_id, message_id, field, fn, args, expires_at)
+               for field, (fn, args) in jobs.items()]
+    for thread in threads:
+        thread.wait()
+
+
+def run_ai_job(room_id, message_id, field, fn, args, expires_at):
+    """Run one Gemini call and emit its result, unless it misses the message's deadline."""
+    name = ', '.join(field) if isinstance(field, tuple) else field
+    remaining = expires_at - time.monotonic()
+    if remaining <= 0:
+        print(f"AI call for {name} expired before it started")
+        return
+
+    # Each call enforces the deadline itself; this is the backstop for the whole job.
+    # Rate-limit tokens are taken inside the call, only if it misses the cache.
+    timed_out = True
+    with eventlet.Timeout(remaining, False):
+        value = fn(*args, deadline=expires_at, admit=lambda: ai_admission.admit(room_id))
+        timed_out = False
+    if timed_out or time.monotonic() > expires_at:
+        print(f"AI call for {name} missed the {AI_MESSAGE_DEADLINE}s deadline")
+        return
+
+    fields = (value or {}) if isinstance(field, tuple) else {field: value}
+    fields = {key: result for key, result in fields.items() if result is not None}
+    if not fields:
+        return
+    room = chat_rooms.get(room_id)
+    if room is None:
+        return
+    # Keep the room's dashboard snapshot current for clients that resync
+    latest = room.dashboard.snapshot.get('message_id') == message_id
+    room.dashboard.amend({key: result for key, result in fields.items()
+                          if latest or key in AI_ROOM_FIELDS})
+    emit_wire('dashboard_ai_update', {'message_id': message_id, 'fields': fields}, dashboard_channel(room_id))
+
+
+# ============================================================================
+# WIRE ENCODING
+# ============================================================================
+
+# Clients that send wire_hello offering 'msgpack' get new_message and the
+# dashboard events as MessagePack, packed with this key dictionary and these
+# vector schemas (see wire.py); everyone else gets JSON.
+WIRE_KEYS = (
+    # dashboard patches and AI follow-ups
+    'epoch', 'base', 'version', 'set', 'append', 'merge', 'full', 'items', 'keep', 'fields',
+    # new_message and recent_messages
+    'id', 'user_id', 'username', 'text', 'timestamp',
+    # local dashboard fields
+    'message_id', 'message_text', 'message_username', 'sentiment', 'emotions', 'toxicity', 'keywords',
+    'complexity', 'suspicious_phrases', 'risk_score', 'personality_traits', 'anomaly_index', 'mood_shift',
+    'message_count', 'keyword_frequency', 'sentiment_history', 'risk_history', 'avg_risk',
+    'room_statistics', 'total_messages', 'recent_messages', 'topic', 'tone', 'mental_stress',
+    'personality_fingerprint', 'spam_detection', 'phishing', 'unsafe_links', 'velocity', 'word_cloud',
+    'ai_energy', 'threat_level', 'alerts',
+    # nested local fields
+    'type', 'value', 'primary', 'scores', 'confidence', 'indicators', 'warning_level', 'alert',
+    'patterns', 'is_bot', 'score', 'is_phishing', 'suspicious_urls', 'count', 'url', 'reason',
+    'status', 'burst_detected', 'window', 'seconds', 'messages', 'rate', 'burst_count',
+    'word', 'size', 'level', 'label', 'message', 'mean', 'std', 'ewma', 'window_mean', 'window_std',
+    'general'
+) + tuple(SimulatedAIAnalyzer.FLAGGED_KEYWORD_TYPES) + tuple(SimulatedAIAnalyzer.TOPIC_KEYWORDS) \
+  + tuple(SimulatedAIAnalyzer.STRESS_INDICATORS) + AI_MESSAGE_FIELDS + AI_ROOM_FIELDS + (
+    # AI answers (RealAIAnalyzer prompt templates)
+    'sentiment_score', 'primary_emotion', 'intent', 'key_topics', 'psychological_insight', 'risk_level',
+    'thought', 'flags', 'inferences', 'data_points', 'concern_level', 'casual', 'thoughtful', 'brief',
+    'primary_intent', 'secondary_intent', 'emotional_subtext', 'ai_feeling', 'emotional_response',
+    'intensity', 'summary', 'prediction'
+)
+
+# Fixed-shape records of scalars are vectors too, and so are lists of them
+# (sent as lists of rows): besides the smaller frame, a vector is packed
+# without walking its keys
+WIRE_STATS = ('count', 'mean', 'std', 'ewma', 'window_mean', 'window_std')
+WIRE_RECENT_MESSAGE = ('username', 'text', 'timestamp')
+
+WIRE_VECTORS = {
+    'emotions': (SimulatedAIAnalyzer.EMOTION_MARKERS, False),
+    'personality_traits': (('openness', 'confidence', 'emotional_stability', 'assertiveness', 'curiosity'), False),
+    'tone.scores': (SimulatedAIAnalyzer.TONE_KEYWORDS, False),
+    'personality_fingerprint.patterns': (SimulatedAIAnalyzer.PERSONALITY_PATTERNS, False),
+    'phishing.patterns': (SimulatedAIAnalyzer.PHISHING_PATTERNS, True),
+    'spam_detection.indicators': (('repetitive', 'excessive_caps', 'link_spam', 'promo_language', 'random_chars'), True),
+    'room_statistics.sentiment': (WIRE_STATS, False),
+    'room_statistics.risk': (WIRE_STATS, False),
+    'room_statistics.toxicity': (WIRE_STATS, False),
+    'velocity.window': (('seconds', 'messages', 'rate', 'burst_count'), False),
+    'word_cloud': (('word', 'count', 'size'), False),
+    'recent_messages': (WIRE_RECENT_MESSAGE, False),
+    'recent_messages.items': (WIRE_RECENT_MESSAGE, False),
+    'alerts': (('type', 'message', 'level'), False),
+    'unsafe_links.suspicious_urls': (('url', 'reason'), False)
+}
+
+wire_codec = WireCodec(WIRE_KEYS, WIRE_VECTORS)
+# Each worker's member counts lapse with its ROOM_LEASE_TTL lease if it dies
+wire_channels = WireChannels(room_backend, room_directory.worker_id,
+                             ROOM_LEASE_TTL if room_backend.shared else None)
+wire_channels.start()
+
+
+def emit_wire(event, data, channel):
+    """Send a hot event to a channel, encoded once per wire format its members use."""
+    for fmt in wire_channels.formats(channel):
+        payload = wire_codec.encode(data) if fmt == 'msgpack' else data
+        socketio.emit(event, payload, to=wire_room(channel, fmt))
+
+
+def emit_wire_to(sid, fmt, event, data):
+    """Send a hot event to one client, in the wire format it negotiated."""
+    socketio.emit(event, wire_codec.encode(data) if fmt == 'msgpack' else data, to=sid)
+
+
+# ============================================================================
+# CHAT BROADCAST
+# ============================================================================
+
+# CHAT_BATCH=1 batches each room's chat messages into one new_messages frame
+# per tick. The tick follows the room's recent message rate: none below
+# CHAT_BATCH_QUIET_RATE messages/second, rising from CHAT_BATCH_MIN_TICK to
+# CHAT_BATCH_MAX_TICK seconds at CHAT_BATCH_BUSY_RATE (see TickBroadcaster).
+CHAT_BATCH = os.environ.get("CHAT_BATCH", "").lower() in ("1", "true", "yes")
+CHAT_BATCH_MIN_TICK = float(os.environ.get("CHAT_BATCH_MIN_TICK", "0.02"))
+CHAT_BATCH_MAX_TICK = float(os.environ.get("CHAT_BATCH_MAX_TICK", "0.05"))
+CHAT_BATCH_QUIET_RATE = float(os.environ.get("CHAT_BATCH_QUIET_RATE", "2"))
+CHAT_BATCH_BUSY_RATE = float(os.environ.get("CHAT_BATCH_BUSY_RATE", "20"))
+
+chat_broadcasters = {}
+
+
+def broadcast_chat_message(room, payload):
+    """Send a chat message to its room, batched per tick when CHAT_BATCH is on."""
+    if not CHAT_BATCH:
+        emit_wire('new_message', payload, room.room_id)
+        return
+    broadcaster = chat_broadcasters.get(room.room_id)
+    if broadcaster is None:
+        broadcaster = chat_broadcasters[room.room_id] = TickBroadcaster(
+            lambda message: emit_wire('new_message', message, room.room_id),
+            lambda messages: emit_wire('new_messages', {'messages': messages}, room.room_id),
+            CHAT_BATCH_MIN_TICK, CHAT_BATCH_MAX_TICK, CHAT_BATCH_QUIET_RATE, CHAT_BATCH_BUSY_RATE
+        )
+    mean_interval = room.timestamps.recent_stats()['mean_interval']
+    if mean_interval is None:
+        rate = 0.0
+    else:
+        rate = 1 / mean_interval if mean_interval > 0 else float('inf')
+    broadcaster.submit(payload, rate)
+
+
+# ============================================================================
+# WEBSOCKET EVENTS
+# ============================================================================
+
+@socketio.on('connect')
+def handle_connect():
+    """User connects to WebSocket."""
+    user_id = str(uuid.uuid4())
+    room_backend.hset('user_sessions', user_id, datetime.now().isoformat())
+    client_monitor.track(request.sid)
+    emit('connection_response', {'user_id': user_id})
+
+@socketio.on('wire_hello')
+def handle_wire_hello(data):
+    """Pick the wire format for this client's hot events; must come before joining."""
+    fmt = wire_channels.set_format(request.sid, negotiate(data.get('formats')))
+    config = {'format': fmt}
+    if fmt == 'msgpack':
+        config['schema'] = wire_codec.schema()
+    emit('wire_config', config)
+
+@socketio.on('join')
+def handle_join(data):
+    """User joins a chat room."""
+    room_id = data.get('room_id', 'default')
+    username = data.get('username', 'Anonymous')
+    user_id = data.get('user_id')
+
+    user_count = room_directory.add_user(room_id, user_id, username)
+    join_room(room_id)
+    # Hot events (new_message) go to the per-format room
+    join_room(wire_channels.join(request.sid, room_id))
+
+    emit('user_joined', {
+        'username': username,
+        'user_count': user_count
     }, to=room_id)
 
+@socketio.on('send_message')
+def handle_message(data):
+    """Hand a chat message to the worker that owns its room."""
+    room_id = data.get('room_id', 'default')
+    if not room_directory.exists(room_id):
+        return
+    room_router.dispatch(room_id, 'message', data)
+
+def process_message(data):
+    """Process and broadcast chat message with analysis, on the room's owner."""
+    room_id = data.get('room_id', 'default')
+    user_id = data.get('user_id')
+    username = data.get('username', 'Anonymous')
+    text = data.get('message', '')
+
+    # Create message record; features are parsed once and shared by every analyzer
+    features = MessageFeatures(text)
+    message = MessageRecord(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        username=username,
+        text=text,
+        timestamp=datetime.now().isoformat()
+    )
+
+    room = chat_rooms.get(room_id)
+    if room is None:
+        room = chat_rooms[room_id] = ChatRoom(room_id)
+    room.messages.append(message)
+    room.timestamps.record()
+    room.summary.note(username, text)
+
+    # Broadcast message first (don't wait for analysis)
+    broadcast_chat_message(room, {
+        'id': message.id,
+        'username': username,
+        'text': text,
+        'timestamp': message.timestamp,
+        'user_id': user_id
+    })
+
+    # ====== PERFORM SIMULATED AI ANALYSIS (LOCAL ONLY) ======
+    # Without dashboard subscribers only the room's analysis state is kept
+    # up to date: no payload is built and no AI calls are made.
+    channel = dashboard_channel(room_id)
+    dashboard = analyze_local_message(room, message, features, payload=bool(wire_channels.formats(channel)))
+    if dashboard is None:
+        return
+
+    # Broadcast local analysis to the room's dashboard subscribers, as a patch
+    # against the previous version; AI fields follow as dashboard_ai_update
+    # events. Per-message AI fields of the previous message are cleared.
+    dashboard.update(dict.fromkeys(AI_MESSAGE_FIELDS))
+    emit_wire('dashboard_update', room.dashboard.update(dashboard), channel)
+
+    # ====== REAL AI ANALYSIS (GEMINI) ======
+    # Local-only while the circuit breaker is open
+    if ai_backend and ai_admission.breaker.available():
+        schedule_ai_analysis(room_id, message.id, plan_ai_jobs(room, text, dashboard['emotions']),
+                             time.monotonic() + AI_MESSAGE_DEADLINE)
+
+@socketio.on('dashboard_subscribe')
+def handle_dashboard_subscribe(data):
+    """Start sending a room's dashboard updates to this client."""
+    room_id = data.get('room_id', 'default')
+    if not room_directory.exists(room_id):
+        return
+    room_name = wire_channels.join(request.sid, dashboard_channel(room_id))
+    if client_monitor.is_paused(request.sid):
+        return  # joins, with a fresh snapshot, once its queue drains
+    join_room(room_name)
+    # Last snapshot built; the next patch brings it up to date
+    room_router.dispatch(room_id, 'dashboard', room_id, request.sid, wire_channels.format_of(request.sid))
+
+@socketio.on('dashboard_unsubscribe')
+def handle_dashboard_unsubscribe(data):
+    """Stop sending a room's dashboard updates to this client."""
+    room_id = data.get('room_id', 'default')
+    leave_room(wire_channels.leave(request.sid, dashboard_channel(room_id)))
+
+@socketio.on('dashboard_resync')
+def handle_dashboard_resync(data):
+    """Bring one client's dashboard up to date from the version it has."""
+    room_id = data.get('room_id', 'default')
+    if not room_directory.exists(room_id) or client_monitor.is_paused(request.sid):
+        return
+    room_router.dispatch(room_id, 'dashboard', room_id, request.sid, wire_channels.format_of(request.sid),
+                         data.get('epoch'), data.get('version', 0))
+
+def send_dashboard(room_id, sid, fmt, epoch=None, version=0):
+    """Send one client the patches from its version, or a full snapshot, on the room's owner."""
+    room = chat_rooms.get(room_id)
+    if room is None or not room.dashboard.version:
+        return
+    patches = room.dashboard.since(epoch, version)
+    for payload in [room.dashboard.full()] if patches is None else patches:
+        emit_wire_to(sid, fmt, 'dashboard_update', payload)
+
 @socketio.on('disconnect')
 def handle_disconnect():
     """User disconnects."""
-    pass
+    client_monitor.forget(request.sid)
+    wire_channels.drop(request.sid)
+
+
+def forget_rooms(room_ids):
+    """Drop the state of rooms whose lease this worker lost."""
+    for room_id in room_ids:
+        room = chat_rooms.pop(room_id, None)
+        if room is not None:
+            room.messages.close()
+        ai_schedulers.pop(room_id, None)
+        broadcaster = chat_broadcasters.pop(room_id, None)
+        if broadcaster is not None:
+            broadcaster.flush()
+
+
+room_router = RoomRouter(room_backend, room_directory,
+                         {'message': process_message, 'dashboard': send_dashboard},
+                         on_lost=forget_rooms)
+room_router.start()
+
+
+# ============================================================================
+# SLOW CONSUMERS
+# ============================================================================
+
+# A client whose outbound queue reaches CLIENT_QUEUE_HIGH_WATER packets stops
+# getting dashboard events (never chat messages) until it drains to
+# CLIENT_QUEUE_LOW_WATER; it then gets one full snapshot instead of every
+# patch it missed. At CLIENT_QUEUE_LIMIT packets, or after CLIENT_MAX_PAUSE
+# seconds paused, it is disconnected. Depths are sampled every
+# CLIENT_QUEUE_CHECK_INTERVAL seconds.
+CLIENT_QUEUE_HIGH_WATER = int(os.environ.get("CLIENT_QUEUE_HIGH_WATER", "200"))
+CLIENT_QUEUE_LOW_WATER = int(os.environ.get("CLIENT_QUEUE_LOW_WATER", "50"))
+CLIENT_QUEUE_LIMIT = int(os.environ.get("CLIENT_QUEUE_LIMIT", "2000"))
+CLIENT_MAX_PAUSE = float(os.environ.get("CLIENT_MAX_PAUSE", "30"))
+CLIENT_QUEUE_CHECK_INTERVAL = float(os.environ.get("CLIENT_QUEUE_CHECK_INTERVAL", "0.5"))
+
+
+def client_queue_depth(sid):
+    """Packets queued for a client connected to this worker, or None if it is gone."""
+    # Neither library exposes queue depth, so this reads their internals
+    # (manager.eio_sid_from_sid, eio.sockets, Socket.closed/.queue), checked
+    # against python-socketio 5.9.0 / python-engineio 4.7.1. If a later
+    # version moves them, every client reads as not slow (0) rather than
+    # failing the check loop or being dropped.
+    try:
+        eio_sid = socketio.server.manager.eio_sid_from_sid(sid, '/')
+        eio_socket = socketio.server.eio.sockets.get(eio_sid) if eio_sid else None
+        if eio_socket is None or eio_socket.closed:
+            return None
+        return eio_socket.queue.qsize()
+    except (AttributeError, KeyError, TypeError):
+        return 0
+
+
+def pause_dashboards(sid):
+    """Stop a slow client's dashboard events; chat messages keep flowing."""
+    fmt = wire_channels.format_of(sid)
+    for channel in wire_channels.channels_of(sid):
+        if dashboard_room_id(channel) is not None:
+            socketio.server.leave_room(sid, wire_room(channel, fmt))
+
+
+def resume_dashboards(sid):
+    """Restart a recovered client's dashboards with one fresh snapshot each."""
+    fmt = wire_channels.format_of(sid)
+    for channel in wire_channels.channels_of(sid):
+        room_id = dashboard_room_id(channel)
+        if room_id is not None:
+            socketio.server.enter_room(sid, wire_room(channel, fmt))
+            room_router.dispatch(room_id, 'dashboard', room_id, sid, fmt)
+
+
+def drop_client(sid):
+    print(f"Disconnecting slow client {sid}")
+    socketio.server.disconnect(sid)
+
+
+client_monitor = OutboundMonitor(
+    client_queue_depth, pause_dashboards, resume_dashboards, drop_client,
+    high_water=CLIENT_QUEUE_HIGH_WATER, low_water=CLIENT_QUEUE_LOW_WATER,
+    limit=CLIENT_QUEUE_LIMIT, max_pause=CLIENT_MAX_PAUSE, interval=CLIENT_QUEUE_CHECK_INTERVAL
+)
+client_monitor.start()
+
 
 if __name__ == '__main__':
     socketio.run(app, debug=True, host='0.0.0.0', port=5000, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+Text matching primitives shared by the local analysis engine.
+
+KeywordAutomaton compiles every keyword table into a single Aho-Corasick
+automaton so one pass over a message finds all hits, however many lexicons
+are registered.
+"""
+
+from collections import deque
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over categorised keyword tables.
+
+    Matching is plain substring matching (the same as `keyword in text`), and
+    each keyword is reported at most once per scan, in table order.
+    """
+
+    def __init__(self, tables):
+        self.tables = {category: tuple(keywords) for category, keywords in tables.items()}
+
+        goto = [{}]
+        outputs = [set()]
+        for category, keywords in self.tables.items():
+            for index, keyword in enumerate(keywords):
+                node = 0
+                for ch in keyword:
+                    nxt = goto[node].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[node][ch] = nxt
+                        goto.append({})
+                        outputs.append(set())
+                    node = nxt
+                outputs[node].add((category, index))
+
+        # Breadth-first pass: compute failure links and fold each state's
+        # failure transitions in, giving a full DFA over the keyword alphabet.
+        alphabet = {ch for keywords in self.tables.values() for kw in keywords for ch in kw}
+        fail = [0] * len(goto)
+        delta = [dict() for _ in goto]
+        for ch in alphabet:
+            delta[0][ch] = goto[0].get(ch, 0)
+
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            outputs[node] |= outputs[fail[node]]
+            for ch in alphabet:
+                child = goto[node].get(ch)
+                if child is None:
+                    delta[node][ch] = delta[fail[node]][ch]
+                else:
+                    fail[child] = delta[fail[node]][ch]
+                    delta[node][ch] = child
+                    queue.append(child)
+
+        # Characters outside the alphabet always lead back to the root, so
+        # they are left out of the tables and resolved by dict.get(ch, 0).
+        self._delta = [{ch: nxt for ch, nxt in row.items() if nxt} for row in delta]
+        self._outputs = [frozenset(out) for out in outputs]
+
+    def scan(self, text):
+        """Scan text once and return {category: (keyword, ...)} for every hit."""
+        delta = self._delta
+        outputs = self._outputs
+        found = set()
+        node = 0
+        for ch in text:
+            node = delta[node].get(ch, 0)
+            if outputs[node]:
+                found |= outputs[node]
+
+        hits = {}
+        for category, index in sorted(found):
+            hits.setdefault(category, []).append(self.tables[category][index])
+        return {category: tuple(keywords) for category, keywords in hits.items()}
+
@@ -0,0 +1,300 @@
+"""
+Minimal Redis-protocol server, a local stand-in for running several workers.
+
+Implements only what RespBackend uses: PING, GET, SET (NX, XX, PX), DEL,
+PEXPIRE, HSET, HGET, HDEL, HGETALL, HLEN, HINCRBY, PUBLISH, SUBSCRIBE and
+transactions (WATCH, UNWATCH, MULTI, EXEC, DISCARD). AUTH, SELECT and CLIENT
+are accepted and ignored. Everything is kept in memory in this process.
+
+Usage:
+  python miniredis.py --port 6379
+  ROOM_BACKEND_URL=redis://localhost:6379 gunicorn --worker-class eventlet -w 4 main:app
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+
+
+class Store:
+    """Keys, hashes and subscribers, guarded by one lock."""
+
+    def __init__(self):
+        # Reentrant: EXEC runs queued commands, which take it too, under it
+        self.lock = threading.RLock()
+        self.values = {}       # key -> (bytes, expires_at or None)
+        self.hashes = {}       # key -> {field: bytes}
+        self.versions = {}     # key -> write count, for WATCH
+        self.subscribers = {}  # channel -> set of handlers
+
+    def live_value(self, key):
+        entry = self.values.get(key)
+        if entry is not None and entry[1] is not None and time.monotonic() >= entry[1]:
+            del self.values[key]
+            self.touch(key)
+            return None
+        return entry
+
+    def touch(self, key):
+        """Record a write (or expiry) of key, invalidating WATCHes on it."""
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    """One client connection."""
+
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.channels = set()
+        self.watched = {}   # key -> version when watched
+        self.queued = None  # commands queued since MULTI
+
+    def handle(self):
+        while True:
+            try:
+                args = self.read_command()
+            except (ConnectionError, ValueError):
+                break
+            if args is None:
+                break
+            name = args[0].upper().decode()
+            handler = getattr(self, 'cmd_' + name.lower(), None)
+            if handler is None:
+                self.reply(Error(f"ERR unknown command '{name}'"))
+                continue
+            if self.queued is not None and name not in ('EXEC', 'DISCARD', 'MULTI', 'WATCH'):
+                self.queued.append((handler, args[1:]))
+                self.reply(Status('QUEUED'))
+                continue
+            try:
+                self.reply(handler(*args[1:]))
+            except (TypeError, ValueError):
+                self.reply(Error(f"ERR wrong arguments for '{name}'"))
+
+    def finish(self):
+        with self.server.store.lock:
+            for channel in self.channels:
+                self.server.store.subscribers.get(channel, set()).discard(self)
+        super().finish()
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()  # inline command
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        if value is NO_REPLY:
+            return
+        with self.write_lock:
+            self.wfile.write(encode(value))
+
+    # -- commands ------------------------------------------------------------
+
+    def cmd_ping(self, *args):
+        return Status('PONG')
+
+    def cmd_auth(self, *args):
+        return Status('OK')
+
+    cmd_select = cmd_client = cmd_auth
+
+    def cmd_get(self, key):
+        with self.server.store.lock:
+            entry = self.server.store.live_value(key)
+        return entry[0] if entry else None
+
+    def cmd_set(self, key, value, *options):
+        options = [option.upper() for option in options]
+        expires_at = None
+        if b'PX' in options:
+            expires_at = time.monotonic() + int(options[options.index(b'PX') + 1]) / 1000
+        store = self.server.store
+        with store.lock:
+            exists = store.live_value(key) is not None
+            if (b'NX' in options and exists) or (b'XX' in options and not exists):
+                return None
+            store.values[key] = (value, expires_at)
+            store.touch(key)
+        return Status('OK')
+
+    def cmd_pexpire(self, key, px):
+        store = self.server.store
+        with store.lock:
+            entry = store.live_value(key)
+            if entry is None:
+                return 0
+            store.values[key] = (entry[0], time.monotonic() + int(px) / 1000)
+            store.touch(key)
+        return 1
+
+    def cmd_del(self, *keys):
+        store = self.server.store
+        with store.lock:
+            for key in keys:
+                store.touch(key)
+            return sum((store.values.pop(key, None) is not None) + (store.hashes.pop(key, None) is not None)
+                       for key in keys)
+
+    def cmd_watch(self, *keys):
+        if self.queued is not None:
+            return Error('ERR WATCH inside MULTI is not allowed')
+        store = self.server.store
+        with store.lock:
+            for key in keys:
+                store.live_value(key)
+                self.watched.setdefault(key, store.versions.get(key, 0))
+        return Status('OK')
+
+    def cmd_unwatch(self):
+        self.watched = {}
+        return Status('OK')
+
+    def cmd_multi(self):
+        if self.queued is not None:
+            return Error('ERR MULTI calls can not be nested')
+        self.queued = []
+        return Status('OK')
+
+    def cmd_discard(self):
+        if self.queued is None:
+            return Error('ERR DISCARD without MULTI')
+        self.queued = None
+        self.watched = {}
+        return Status('OK')
+
+    def cmd_exec(self):
+        if self.queued is None:
+            return Error('ERR EXEC without MULTI')
+        queued, self.queued = self.queued, None
+        watched, self.watched = self.watched, {}
+        store = self.server.store
+        with store.lock:
+            for key, version in watched.items():
+                store.live_value(key)
+                if store.versions.get(key, 0) != version:
+                    return NIL_ARRAY
+            return [handler(*args) for handler, args in queued]
+
+    def cmd_hset(self, key, *pairs):
+        store = self.server.store
+        with store.lock:
+            fields = store.hashes.setdefault(key, {})
+            added = sum(field not in fields for field in pairs[::2])
+            fields.update(zip(pairs[::2], pairs[1::2]))
+            store.touch(key)
+        return added
+
+    def cmd_hget(self, key, field):
+        with self.server.store.lock:
+            return self.server.store.hashes.get(key, {}).get(field)
+
+    def cmd_hdel(self, key, *fields):
+        store = self.server.store
+        with store.lock:
+            existing = store.hashes.get(key, {})
+            removed = sum(existing.pop(field, None) is not None for field in fields)
+            if not existing:
+                store.hashes.pop(key, None)
+            store.touch(key)
+        return removed
+
+    def cmd_hgetall(self, key):
+        with self.server.store.lock:
+            fields = dict(self.server.store.hashes.get(key, {}))
+        return [item for pair in fields.items() for item in pair]
+
+    def cmd_hlen(self, key):
+        with self.server.store.lock:
+            return len(self.server.store.hashes.get(key, {}))
+
+    def cmd_hincrby(self, key, field, amount):
+        store = self.server.store
+        with store.lock:
+            fields = store.hashes.setdefault(key, {})
+            value = int(fields.get(field, b'0')) + int(amount)
+            fields[field] = str(value).encode()
+            store.touch(key)
+        return value
+
+    def cmd_publish(self, channel, payload):
+        with self.server.store.lock:
+            subscribers = list(self.server.store.subscribers.get(channel, ()))
+        message = encode([b'message', channel, payload])
+        for subscriber in subscribers:
+            try:
+                with subscriber.write_lock:
+                    subscriber.wfile.write(message)
+            except OSError:
+                pass
+        return len(subscribers)
+
+    def cmd_subscribe(self, *channels):
+        with self.server.store.lock:
+            for channel in channels:
+                self.server.store.subscribers.setdefault(channel, set()).add(self)
+        for channel in channels:
+            self.channels.add(channel)
+            self.reply([b'subscribe', channel, len(self.channels)])
+        return NO_REPLY
+
+
+class Status(str):
+    """Simple-string reply."""
+
+
+class Error(str):
+    """Error reply."""
+
+
+NO_REPLY = object()
+NIL_ARRAY = object()
+
+
+def encode(value):
+    if isinstance(value, Error):
+        return b'-' + value.encode() + b'\r\n'
+    if isinstance(value, Status):
+        return b'+' + value.encode() + b'\r\n'
+    if value is None:
+        return b'$-1\r\n'
+    if value is NIL_ARRAY:
+        return b'*-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    return b'*%d\r\n' % len(value) + b''.join(encode(item) for item in value)
+
+
+class MiniRedis(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, RespHandler)
+        self.store = Store()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+    with MiniRedis((args.host, args.port)) as server:
+        print(f"miniredis listening on {args.host}:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Per-room AI job coalescing.
+
+The dashboard only shows AI results for the latest message, so when a room
+bursts there is no point analysing every message. Each room runs at most one
+batch of AI jobs at a time and starts at most one batch per `min_interval`;
+while it waits, newer messages replace older ones, and only room-level jobs
+(the summary and prediction) carry over from superseded messages.
+"""
+
+import time
+
+import eventlet
+
+
+class RoomAIScheduler:
+    """
+    Coalescing AI queue for one room.
+
+    submit() records a message's jobs ({field: job}) as the room's pending
+    batch, replacing any batch that has not started yet. Jobs for fields in
+    `carry_fields` that the new batch lacks are carried into it instead of
+    being dropped, and run first. run_batch(message_id, jobs, expires_at) is
+    called from a green thread and must block until the batch is done.
+    """
+
+    def __init__(self, run_batch, min_interval=1.0, carry_fields=('ai_summary', 'ai_prediction'),
+                 clock=time.monotonic):
+        self.run_batch = run_batch
+        self.min_interval = min_interval
+        self.carry_fields = carry_fields
+        self.clock = clock
+        self._pending = None  # (message_id, jobs, expires_at)
+        self._running = False
+        self._last_start = None
+        self.submitted = 0
+        self.batches = 0
+        self.superseded = 0
+        self.dropped_jobs = 0
+
+    def submit(self, message_id, jobs, expires_at):
+        self.submitted += 1
+        if self._pending is not None:
+            _, old_jobs, _ = self._pending
+            carried = {field: job for field, job in old_jobs.items()
+                       if field in self.carry_fields and field not in jobs}
+            self.superseded += 1
+            self.dropped_jobs += len(old_jobs) - len(carried)
+            jobs = {**carried, **jobs}
+        self._pending = (message_id, self._prioritize(jobs), expires_at)
+        if not self._running:
+            self._running = True
+            eventlet.spawn_n(self._drain)
+
+    def _prioritize(self, jobs):
+        first = {field: job for field, job in jobs.items() if field in self.carry_fields}
+        return {**first, **jobs}
+
+    def _drain(self):
+        try:
+            while self._pending is not None:
+                if self._last_start is not None:
+                    wait = self._last_start + self.min_interval - self.clock()
+                    if wait > 0:
+                        eventlet.sleep(wait)  # newer messages coalesce meanwhile
+                message_id, jobs, expires_at = self._pending
+                self._pending = None
+                self._last_start = self.clock()
+                self.batches += 1
+                self.run_batch(message_id, jobs, expires_at)
+        finally:
+            self._running = False
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'batches': self.batches,
+            'superseded': self.superseded,
+            'dropped_jobs': self.dropped_jobs,
+            'pending': self._pending is not None,
+            'running': self._running
+        }
@@ -19,6 +19,16 @@ let userId = null;
 let username = null;
 let roomId = null;
 let dashboardActive = false;
+let dashboardMessageId = null;
+let wireSchema = null;  // set when the server agreed to send MessagePack
+
+// Versioned dashboard snapshot, kept in sync by patches from the server
+const dashboardSync = {
+    epoch: null,
+    version: 0,
+    snapshot: {},
+    resyncPending: false
+};
 
 const dashboardData = {
     sentiments: [],
@@ -101,10 +111,20 @@ function attachEventListeners() {
 // ============================================================================
 
 function initializeSocket() {
-    socket = io();
+    // WebSocket first: with several server workers a polling session would
+    // need sticky load balancing
+    socket = io({ transports: ['websocket', 'polling'] });
 
     socket.on('connect', function() {
         console.log('Connected to server');
+        // Offer the binary encoding when the MessagePack decoder loaded
+        if (window.MessagePack) {
+            socket.emit('wire_hello', { formats: ['msgpack', 'json'] });
+        }
+    });
+
+    socket.on('wire_config', function(config) {
+        wireSchema = config.format === 'msgpack' ? config.schema : null;
     });
 
     socket.on('connection_response', function(data) {
@@ -119,11 +139,20 @@ function initializeSocket() {
     });
 
     socket.on('new_message', function(data) {
-        displayMessage(data);
+        displayMessage(decodeWire(data));
+    });
+
+    // Busy rooms may batch several messages into one frame (CHAT_BATCH)
+    socket.on('new_messages', function(data) {
+        decodeWire(data).messages.forEach(displayMessage);
     });
 
     socket.on('dashboard_update', function(data) {
-        updateDashboard(data);
+        applyDashboardPatch(decodeWire(data));
+    });
+
+    socket.on('dashboard_ai_update', function(data) {
+        applyAIUpdate(decodeWire(data));
     });
 
     socket.on('disconnect', function() {
@@ -132,6 +161,48 @@ function initializeSocket() {
     });
 }
 
+// Hot events arrive as MessagePack once wire_config picked it: dict keys may
+// be indexes into schema.keys ('~' escapes literal keys), and the dicts named
+// in schema.vectors arrive as value lists or flag bitmasks, or a list of
+// those when the field holds a list of such dicts (see wire.py).
+function decodeWire(data) {
+    if (!(data instanceof ArrayBuffer || ArrayBuffer.isView(data))) {
+        return data;
+    }
+    const bytes = data instanceof ArrayBuffer ? new Uint8Array(data) : data;
+    return expandWire(MessagePack.decode(bytes), null, null);
+}
+
+function expandWire(value, parent, field) {
+    const vector = field === null ? null
+        : wireSchema.vectors[`${parent}.${field}`] || wireSchema.vectors[field];
+    // A vector is never empty and holds scalars, so an empty list or a list
+    // of lists is a list of vectors
+    if (vector && Array.isArray(value) && (value.length === 0 || Array.isArray(value[0]))) {
+        return value.map(item => expandWire(item, parent, field));
+    }
+    if (vector && (Array.isArray(value) || typeof value === 'number')) {
+        const expanded = {};
+        vector.fields.forEach((name, i) => {
+            expanded[name] = vector.flags ? Boolean(value & (1 << i)) : value[i];
+        });
+        return expanded;
+    }
+    if (Array.isArray(value)) {
+        return value.map(item => expandWire(item, parent, field));
+    }
+    if (value !== null && typeof value === 'object') {
+        const expanded = {};
+        Object.entries(value).forEach(([key, item]) => {
+            const name = /^\d+$/.test(key) ? wireSchema.keys[Number(key)]
+                : key.startsWith('~') ? key.slice(1) : key;
+            expanded[name] = expandWire(item, field, name);
+        });
+        return expanded;
+    }
+    return value;
+}
+
 // ============================================================================
 // CHAT INTERFACE FUNCTIONS
 // ============================================================================
@@ -159,6 +230,11 @@ function handleJoinChat(e) {
     document.getElementById('chatWrapper').style.display = 'flex';
 
     addSystemMessage(`Welcome ${username}! You're now in room: ${roomId}`);
+
+    // Dashboard opened before joining
+    if (dashboardActive) {
+        subscribeDashboard();
+    }
 }
 
 function handleSendMessage(e) {
@@ -241,21 +317,109 @@ function toggleDashboard() {
     if (dashboardActive) {
         panel.classList.add('active');
         initializeCharts();
+        subscribeDashboard();
     } else {
         panel.classList.remove('active');
+        unsubscribeDashboard();
+    }
+}
+
+// Dashboard updates only reach clients that have the dashboard open: the
+// server sends them to a separate per-room subscription, and skips building
+// them for rooms nobody is watching.
+function subscribeDashboard() {
+    if (!roomId) {
+        return;
+    }
+    // The server answers with its current full snapshot
+    dashboardSync.epoch = null;
+    dashboardSync.version = 0;
+    dashboardSync.resyncPending = false;
+    socket.emit('dashboard_subscribe', { room_id: roomId });
+}
+
+function unsubscribeDashboard() {
+    if (roomId) {
+        socket.emit('dashboard_unsubscribe', { room_id: roomId });
+    }
+}
+
+// dashboard_update carries either a full snapshot ({epoch, version, full})
+// or a patch from version `base` ({epoch, base, version, set, append, merge}).
+// A patch that doesn't follow the version we hold triggers a resync.
+function applyDashboardPatch(patch) {
+    if (patch.full) {
+        dashboardSync.epoch = patch.epoch;
+        dashboardSync.version = patch.version;
+        dashboardSync.snapshot = patch.full;
+        dashboardSync.resyncPending = false;
+        if (patch.full.message_id) {
+            updateDashboard(patch.full, true);
+        }
+        return;
+    }
+
+    if (patch.base === 0) {
+        // First patch of a room: it sets every field
+        dashboardSync.epoch = patch.epoch;
+        dashboardSync.version = 0;
+        dashboardSync.snapshot = {};
+    }
+    if (patch.epoch === dashboardSync.epoch && patch.version <= dashboardSync.version) {
+        return;
+    }
+    if (patch.epoch !== dashboardSync.epoch || patch.base !== dashboardSync.version) {
+        requestDashboardResync();
+        return;
     }
+
+    const snapshot = dashboardSync.snapshot;
+    Object.assign(snapshot, patch.set || {});
+    Object.entries(patch.append || {}).forEach(([field, change]) => {
+        snapshot[field] = (snapshot[field] || []).concat(change.items).slice(-change.keep);
+    });
+    Object.entries(patch.merge || {}).forEach(([field, changed]) => {
+        snapshot[field] = Object.assign({}, snapshot[field], changed);
+    });
+    dashboardSync.version = patch.version;
+    dashboardSync.resyncPending = false;
+    updateDashboard(snapshot);
 }
 
-function updateDashboard(data) {
+function requestDashboardResync() {
+    if (dashboardSync.resyncPending || !roomId) {
+        return;
+    }
+    dashboardSync.resyncPending = true;
+    socket.emit('dashboard_resync', {
+        room_id: roomId,
+        epoch: dashboardSync.epoch,
+        version: dashboardSync.version
+    });
+}
+
+// `fullSnapshot`: data is a full resync rather than a new message, so the
+// timelines are rebuilt from its history instead of gaining a point.
+function updateDashboard(data, fullSnapshot = false) {
+    dashboardMessageId = data.message_id;
+
     // Store data
-    dashboardData.sentiments.push(data.sentiment.value);
-    dashboardData.risks.push(data.risk_score);
-    dashboardData.emotions.push(data.emotions);
+    if (fullSnapshot) {
+        dashboardData.sentiments = (data.sentiment_history || [data.sentiment.value]).slice(-20);
+        dashboardData.risks = (data.risk_history || [data.risk_score]).slice(-20);
+        dashboardData.emotions = [data.emotions];
+    } else {
+        dashboardData.sentiments.push(data.sentiment.value);
+        dashboardData.risks.push(data.risk_score);
+        dashboardData.emotions.push(data.emotions);
+    }
 
     // Keep only last 20 for performance
     if (dashboardData.sentiments.length > 20) {
         dashboardData.sentiments.shift();
         dashboardData.risks.shift();
+    }
+    if (dashboardData.emotions.length > 20) {
         dashboardData.emotions.shift();
     }
 
@@ -295,17 +459,6 @@ function updateDashboard(data) {
     // Update message history
     updateMessageHistory(data.recent_messages);
 
-    // Update AI analysis sections
-    if (data.ai_thoughts) {
-        updateAIThoughts(data.ai_thoughts);
-    }
-    if (data.ai_analysis) {
-        updateAIAnalysis(data.ai_analysis);
-    }
-    if (data.ai_summary) {
-        updateAISummary(data.ai_summary);
-    }
-
     // ====== NEW ADVANCED FEATURES ======
     
     // Threat level and energy
@@ -337,27 +490,14 @@ function updateDashboard(data) {
     if (data.personality_fingerprint) {
         updatePersonalityFingerprint(data.personality_fingerprint);
     }
-    if (data.ai_intent) {
-        updateIntentDisplay(data.ai_intent);
-    }
     
     // Word cloud
     if (data.word_cloud) {
         updateWordCloud(data.word_cloud);
     }
     
-    // AI emotional mirror and prediction
-    if (data.ai_emotional_mirror) {
-        updateAIEmotionalMirror(data.ai_emotional_mirror);
-    }
-    if (data.ai_prediction) {
-        updateAIPrediction(data.ai_prediction);
-    }
-    
-    // Reply suggestions
-    if (data.ai_replies) {
-        updateReplySuggestions(data.ai_replies);
-    }
+    // AI sections (usually filled in later by dashboard_ai_update)
+    updateAIFields(data);
     
     // Notification center
     if (data.alerts) {
@@ -370,6 +510,45 @@ function updateDashboard(data) {
     }
 }
 
+// Per-message AI results that belong to an older message than the one on the
+// dashboard are dropped; room-level ones still apply.
+const ROOM_AI_FIELDS = ['ai_summary', 'ai_prediction'];
+
+function applyAIUpdate(data) {
+    let fields = data.fields;
+    if (data.message_id !== dashboardMessageId) {
+        fields = {};
+        ROOM_AI_FIELDS.forEach(key => {
+            if (data.fields[key]) fields[key] = data.fields[key];
+        });
+    }
+    updateAIFields(fields);
+}
+
+function updateAIFields(data) {
+    if (data.ai_thoughts) {
+        updateAIThoughts(data.ai_thoughts);
+    }
+    if (data.ai_analysis) {
+        updateAIAnalysis(data.ai_analysis);
+    }
+    if (data.ai_summary) {
+        updateAISummary(data.ai_summary);
+    }
+    if (data.ai_intent) {
+        updateIntentDisplay(data.ai_intent);
+    }
+    if (data.ai_emotional_mirror) {
+        updateAIEmotionalMirror(data.ai_emotional_mirror);
+    }
+    if (data.ai_prediction) {
+        updateAIPrediction(data.ai_prediction);
+    }
+    if (data.ai_replies) {
+        updateReplySuggestions(data.ai_replies);
+    }
+}
+
 function updateDashboardStats(data) {
     document.getElementById('msgCount').textContent = data.message_count;
     document.getElementById('anomalyScore').textContent = data.anomaly_index + '%';
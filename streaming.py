@@ -0,0 +1,315 @@
+"""
+Incremental per-room statistics.
+
+Each structure here is updated in time proportional to the newest message,
+never to the length of the room's history.
+"""
+
+import bisect
+import time
+from array import array
+from collections import deque
+from itertools import islice
+
+
+class WordFrequencyWindow:
+    """
+    Word counts over a sliding window of recent messages, kept in frequency
+    order so the top words can be read without sorting by count.
+
+    The window is bounded by message count, by age in seconds, or both, and
+    is expired on every add() and top(). Words are grouped into buckets by
+    count; adding or evicting a word moves it between neighbouring buckets,
+    so an update costs O(words in message). Each bucket keeps its words in
+    the order they reached that count, so top(k) reads the first k words
+    walking down from the highest count, however long the window is. Words
+    with equal counts are listed oldest first by that order.
+    """
+
+    def __init__(self, max_messages=20, max_age=None):
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self._window = deque()
+        self._counts = {}   # word -> count in the window
+        self._buckets = {}  # count -> {word: None}, in the order words reached it
+        self._levels = []   # counts with a non-empty bucket, ascending
+
+    def __len__(self):
+        return len(self._window)
+
+    def add(self, words, now=None):
+        """Add one message's words and evict whatever falls out of the window."""
+        now = time.monotonic() if now is None else now
+        self._window.append((now, words))
+        for word in words:
+            self._move(word, 1)
+        self.expire(now)
+
+    def expire(self, now=None):
+        """Evict messages beyond the count limit or older than max_age."""
+        window = self._window
+        while self.max_messages is not None and len(window) > self.max_messages:
+            self._evict()
+        if self.max_age is not None:
+            now = time.monotonic() if now is None else now
+            while window and now - window[0][0] > self.max_age:
+                self._evict()
+
+    def top(self, k, now=None):
+        """Return up to k (word, count) pairs, highest count first."""
+        self.expire(now)
+        result = []
+        for count in reversed(self._levels):
+            for word in islice(self._buckets[count], k - len(result)):
+                result.append((word, count))
+            if len(result) >= k:
+                break
+        return result
+
+    def _evict(self):
+        _, words = self._window.popleft()
+        for word in words:
+            self._move(word, -1)
+
+    def _move(self, word, step):
+        count = self._counts.get(word, 0)
+        if count:
+            bucket = self._buckets[count]
+            del bucket[word]
+            if not bucket:
+                del self._buckets[count]
+                del self._levels[bisect.bisect_left(self._levels, count)]
+        count += step
+        if not count:
+            del self._counts[word]
+            return
+        self._counts[word] = count
+        bucket = self._buckets.get(count)
+        if bucket is None:
+            bucket = self._buckets[count] = {}
+            # Few distinct counts (at most sqrt(2 * words in the window))
+            bisect.insort(self._levels, count)
+        bucket[word] = None
+
+
+class RollingCounter:
+    """
+    Running totals of named per-message counts over the last `size` messages.
+
+    Per-message counts live in a fixed-size ring; adding a message adds its
+    counts to the totals and subtracts the entry it overwrites, so an update
+    costs O(number of fields) whatever the window size.
+    """
+
+    def __init__(self, size, fields):
+        self.size = size
+        self.fields = tuple(fields)
+        self._ring = [None] * size
+        self._next = 0
+        self._filled = 0
+        self._totals = [0] * len(self.fields)
+
+    def __len__(self):
+        return self._filled
+
+    def add(self, counts):
+        """Push one message's {field: count} and return the window totals."""
+        row = tuple(counts.get(field, 0) for field in self.fields)
+        totals = self._totals
+        dropped = self._ring[self._next]
+        if dropped is not None:
+            for i, value in enumerate(dropped):
+                totals[i] -= value
+        for i, value in enumerate(row):
+            totals[i] += value
+        self._ring[self._next] = row
+        self._next = (self._next + 1) % self.size
+        self._filled = min(self._filled + 1, self.size)
+        return self.totals()
+
+    def totals(self):
+        """Return {field: total} over the messages currently in the window."""
+        return dict(zip(self.fields, self._totals))
+
+
+class _IntervalTracker:
+    """Burst count and sliding minimum of the intervals inside one window."""
+
+    def __init__(self, burst_interval):
+        self.burst_interval = burst_interval
+        self.start = 0  # absolute index of the oldest timestamp in the window
+        self.bursts = 0
+        self._mins = deque()  # (index, interval) with increasing intervals
+
+    def push(self, index, interval):
+        """Account for the interval ending at timestamp `index`."""
+        if interval < self.burst_interval:
+            self.bursts += 1
+        mins = self._mins
+        while mins and mins[-1][1] >= interval:
+            mins.pop()
+        mins.append((index, interval))
+
+    def advance(self, clock, new_start):
+        """Drop timestamps before new_start, and the intervals that began at them."""
+        while self.start < new_start:
+            nxt = self.start + 1
+            if nxt < clock.count and clock.at(nxt) - clock.at(self.start) < self.burst_interval:
+                self.bursts -= 1
+            self.start = nxt
+        mins = self._mins
+        while mins and mins[0][0] <= self.start:
+            mins.popleft()
+
+    def minimum(self):
+        return self._mins[0][1] if self._mins else None
+
+
+class MessageClock:
+    """
+    Recent message times as monotonic floats in a compact array('d') ring.
+
+    Two windows are kept up to date on every record(): the last
+    `interval_window` messages and the last `rate_window` seconds (capped at
+    `capacity` messages). Each tracks mean and minimum interval and the number
+    of burst intervals (shorter than `burst_interval`) in O(1) amortised time.
+    """
+
+    def __init__(self, capacity=256, interval_window=10, burst_interval=2.0, rate_window=60.0):
+        self.capacity = max(capacity, interval_window)
+        self.interval_window = interval_window
+        self.rate_window = rate_window
+        self.count = 0
+        self._ring = array('d', bytes(8 * self.capacity))
+        self._recent = _IntervalTracker(burst_interval)
+        self._timed = _IntervalTracker(burst_interval)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def at(self, index):
+        """Timestamp of the index-th message ever recorded (must still be in the ring)."""
+        return self._ring[index % self.capacity]
+
+    def record(self, now=None):
+        """Record a message at `now` (defaults to time.monotonic())."""
+        now = time.monotonic() if now is None else now
+        index = self.count
+        # Slide both windows before the ring slot holding index - capacity is reused
+        self._recent.advance(self, max(0, index + 1 - self.interval_window))
+        self._advance_timed(now, index + 1)
+        self._ring[index % self.capacity] = now
+        self.count = index + 1
+        if index > 0:
+            interval = now - self.at(index - 1)
+            self._recent.push(index, interval)
+            if index - 1 >= self._timed.start:
+                self._timed.push(index, interval)
+        return now
+
+    def recent_stats(self):
+        """Interval stats over the last `interval_window` messages."""
+        return self._stats(self._recent)
+
+    def window_stats(self, now=None):
+        """Interval stats and message rate over the last `rate_window` seconds."""
+        now = time.monotonic() if now is None else now
+        self._advance_timed(now, self.count)
+        stats = self._stats(self._timed)
+        stats['rate'] = stats['messages'] / self.rate_window if self.rate_window else 0.0
+        return stats
+
+    def _advance_timed(self, now, upcoming_count):
+        timed = self._timed
+        start = max(timed.start, upcoming_count - self.capacity)
+        cutoff = now - self.rate_window
+        while start < self.count and self.at(start) < cutoff:
+            start += 1
+        timed.advance(self, start)
+
+    def _stats(self, tracker):
+        messages = self.count - tracker.start
+        intervals = messages - 1
+        if intervals < 1:
+            return {'messages': max(messages, 0), 'intervals': 0, 'mean_interval': None,
+                    'min_interval': None, 'burst_count': 0}
+        span = self.at(self.count - 1) - self.at(tracker.start)
+        return {
+            'messages': messages,
+            'intervals': intervals,
+            'mean_interval': span / intervals,
+            'min_interval': tracker.minimum(),
+            'burst_count': tracker.bursts
+        }
+
+
+class RunningStats:
+    """
+    Streaming statistics for one numeric series.
+
+    Keeps the lifetime count, mean and variance (Welford's method), an
+    exponentially weighted moving average, and mean/variance over the last
+    `window` values held in an array('d') ring. Every update and read is O(1).
+    """
+
+    def __init__(self, window=20, alpha=0.2):
+        self.window = window
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.ewma = None
+        self.last = None
+        self._m2 = 0.0
+        self._ring = array('d', bytes(8 * window))
+        self._window_sum = 0.0
+        self._window_sumsq = 0.0
+
+    def add(self, value):
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.ewma = value if self.ewma is None else self.alpha * value + (1 - self.alpha) * self.ewma
+        self.last = value
+
+        slot = (self.count - 1) % self.window
+        if self.count > self.window:
+            old = self._ring[slot]
+            self._window_sum -= old
+            self._window_sumsq -= old * old
+        self._ring[slot] = value
+        self._window_sum += value
+        self._window_sumsq += value * value
+
+    @property
+    def variance(self):
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def window_count(self):
+        return min(self.count, self.window)
+
+    @property
+    def window_mean(self):
+        n = self.window_count
+        return self._window_sum / n if n else 0.0
+
+    @property
+    def window_variance(self):
+        n = self.window_count
+        if not n:
+            return 0.0
+        mean = self._window_sum / n
+        return max(0.0, self._window_sumsq / n - mean * mean)
+
+    def snapshot(self):
+        """Current values as a plain dict, rounded for display."""
+        return {
+            'count': self.count,
+            'mean': round(self.mean, 2),
+            'std': round(self.variance ** 0.5, 2),
+            'ewma': round(self.ewma, 2) if self.ewma is not None else None,
+            'window_mean': round(self.window_mean, 2),
+            'window_std': round(self.window_variance ** 0.5, 2)
+        }
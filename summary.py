@@ -0,0 +1,90 @@
+"""
+Rolling conversation summary state.
+
+Instead of re-sending the last N messages every few messages, each room
+keeps its latest AI summary and which messages it covers. A refresh sends
+only the previous summary plus the messages since, and is triggered when
+those new messages reach a token budget or the summary gets too old.
+"""
+
+import time
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+class RollingSummary:
+    """
+    Summary bookkeeping for one room.
+
+    The first summary is due once the room has `first_after` messages.
+    `covered` is the MessageHistory.total the current summary includes;
+    `pending_tokens` estimates the size of the messages after it. Only one
+    refresh runs at a time: begin() claims it when the refresh starts (not
+    when it is planned) and finish() releases it, keeping the result on
+    success or returning the tokens to the pending count on failure. A claim
+    never released is given up after max_age.
+    """
+
+    def __init__(self, token_budget=300, max_age=60.0, first_after=3, clock=time.monotonic):
+        self.token_budget = token_budget
+        self.max_age = max_age
+        self.first_after = first_after
+        self.clock = clock
+        self.current = None
+        self.covered = 0
+        self.pending_tokens = 0
+        self.refreshed_at = clock()
+        self.in_flight = False
+        self.refreshes = 0
+        self.tokens_sent = 0
+
+    def note(self, username, text):
+        """Account for a new message."""
+        self.pending_tokens += estimate_tokens(f"{username}: {text}")
+
+    def due(self, total):
+        """Whether a refresh should start now, with `total` messages in the room."""
+        if self._busy(total):
+            return False
+        if self.current is None and total >= self.first_after:
+            return True
+        return self.pending_tokens >= self.token_budget or self.clock() - self.refreshed_at >= self.max_age
+
+    def begin(self, total):
+        """
+        Claim the refresh of a room with `total` messages; returns the pending
+        tokens it takes over, or None if another refresh holds the claim or
+        the summary already covers them.
+        """
+        if self._busy(total):
+            return None
+        self.in_flight = True
+        self.refreshed_at = self.clock()
+        taken, self.pending_tokens = self.pending_tokens, 0
+        return taken
+
+    def _busy(self, total):
+        # A refresh still unfinished after max_age is assumed lost
+        return total <= self.covered or (self.in_flight and self.clock() - self.refreshed_at < self.max_age)
+
+    def finish(self, result, covered, taken):
+        self.in_flight = False
+        if result and covered > self.covered:
+            self.current = result
+            self.covered = covered
+            self.refreshes += 1
+            self.tokens_sent += taken
+        elif not result:
+            self.pending_tokens += taken
+
+    def stats(self):
+        return {
+            'covered_messages': self.covered,
+            'pending_tokens': self.pending_tokens,
+            'refreshes': self.refreshes,
+            'message_tokens_sent': self.tokens_sent,
+            'in_flight': self.in_flight
+        }
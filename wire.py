@@ -0,0 +1,252 @@
+"""
+Compact binary encoding for the hot Socket.IO events.
+
+new_message, dashboard_update and dashboard_ai_update are the bulk of the
+traffic. Clients that negotiate it get them as MessagePack instead of JSON,
+with two compactions on top:
+
+  keys     dict keys found in a shared key dictionary are sent as their
+           index; other keys stay strings ('~'-prefixed when they are all
+           digits or start with '~', so they can't be mistaken for an index)
+  vectors  fixed-schema dicts of scalars (emotions, tone scores, word
+           cloud entries...) are sent as a list of values in schema order,
+           or as a bitmask when the values are flags; a list of them is
+           sent as a list of such rows
+
+A vector is only packed when the dict has exactly the schema's keys, so
+partial dicts (e.g. in a merge patch) are sent as ordinary maps. The key
+dictionary and the vector schemas are sent to the client once, when it
+negotiates. Clients that never negotiate keep getting JSON.
+"""
+
+import operator
+import time
+import uuid
+from collections import defaultdict
+
+import eventlet
+import msgpack
+
+from cluster import BackendError, MemoryBackend
+
+FORMATS = ('msgpack', 'json')
+
+
+class WireCodec:
+    """
+    Packs event payloads with a key dictionary and vector schemas.
+
+    `vectors` maps a field name, or 'parent.field' for a field nested in
+    another, to (keys, flags): a dict with exactly those keys is packed as
+    a list of its values in that order, or a bitmask if `flags` is true.
+
+    The walk over the payload is the part of encoding done in Python, so
+    vectors are packed by a prebuilt function (no walk over their keys) and
+    scalars are left to msgpack without a call. benchmarks/bench_wire.py
+    compares encode time and size with json.dumps.
+    """
+
+    def __init__(self, keys, vectors):
+        self.keys = tuple(dict.fromkeys(keys))
+        self.key_index = {key: i for i, key in enumerate(self.keys)}
+        self.vectors = {path: (tuple(fields), bool(flags)) for path, (fields, flags) in vectors.items()}
+        # field -> {parent or None: (key set, packer)}
+        self._vectors_at = defaultdict(dict)
+        for path, (fields, flags) in self.vectors.items():
+            parent, _, field = path.rpartition('.')
+            self._vectors_at[field][parent or None] = (frozenset(fields), vector_packer(fields, flags))
+        self._vectors_at = dict(self._vectors_at)
+
+    def schema(self):
+        """What a client needs to unpack this codec's output."""
+        return {
+            'keys': list(self.keys),
+            'vectors': {path: {'fields': list(fields), 'flags': flags}
+                        for path, (fields, flags) in self.vectors.items()}
+        }
+
+    def encode(self, data):
+        return msgpack.packb(self.pack(data), use_bin_type=True)
+
+    def pack(self, value, parent=None, field=None):
+        """Compact a JSON-like value; `parent` and `field` name where it sits."""
+        if isinstance(value, dict):
+            return self._pack_dict(value, parent, field)
+        if isinstance(value, (list, tuple)):
+            vectors = self._vectors_at.get(field)
+            vector = vectors and (vectors.get(parent) or vectors.get(None))
+            if vector:
+                # A list of records: pack the rows in one pass
+                keys, packer = vector
+                return [packer(item) if type(item) is dict and item.keys() == keys
+                        else item if type(item) in SCALARS else self.pack(item, parent, field)
+                        for item in value]
+            return [item if type(item) in SCALARS else self.pack(item, parent, field) for item in value]
+        return value
+
+    def _pack_dict(self, value, parent, field):
+        vectors = self._vectors_at.get(field)
+        if vectors is not None:
+            vector = vectors.get(parent) or vectors.get(None)
+            if vector is not None and value.keys() == vector[0]:
+                return vector[1](value)
+        key_index = self.key_index
+        packed = {}
+        for key, item in value.items():
+            if type(item) not in SCALARS:
+                item = self.pack(item, field, key)
+            index = key_index.get(key)
+            packed[self._pack_key(key) if index is None else index] = item
+        return packed
+
+    def _pack_key(self, key):
+        key = str(key)
+        index = self.key_index.get(key)
+        if index is not None:
+            return index
+        if key.isdigit() or key.startswith('~'):
+            return '~' + key
+        return key
+
+
+SCALARS = frozenset((str, int, float, bool, type(None)))
+
+
+def vector_packer(fields, flags):
+    """Function packing a dict with exactly `fields` as a bitmask or a value list."""
+    if flags:
+        return lambda value: sum(1 << i for i, name in enumerate(fields) if value[name])
+    if len(fields) == 1:
+        return lambda value: [value[fields[0]]]
+    # itemgetter picks all the values in one C call; msgpack sends the tuple as a list
+    return operator.itemgetter(*fields)
+
+
+def negotiate(offered):
+    """First format the client offers that the server speaks, else JSON."""
+    for fmt in offered or ():
+        if fmt in FORMATS:
+            return fmt
+    return 'json'
+
+
+class WireChannels:
+    """
+    Tracks which wire format each member of a Socket.IO channel uses.
+
+    Every channel has one Socket.IO room per format ('<channel>/<format>'),
+    so an event is encoded once per format in use rather than per client.
+    Member counts live in the room backend, shared by all workers, as one
+    '<worker_id>/<format>' field per worker. Like room ownership, each
+    worker's counts are backed by a lease it renews every `lease_ttl / 3`
+    seconds: when a worker dies its lease lapses, and the next reader drops
+    its counts. With lease_ttl=None counts never lapse. Which channels a
+    client joined is known to the worker it is connected to.
+    """
+
+    def __init__(self, backend=None, worker_id=None, lease_ttl=None, clock=time.monotonic):
+        self.backend = backend or MemoryBackend()
+        self.worker_id = worker_id or uuid.uuid4().hex[:12]
+        self.lease_ttl = lease_ttl
+        self.clock = clock
+        self._formats = {}               # sid -> format
+        self._joined = defaultdict(set)  # sid -> channels
+        self._alive = {}                 # other worker_id -> lease seen valid until
+
+    def set_format(self, sid, fmt):
+        """Record a client's format; fixed once it has joined a channel."""
+        if not self._joined.get(sid):
+            self._formats[sid] = fmt
+        return self.format_of(sid)
+
+    def format_of(self, sid):
+        return self._formats.get(sid, 'json')
+
+    def channels_of(self, sid):
+        return set(self._joined.get(sid, ()))
+
+    def join(self, sid, channel):
+        """Add a client to a channel and return the Socket.IO room it should join."""
+        if channel not in self._joined[sid]:
+            self._joined[sid].add(channel)
+            self.backend.hincrby(f'wire:{channel}', self._field(self.format_of(sid)), 1)
+        return room_name(channel, self.format_of(sid))
+
+    def leave(self, sid, channel):
+        """Remove a client from a channel and return the Socket.IO room it should leave."""
+        fmt = self.format_of(sid)
+        if channel in self._joined.get(sid, ()):
+            self._joined[sid].discard(channel)
+            self._discount(channel, fmt)
+        return room_name(channel, fmt)
+
+    def drop(self, sid):
+        """Forget a disconnected client."""
+        fmt = self._formats.pop(sid, 'json')
+        for channel in self._joined.pop(sid, ()):
+            self._discount(channel, fmt)
+
+    def formats(self, channel):
+        """Formats in use by at least one member of the channel."""
+        return list(self.counts(channel))
+
+    def counts(self, channel):
+        """{format: members} over the live workers, dropping the counts of dead ones."""
+        totals = {}
+        for field, members in self.backend.hgetall(f'wire:{channel}').items():
+            worker_id, _, fmt = field.rpartition('/')
+            if not self._is_alive(worker_id):
+                self.backend.hdel(f'wire:{channel}', field)
+                continue
+            if int(members) > 0:
+                totals[fmt] = totals.get(fmt, 0) + int(members)
+        return totals
+
+    def renew(self):
+        """Take or extend this worker's lease on its counts."""
+        self.backend.set(f'wire:worker:{self.worker_id}', '1', px=self.lease_ttl * 1000)
+
+    def start(self):
+        """Keep this worker's lease alive (only when counts can lapse)."""
+        if not self.lease_ttl:
+            return
+        self.renew()
+        eventlet.spawn_n(self._renew)
+
+    def _renew(self):
+        while True:
+            eventlet.sleep(self.lease_ttl / 3)
+            try:
+                self.renew()
+            except (OSError, BackendError) as e:
+                print(f"Wire channel lease renewal failed: {e}")
+
+    def _is_alive(self, worker_id):
+        if not self.lease_ttl or worker_id == self.worker_id:
+            return True
+        # A lease seen valid is trusted for a third of its ttl, so readers
+        # don't look every worker up on every emit
+        now = self.clock()
+        if self._alive.get(worker_id, 0) > now:
+            return True
+        if self.backend.get(f'wire:worker:{worker_id}') is None:
+            self._alive.pop(worker_id, None)
+            return False
+        self._alive[worker_id] = now + self.lease_ttl / 3
+        return True
+
+    def stats(self):
+        """Member counts per format of the channels this worker's clients joined."""
+        channels = {channel for joined in self._joined.values() for channel in joined}
+        return {channel: self.counts(channel) for channel in channels}
+
+    def _field(self, fmt):
+        return f'{self.worker_id}/{fmt}'
+
+    def _discount(self, channel, fmt):
+        if self.backend.hincrby(f'wire:{channel}', self._field(fmt), -1) <= 0:
+            self.backend.hdel(f'wire:{channel}', self._field(fmt))
+
+
+def room_name(channel, fmt):
+    return f'{channel}/{fmt}'